@@ -0,0 +1,366 @@
+"""
+Benchmarks the comparators in `compare` on synthetic artifacts from KB to
+multi-GB: GeoTIFFs, LAS/LAZ point clouds, shapefiles, geopackages, file
+geodatabases and directory trees.
+
+For every artifact and size, two copies with the same data are written
+(with different bytes where the format allows, eg compression or header
+dates) and each comparator is timed on them in a fresh process, reporting
+wall time, throughput (MB/s of both inputs, and features or points per
+second) and peak RSS. Results are saved as JSON, and can be checked
+against an earlier run with `--baseline` to spot regressions.
+
+Does not need arcpy. File geodatabases are written with GDAL's OpenFileGDB
+driver, and skipped when it can't write them (GDAL < 3.6). Times are the
+best of `--repeats` runs, so files are usually in the OS page cache.
+
+    python benchmarks/compare_bench.py --sizes 1MB 100MB 2GB --output bench.json
+    python benchmarks/compare_bench.py --artifacts raster tree --baseline bench.json
+"""
+
+import argparse
+import datetime
+import json
+import math
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import laspy
+import numpy as np
+import pyogrio
+import rasterio as rio
+from rasterio.transform import Affine
+from rasterio.windows import Window
+from shapely import points
+
+try:
+    import resource  # not on Windows
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+
+ARTIFACTS = ("raster", "las", "laz", "shapefile", "gpkg", "gdb", "tree")
+"""artifact types that can be generated"""
+SIZE_UNITS = {"KB": 1 << 10, "MB": 1 << 20, "GB": 1 << 30}
+BYTES_PER_FEATURE = 64
+"""rough size on disk of one synthetic point feature, used to size vector layers"""
+FEATURE_CHUNK = 1_000_000
+"""features or points generated and written at a time"""
+TREE_FILE_SIZE = 1 << 20
+"""size of each file in a synthetic directory tree"""
+RASTER_CHUNK_ROWS = 1024
+"""raster rows generated and written at a time"""
+COMPARATORS = {
+    "raster": ("compare_hash", "compare_raster", "compare"),
+    "las": ("compare_hash", "compare_las", "compare"),
+    "laz": ("compare_hash", "compare_las", "compare"),
+    "shapefile": ("compare_hash", "compare_shapefile", "compare"),
+    "gpkg": ("compare_hash", "compare_featureclass", "_compare_featureclass_geopandas"),
+    "gdb": ("compare_hash", "compare_featureclass", "compare_gdb", "compare"),
+    "tree": ("compare_hash", "compare_tree", "compare"),
+}
+"""Maps artifact to the names of the `compare` functions timed on it."""
+LAYER = "fc"
+"""layer name within a geopackage or geodatabase"""
+
+
+def parse_size(text: str) -> int:
+    """Parse a size such as 512KB, 10MB or 2GB into bytes."""
+    unit = text[-2:].upper()
+    if unit in SIZE_UNITS:
+        return int(float(text[:-2]) * SIZE_UNITS[unit])
+    return int(text)
+
+
+def write_raster(p: Path, nbytes: int, seed: int, **profile: Any) -> int:
+    """Write a square, tiled float32 GeoTIFF of about `nbytes` of pixels, a
+    chunk of rows at a time. The pixels depend only on `seed`. Returns the
+    number of pixels."""
+    side = max(64, math.isqrt(nbytes // 4))
+    with rio.open(
+        p,
+        "w",
+        driver="GTiff",
+        width=side,
+        height=side,
+        count=1,
+        dtype="float32",
+        crs="EPSG:26910",
+        transform=Affine(1, 0, 0, 0, -1, side),
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        BIGTIFF="IF_SAFER",
+        **profile,
+    ) as dst:
+        for row in range(0, side, RASTER_CHUNK_ROWS):
+            rows = min(RASTER_CHUNK_ROWS, side - row)
+            rng = np.random.default_rng([seed, row])
+            data = rng.normal(100, 20, size=(1, rows, side)).astype("float32")
+            dst.write(data, window=Window(0, row, side, rows))
+    return side * side
+
+
+def write_las(p: Path, nbytes: int, seed: int, compress: bool, creation: datetime.date) -> int:
+    """Write a point format 3 las/laz file of about `nbytes` of point records,
+    a chunk at a time. The points depend only on `seed`; `creation` changes
+    just the header bytes. Returns the number of points."""
+    header = laspy.LasHeader(point_format=3, version="1.2")
+    header.scales = np.array([0.01, 0.01, 0.01])
+    header.offsets = np.array([0.0, 0.0, 0.0])
+    header.creation_date = creation
+    count = max(10, nbytes // header.point_format.size)
+    with laspy.open(str(p), mode="w", header=header, do_compress=compress) as writer:
+        for start in range(0, count, FEATURE_CHUNK):
+            n = min(FEATURE_CHUNK, count - start)
+            rng = np.random.default_rng([seed, start])
+            chunk = laspy.ScaleAwarePointRecord.zeros(n, header=header)
+            chunk.X = rng.integers(0, 10_000_000, n, dtype="int32")
+            chunk.Y = rng.integers(0, 10_000_000, n, dtype="int32")
+            chunk.Z = rng.integers(0, 50_000, n, dtype="int32")
+            chunk.intensity = rng.integers(0, 65_535, n, dtype="uint16")
+            chunk.classification = rng.integers(0, 10, n, dtype="uint8")
+            writer.write_points(chunk)
+    return count
+
+
+def write_points_layer(p: Path, nbytes: int, seed: int, driver: str) -> int:
+    """Write a point layer of about `nbytes` with a few typical attribute
+    columns, a chunk of features at a time. Returns the number of features."""
+    import geopandas as gp
+
+    count = max(10, nbytes // BYTES_PER_FEATURE)
+    for start in range(0, count, FEATURE_CHUNK):
+        n = min(FEATURE_CHUNK, count - start)
+        rng = np.random.default_rng([seed, start])
+        df = gp.GeoDataFrame(
+            {
+                "id": np.arange(start, start + n, dtype="int32"),
+                "height": rng.normal(30, 10, n),
+                "label": rng.choice(["tree", "pole", "tower", "building"], n),
+            },
+            geometry=points(rng.uniform(0, 100_000, size=(n, 2))),
+            crs=26910,
+        )
+        pyogrio.write_dataframe(df, p, layer=LAYER, driver=driver, append=start > 0)
+    return count
+
+
+def write_tree(root: Path, nbytes: int, seed: int) -> int:
+    """Write a directory tree of random files, 10 per sub-directory, totalling
+    about `nbytes`. Returns the number of files."""
+    count = max(1, nbytes // TREE_FILE_SIZE)
+    size = min(nbytes, TREE_FILE_SIZE)
+    for i in range(count):
+        p = root / f"d{i // 10:04}" / f"f{i:06}.bin"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(np.random.default_rng([seed, i]).bytes(size))
+    return count
+
+
+def can_write_gdb() -> bool:
+    """True if GDAL can write file geodatabases."""
+    return "w" in pyogrio.list_drivers().get("OpenFileGDB", "")
+
+
+def generate(artifact: str, nbytes: int, directory: Path) -> tuple[Path, Path, int]:
+    """Write two copies of an artifact with the same data.
+
+    Returns:
+        tuple[Path, Path, int]: the two paths and their number of features
+            (pixels, points, features or files)
+    """
+    if artifact == "raster":
+        a, b = directory / "a.tif", directory / "b.tif"
+        write_raster(a, nbytes, 0)
+        return a, b, write_raster(b, nbytes, 0, compress="lzw")
+    if artifact in ("las", "laz"):
+        compress = artifact == "laz"
+        a, b = directory / f"a.{artifact}", directory / f"b.{artifact}"
+        write_las(a, nbytes, 0, compress, datetime.date(2024, 1, 1))
+        return a, b, write_las(b, nbytes, 0, compress, datetime.date(2024, 1, 2))
+    if artifact == "shapefile":
+        a, b = directory / "a" / "data.shp", directory / "b" / "data.shp"
+        driver = "ESRI Shapefile"
+    elif artifact == "gpkg":
+        a, b = directory / "a.gpkg", directory / "b.gpkg"
+        driver = "GPKG"
+    elif artifact == "gdb":
+        a, b = directory / "a.gdb", directory / "b.gdb"
+        driver = "OpenFileGDB"
+    elif artifact == "tree":
+        a, b = directory / "a", directory / "b"
+        write_tree(a, nbytes, 0)
+        return a, b, write_tree(b, nbytes, 0)
+    else:
+        raise ValueError(f"unknown artifact {artifact!r}")
+    a.parent.mkdir(parents=True, exist_ok=True)
+    b.parent.mkdir(parents=True, exist_ok=True)
+    write_points_layer(a, nbytes, 0, driver)
+    return a, b, write_points_layer(b, nbytes, 0, driver)
+
+
+def disk_size(p: Path) -> int:
+    """Bytes on disk of a file (with any shapefile sidecars) or directory tree."""
+    if p.is_dir():
+        return sum(f.stat().st_size for f in p.rglob("*") if f.is_file())
+    return sum(f.stat().st_size for f in p.parent.glob(f"{p.stem}.*"))
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of this process so far, in MiB, if it can be measured."""
+    status = Path("/proc/self/status")
+    if status.exists():
+        # VmHWM starts over at exec, unlike ru_maxrss which a spawned
+        # process inherits from its parent
+        for line in status.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1 << 20)
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1 << 20)  # bytes on macOS
+    return None
+
+
+def best_time(func: Callable[[], Any], repeats: int) -> tuple[float, Any]:
+    """Best wall time of `repeats` calls, and the result of the last call."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def run_case(func_name: str, path_a: Path, path_b: Path, repeats: int) -> dict[str, Any]:
+    """Time one comparator. Run in a fresh process so its peak RSS is its own."""
+    import compare
+
+    func = getattr(compare, func_name)
+    imported_rss = peak_rss_mb()
+    seconds, result = best_time(lambda: func(path_a, path_b), repeats)
+    return {
+        "seconds": seconds,
+        "same": result == [] if isinstance(result, list) else bool(result),
+        "peak_rss_mb": peak_rss_mb(),
+        "imported_rss_mb": imported_rss,
+    }
+
+
+def case_paths(artifact: str, func_name: str, a: Path, b: Path) -> tuple[Path, Path]:
+    """The paths a comparator takes: feature class comparisons take the layer."""
+    if func_name in ("compare_featureclass", "_compare_featureclass_geopandas"):
+        return a / LAYER, b / LAYER
+    return a, b
+
+
+def git_commit() -> Optional[str]:
+    """The commit being benchmarked, if this is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report_regressions(results: list[dict], baseline_file: Path, threshold: float):
+    """Print cases that got slower than in an earlier results file."""
+    baseline = json.loads(baseline_file.read_text())
+    key = lambda r: (r["artifact"], r["size"], r["comparator"])  # noqa: E731
+    before = {key(r): r for r in baseline["results"]}
+    print(f"\ncompared to {baseline_file} ({baseline.get('commit')})")
+    for result in results:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] else math.inf
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"  {' '.join(map(str, key(result))):<44}{ratio:7.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--artifacts", nargs="+", choices=ARTIFACTS, default=list(ARTIFACTS))
+    parser.add_argument("--sizes", nargs="+", default=["100KB", "10MB"], help="eg 1MB 2GB")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=Path("compare_bench.json"))
+    parser.add_argument("--baseline", type=Path, help="earlier results to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=1.2, help="slowdown ratio flagged as a regression"
+    )
+    parser.add_argument("--tmp-dir", type=Path, help="where to write artifacts (needs space)")
+    args = parser.parse_args()
+
+    results = []
+    spawn = multiprocessing.get_context("spawn")
+    for artifact in args.artifacts:
+        if artifact == "gdb" and not can_write_gdb():
+            print(f"skipping {artifact}: GDAL can't write file geodatabases")
+            continue
+        for size in args.sizes:
+            with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp:
+                print(f"writing 2 x {size} {artifact}")
+                a, b, features = generate(artifact, parse_size(size), Path(tmp))
+                total_mb = (disk_size(a) + disk_size(b)) / (1 << 20)
+                for func_name in COMPARATORS[artifact]:
+                    path_a, path_b = case_paths(artifact, func_name, a, b)
+                    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                        case = pool.submit(run_case, func_name, path_a, path_b, args.repeats)
+                        measured = case.result()
+                    seconds = measured["seconds"]
+                    result = {
+                        "artifact": artifact,
+                        "size": size,
+                        "comparator": func_name,
+                        "input_mb": total_mb,
+                        "features": features,
+                        "mb_per_s": total_mb / seconds if seconds else None,
+                        "features_per_s": 2 * features / seconds if seconds else None,
+                        **measured,
+                    }
+                    results.append(result)
+                    print(
+                        f"  {func_name:<32}{seconds:9.3f} s {result['mb_per_s'] or 0:10.1f} MB/s"
+                        f" {result['features_per_s'] or 0:14,.0f} features/s"
+                        f" {measured['peak_rss_mb'] or 0:8.0f} MB peak  same={measured['same']}"
+                    )
+
+    args.output.write_text(
+        json.dumps(
+            {
+                "commit": git_commit(),
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "repeats": args.repeats,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+    print(f"saved {args.output}")
+    if args.baseline is not None:
+        report_regressions(results, args.baseline, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
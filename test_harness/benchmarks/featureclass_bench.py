@@ -0,0 +1,78 @@
+"""
+Times `compare.compare_featureclass` (Arrow reads) against the GeoDataFrame
+implementation it replaced, on large synthetic point layers.
+
+Does not need arcpy. Layers are written to a GeoPackage by default, or to a
+file geodatabase with `--driver OpenFileGDB` (requires GDAL >= 3.6).
+
+    python benchmarks/featureclass_bench.py --features 1000000
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import geopandas as gp
+import numpy as np
+from shapely import points
+
+sys.path.insert(0, str(Path(__file__).absolute().parents[1]))
+from compare import _compare_featureclass_geopandas, compare_featureclass  # noqa: E402
+
+EXTENSIONS = {"GPKG": ".gpkg", "OpenFileGDB": ".gdb"}
+
+
+def write_layer(p: Path, layer: str, features: int, driver: str, seed: int = 0):
+    """Write a point layer with a few typical attribute columns."""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 100_000, size=(features, 2))
+    df = gp.GeoDataFrame(
+        {
+            "id": np.arange(features, dtype="int32"),
+            "height": rng.normal(30, 10, features),
+            "label": rng.choice(["tree", "pole", "tower", "building"], features),
+        },
+        geometry=points(xy),
+        crs=26910,
+    )
+    df.to_file(p, layer=layer, driver=driver, engine="pyogrio")
+
+
+def best_time(func: Callable[[], bool], repeats: int) -> tuple[float, bool]:
+    """Best wall time of `repeats` calls, and the result of the last call."""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--features", type=int, default=1_000_000)
+    parser.add_argument("--driver", choices=list(EXTENSIONS), default="GPKG")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ext = EXTENSIONS[args.driver]
+        a = Path(tmp, f"a{ext}")
+        b = Path(tmp, f"b{ext}")
+        print(f"writing 2 layers of {args.features:,} features ({args.driver})")
+        write_layer(a, "fc", args.features, args.driver)
+        write_layer(b, "fc", args.features, args.driver)
+
+        for name, func in [
+            ("geodataframe", _compare_featureclass_geopandas),
+            ("arrow", compare_featureclass),
+        ]:
+            took, same = best_time(lambda: func(a / "fc", b / "fc"), args.repeats)
+            print(f"{name:<14}{took:8.2f} s {args.features / took:14,.0f} features/s  {same=}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,91 +1,1501 @@
-import hashlib
-from hashlib import md5 as hashfunc
+import json
+import math
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+from functools import partial
+from collections import Counter
+from itertools import zip_longest
 from pathlib import Path
-from typing import Optional
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, Optional, Sequence, Union
 
+import duckdb  # required, not optional: a comparator missing on one machine changes verdicts
 import fiona
 import geopandas as gp
+import laspy
+import numpy as np
+import openpyxl
+import pyproj
+import rasterio as rio
+from rasterio.windows import Window
 
+try:
+    import pyogrio
+except ImportError:
+    pyogrio = None
+try:
+    import pyarrow  # required by pyogrio.read_arrow
+except ImportError:
+    pyarrow = None
 
-def _get_hash(p: Path, hash: Optional['hashlib._Hash'] = None) -> bytes:
-    """Gets the bytes digest of the contents of a path. If path is a single
-    file, the hash is of its content. If path is a directory, the hash is of
-    the content of all files within the tree rooted at `p` (ie recursive).
-
-    Args:
-        p (Path): a file or directory to hash
-        hash (Optional[hashlib._Hash], optional): a hash object from
-            hashlib. If None, a default hash function will be used.
-            Defaults to None.
-
-    Returns:
-        bytes: the digest of the hash. this can be compared with other digests.
-    """
-    if hash is None:
-        hash = hashfunc()
-
-    if p.is_file():
-        with p.open("rb") as file:
-            hash.update(file.read())
-    else:
-        for item in p.iterdir():
-            _get_hash(item, hash)
-
-    return hash.digest()
+from digest import (
+    CHUNK_SIZE,
+    DATASET_SIDECARS,
+    DEFAULT_ALGORITHM,
+    SHAPEFILE_SIDECARS,
+    TOUCH_SECONDS,
+    MerkleNode,
+    SqliteCache,
+    TreeEntry,
+    cached_file_digest,
+    merkle_tree,
+    new_hash,
+    path_digest,
+    walk_tree,
+)
 
 
-def compare_hash(path_a: Path, path_b: Path) -> bool:
+def compare_hash(path_a: Path, path_b: Path, algorithm: str = DEFAULT_ALGORITHM) -> bool:
     """Compares two paths for equal content based on their hashes. So paths
     will be equal only if they're exactly the same.
 
     Args:
         path_a (Path): a path to a file or directory
         path_b (Path): a path to a file or directory
+        algorithm (str, optional): hash algorithm name, see
+            `digest.HASH_ALGORITHMS`. Defaults to DEFAULT_ALGORITHM.
 
     Returns:
         bool: True if the paths are the same according to their
            hashes; False otherwise.
     """
-    return _get_hash(path_a) == _get_hash(path_b)
+    return path_digest(path_a, algorithm) == path_digest(path_b, algorithm)
 
 
-def compare_featureclass(path_a: Path, path_b: Path) -> bool:
-    """Compares two feature classes for data equality. `path_a` and `path_b`
-    should include the feature class. eg `mydata.gdb/feature_class`."""
+ARROW_READS = (
+    pyogrio is not None and pyarrow is not None and pyogrio.__gdal_version__ >= (3, 6, 0)
+)
+"""feature classes can be read as Arrow tables (needs pyogrio, pyarrow and GDAL >= 3.6)"""
+
+
+def _read_arrow(p: Path) -> tuple[dict[str, Any], 'pyarrow.Table']:
+    """Read a feature class `mydata.gdb/feature_class` as layer metadata and
+    an Arrow table with geometry as WKB."""
+    return pyogrio.read_arrow(p.parent, layer=p.name)
+
+
+def _compare_featureclass_geopandas(path_a: Path, path_b: Path) -> bool:
+    """Compares two feature classes by loading both as GeoDataFrames. Used when
+    Arrow reads are not available."""
     df_a = gp.read_file(path_a.parent, layer=path_a.name)
     df_b = gp.read_file(path_b.parent, layer=path_b.name)
     return df_a.equals(df_b)  # seems to account for geometry and crs
 
 
-def compare_gdb(path_a: Path, path_b: Path) -> bool:
-    """Compares two geodatabases for 'equality' based on their set of
-    feature classes and data equality of those feature classes.
+def compare_featureclass(path_a: Path, path_b: Path) -> bool:
+    """Compares two feature classes for data equality. `path_a` and `path_b`
+    should include the feature class. eg `mydata.gdb/feature_class`.
+
+    Both layers are read concurrently as Arrow tables. CRS, geometry type
+    and fields are compared first, then each column is compared as an Arrow
+    array, with geometry compared as WKB bytes. Falls back to GeoDataFrames
+    (Fiona) when pyogrio/pyarrow are not available.
     """
-    fcs_a = sorted(set(fiona.listlayers(path_a)))
-    fcs_b = sorted(set(fiona.listlayers(path_b)))
+    if not ARROW_READS:
+        return _compare_featureclass_geopandas(path_a, path_b)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        (meta_a, table_a), (meta_b, table_b) = pool.map(_read_arrow, (path_a, path_b))
+
+    if meta_a["crs"] != meta_b["crs"] or meta_a["geometry_type"] != meta_b["geometry_type"]:
+        return False
+    if list(meta_a["fields"]) != list(meta_b["fields"]):
+        return False
+    if table_a.schema != table_b.schema or table_a.num_rows != table_b.num_rows:
+        return False
+    return all(table_a.column(name).equals(table_b.column(name)) for name in table_a.column_names)
+
+
+GDB_WORKERS = min(4, os.cpu_count() or 1)
+"""max processes comparing the feature classes of one geodatabase at once"""
+_gdb_workers = GDB_WORKERS
+"""the default `workers` of `compare_gdb`. see `use_gdb_workers`"""
+
+
+def _layer_metadata(gdb: Path, layer: str) -> tuple:
+    """Cheap facts about a feature class or table that must match for the
+    data to be equal: feature count, geometry type, fields, CRS and extent.
+    Read from the layer's metadata without loading its features."""
+    if pyogrio is not None:
+        info = pyogrio.read_info(
+            gdb, layer=layer, force_feature_count=True, force_total_bounds=True
+        )
+        bounds = info["total_bounds"]
+        return (
+            info["features"],
+            info["geometry_type"],
+            tuple(zip(info["fields"], info["dtypes"])),
+            info["crs"],
+            None if bounds is None or np.isnan(bounds).any() else tuple(bounds),
+        )
+    with fiona.open(gdb, layer=layer) as collection:
+        return (
+            len(collection),
+            collection.schema.get("geometry"),
+            tuple(collection.schema["properties"].items()),
+            collection.crs.to_wkt(),
+            collection.bounds if len(collection) else None,
+        )
+
+
+def _gdb_layers(gdb: Path) -> list[str]:
+    """Sorted names of the feature classes and tables in a geodatabase."""
+    return sorted(set(fiona.listlayers(gdb)))
+
+
+def _same_gdb_metadata(path_a: Path, path_b: Path) -> bool:
+    """Compares the layer names and the metadata of every layer of two
+    geodatabases, without reading any features. See `_layer_metadata()`."""
+    fcs_a, fcs_b = _gdb_layers(path_a), _gdb_layers(path_b)
     if fcs_a != fcs_b:
         return False
+    with ThreadPoolExecutor() as pool:
+        meta_a = list(pool.map(partial(_layer_metadata, path_a), fcs_a))
+        meta_b = list(pool.map(partial(_layer_metadata, path_b), fcs_b))
+    return meta_a == meta_b
+
+
+def use_gdb_workers(workers: int) -> int:
+    """Sets how many processes `compare_gdb` uses when not told. A process
+    that is already one of a pool's workers sets 1, so each geodatabase is
+    compared in that worker rather than on a pool of its own.
+
+    Args:
+        workers (int): processes per geodatabase. 1 compares in this process.
+
+    Returns:
+        int: the previous number.
+    """
+    global _gdb_workers
+    previous, _gdb_workers = _gdb_workers, workers
+    return previous
+
+
+def compare_gdb(path_a: Path, path_b: Path, workers: Optional[int] = None) -> bool:
+    """Compares two geodatabases for 'equality' based on their set of
+    feature classes (and non-spatial tables) and data equality of those
+    feature classes.
+
+    Metadata of every layer in both geodatabases is compared first, failing
+    without reading any features if a count, geometry type, schema, CRS or
+    extent differs. Only then are the layers' data compared, on a pool of up
+    to `workers` processes (by default GDB_WORKERS, see `use_gdb_workers`),
+    stopping at the first layer that differs.
+    """
+    if not _same_gdb_metadata(path_a, path_b):
+        return False
+
+    workers = _gdb_workers if workers is None else workers
+    pairs = [(path_a / fc, path_b / fc) for fc in _gdb_layers(path_a)]
+    if workers <= 1 or len(pairs) <= 1:
+        return all(compare_featureclass(a, b) for a, b in pairs)
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(pairs))) as pool:
+        futures = [pool.submit(compare_featureclass, a, b) for a, b in pairs]
+        for future in as_completed(futures):
+            if not future.result():
+                pool.shutdown(wait=False, cancel_futures=True)
+                return False
+    return True
+
+
+RASTER_ATOL = 0.0
+"""default absolute tolerance for raster cell values"""
+RASTER_RTOL = 0.0
+"""default relative tolerance for raster cell values"""
+RASTER_WINDOW_PIXELS = 1 << 20
+"""target pixels per window when a raster is stored in strips rather than tiles"""
+
+
+def _raster_windows(src: 'rio.DatasetReader') -> Iterator[Window]:
+    """Windows covering a raster that follow its native block layout. Tiled
+    rasters are read tile by tile. Striped rasters (often one row per strip)
+    are read several strips at a time so each read isn't tiny."""
+    block_height, block_width = src.block_shapes[0]
+    if block_width < src.width:
+        for _, window in src.block_windows(1):
+            yield window
+        return
+    rows_per_window = max(block_height, RASTER_WINDOW_PIXELS // max(src.width, 1))
+    rows_per_window -= rows_per_window % block_height
+    for row in range(0, src.height, rows_per_window):
+        yield Window(0, row, src.width, min(rows_per_window, src.height - row))
+
+
+def _blocks_equal(
+    block_a: np.ma.MaskedArray, block_b: np.ma.MaskedArray, atol: float, rtol: float
+) -> bool:
+    """Compares two masked blocks of raster data. NoData cells must match
+    exactly, and the remaining cells must be equal within tolerance."""
+    mask_a = np.ma.getmaskarray(block_a)
+    if not np.array_equal(mask_a, np.ma.getmaskarray(block_b)):
+        return False
+    valid_a = block_a.data[~mask_a]
+    valid_b = block_b.data[~mask_a]
+    if atol == 0 and rtol == 0 and not np.issubdtype(valid_a.dtype, np.floating):
+        return np.array_equal(valid_a, valid_b)
+    return bool(np.allclose(valid_a, valid_b, rtol=rtol, atol=atol, equal_nan=True))
+
+
+def _same_raster_profile(src_a: 'rio.DatasetReader', src_b: 'rio.DatasetReader') -> bool:
+    """Compares the profile facts of two open rasters that must match for
+    their pixels to be equal: band count, shape, dtypes, CRS and transform."""
+    if (src_a.count, src_a.height, src_a.width) != (src_b.count, src_b.height, src_b.width):
+        return False
+    if src_a.dtypes != src_b.dtypes or src_a.crs != src_b.crs:
+        return False
+    return src_a.transform.almost_equals(src_b.transform)
+
+
+def compare_raster(
+    path_a: Path, path_b: Path, atol: float = RASTER_ATOL, rtol: float = RASTER_RTOL
+) -> bool:
+    """Compares two rasters for data equality, ignoring metadata and storage
+    details (compression, tiling, embedded timestamps) that change the bytes
+    but not the pixels.
+
+    Profile facts (band count, shape, dtypes, CRS and transform) are compared
+    first. The pixels are then read block by block along `path_a`'s native
+    tile/strip layout, stopping at the first block that differs, so memory
+    use is bounded by one pair of blocks regardless of raster size.
+
+    Args:
+        path_a (Path): a raster file, eg .tif
+        path_b (Path): a raster file, eg .tif
+        atol (float, optional): absolute tolerance for cell values.
+            Defaults to RASTER_ATOL.
+        rtol (float, optional): relative tolerance for cell values.
+            Defaults to RASTER_RTOL.
+
+    Returns:
+        bool: True if both rasters have the same profile and pixels
+            (including NoData cells); False otherwise.
+    """
+    with rio.open(path_a) as src_a, rio.open(path_b) as src_b:
+        if not _same_raster_profile(src_a, src_b):
+            return False
+
+        for window in _raster_windows(src_a):
+            block_a = src_a.read(window=window, masked=True)
+            block_b = src_b.read(window=window, masked=True)
+            if not _blocks_equal(block_a, block_b, atol, rtol):
+                return False
+    return True
+
+
+LAS_CHUNK_POINTS = 1_000_000
+"""points read at a time when comparing las/laz point records"""
+LAZ_BACKENDS = (laspy.LazBackend.LazrsParallel, laspy.LazBackend.Lazrs, laspy.LazBackend.Laszip)
+"""laz decompression backends in order of preference; the first available is used"""
+
+
+def _las_header_facts(header: laspy.LasHeader) -> tuple:
+    """The parts of a las header that must match for two point clouds to be
+    equal. Excludes creation date, software id and other writer details."""
+    return (
+        header.point_count,
+        header.point_format.id,
+        tuple(header.point_format.dimension_names),  # includes extra bytes
+        tuple(header.scales),
+        tuple(header.offsets),
+        tuple(header.mins),
+        tuple(header.maxs),
+        header.parse_crs(),
+    )
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, applied elementwise to uint64s"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _point_keys(points: np.ndarray) -> np.ndarray:
+    """A 64-bit hash of every record of a structured point array, computed
+    over all raw bytes of the record (ie every dimension)."""
+    raw = np.ascontiguousarray(points).view(np.uint8).reshape(len(points), -1)
+    pad = -raw.shape[1] % 8
+    if pad:
+        raw = np.pad(raw, ((0, 0), (0, pad)))
+    words = np.ascontiguousarray(raw).view(np.uint64)
+    keys = np.full(len(points), 0xCBF29CE484222325, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in words.T:
+            keys = _mix64(keys ^ column)
+    return keys
+
+
+def _multiset_signature(chunks: Iterable[np.ndarray]) -> tuple[int, int, int]:
+    """An order-independent signature of all point records in `chunks`: the
+    record count and two wrapping sums of independently mixed point keys."""
+    mask = (1 << 64) - 1
+    count = sum_a = sum_b = 0
+    with np.errstate(over="ignore"):
+        for chunk in chunks:
+            keys = _point_keys(chunk)
+            count += len(keys)
+            sum_a = (sum_a + int(keys.sum(dtype=np.uint64))) & mask
+            mixed = _mix64(keys ^ np.uint64(0x9E3779B97F4A7C15))
+            sum_b = (sum_b + int(mixed.sum(dtype=np.uint64))) & mask
+    return count, sum_a, sum_b
+
+
+def compare_las(
+    path_a: Path, path_b: Path, ordered: bool = True, chunk_points: int = LAS_CHUNK_POINTS
+) -> bool:
+    """Compares two las/laz point clouds for data equality, ignoring header
+    details (creation date, software id, laz chunking) that change the bytes
+    but not the points.
+
+    Header invariants (point count, point format and dimensions, scales,
+    offsets, bounds and CRS) are compared first. Point records are then read
+    `chunk_points` at a time from both files and compared dimension by
+    dimension on their raw (scaled integer) values, stopping at the first
+    chunk that differs, so memory use does not depend on the point count.
+
+    Tools that reorder points can be compared with `ordered=False`, which
+    compares an order-independent hash of all point records instead. eg
+    `register_comparator("las", as_comparator(partial(compare_las, ordered=False)),
+    Cost.FULL, LAS_EXTENSIONS)` replaces the registered las comparison.
+
+    Args:
+        path_a (Path): a las or laz file
+        path_b (Path): a las or laz file
+        ordered (bool, optional): points must be in the same order.
+            Defaults to True.
+        chunk_points (int, optional): points read at a time.
+            Defaults to LAS_CHUNK_POINTS.
+
+    Returns:
+        bool: True if both files have the same header invariants and
+            points; False otherwise.
+    """
+    with (
+        laspy.open(str(path_a), laz_backend=LAZ_BACKENDS) as las_a,
+        laspy.open(str(path_b), laz_backend=LAZ_BACKENDS) as las_b,
+    ):
+        if _las_header_facts(las_a.header) != _las_header_facts(las_b.header):
+            return False
+
+        chunks_a = (chunk.array for chunk in las_a.chunk_iterator(chunk_points))
+        chunks_b = (chunk.array for chunk in las_b.chunk_iterator(chunk_points))
+        if not ordered:
+            return _multiset_signature(chunks_a) == _multiset_signature(chunks_b)
+
+        for chunk_a, chunk_b in zip(chunks_a, chunks_b):
+            for name in chunk_a.dtype.names:
+                if not np.array_equal(chunk_a[name], chunk_b[name]):
+                    return False
+    return True
+
+
+DBF_CHUNK_RECORDS = 100_000
+"""dbf records read at a time when comparing shapefile attributes"""
+SHX_CHUNK_RECORDS = 1_000_000
+"""shx index entries read at a time when validating a shapefile index"""
+
+
+@dataclass(frozen=True)
+class _DbfHeader:
+    """The parts of a dbf header that describe its data. Excludes the
+    last-update date, which changes every time the file is written."""
+
+    version: int
+    language: int
+    """language driver id, ie codepage"""
+    records: int
+    header_length: int
+    record_length: int
+    fields: tuple[tuple[bytes, bytes, int, int], ...]
+    """(name, type, length, decimal count) of each field"""
+
+    def record_dtype(self) -> np.dtype:
+        """A numpy dtype for one record: the deletion flag then each field as
+        raw bytes. Falls back to one opaque value if the fields don't add up."""
+        fields = [("deleted", "S1")] + [(f"f{i}", f"S{f[2]}") for i, f in enumerate(self.fields)]
+        dtype = np.dtype(fields)
+        if dtype.itemsize != self.record_length:
+            return np.dtype([("record", f"V{self.record_length}")])
+        return dtype
+
+
+def _read_dbf_header(file: BinaryIO) -> _DbfHeader:
+    """Read a dbf header, leaving `file` positioned at the first record."""
+    head = file.read(32)
+    records, header_length, record_length = struct.unpack("<IHH", head[4:12])
+    descriptors = file.read(header_length - 32)
+    fields = []
+    for i in range(0, len(descriptors) - 31, 32):
+        d = descriptors[i : i + 32]
+        if d[0] == 0x0D:  # end of field descriptors
+            break
+        fields.append((d[:11].rstrip(b"\0"), d[11:12], d[16], d[17]))
+    file.seek(header_length)
+    return _DbfHeader(head[0], head[29], records, header_length, record_length, tuple(fields))
+
+
+def compare_dbf(path_a: Path, path_b: Path, chunk_records: int = DBF_CHUNK_RECORDS) -> bool:
+    """Compares two dbf tables (eg a shapefile's attributes) for data
+    equality, ignoring the last-update date in the header.
+
+    The headers' field definitions are compared first, then records are
+    streamed `chunk_records` at a time and compared field by field, so
+    memory use does not depend on the number of records.
+
+    Args:
+        path_a (Path): a dbf file
+        path_b (Path): a dbf file
+        chunk_records (int, optional): records read at a time.
+            Defaults to DBF_CHUNK_RECORDS.
+
+    Returns:
+        bool: True if both tables have the same fields and records; False otherwise.
+    """
+    with path_a.open("rb") as file_a, path_b.open("rb") as file_b:
+        header = _read_dbf_header(file_a)
+        if header != _read_dbf_header(file_b):
+            return False
+
+        dtype = header.record_dtype()
+        remaining = header.records
+        while remaining > 0:
+            count = min(chunk_records, remaining)
+            size = count * header.record_length
+            data_a, data_b = file_a.read(size), file_b.read(size)
+            if len(data_a) != size or len(data_b) != size:
+                return False  # truncated
+            records_a = np.frombuffer(data_a, dtype=dtype)
+            records_b = np.frombuffer(data_b, dtype=dtype)
+            for name in dtype.names:
+                if not np.array_equal(records_a[name], records_b[name]):
+                    return False
+            remaining -= count
+    return True
+
+
+def _valid_shx(shp: Path, shx: Path, chunk_records: int = SHX_CHUNK_RECORDS) -> bool:
+    """Checks that a shapefile index agrees with its shp file: matching
+    header, and record offsets that start after the header, are contiguous,
+    and end exactly at the end of the shp file. Only the index is read."""
+    with shp.open("rb") as file:
+        shp_header = file.read(100)
+    shp_words = struct.unpack(">i", shp_header[24:28])[0]  # file length in 16-bit words
+    shx_size = shx.stat().st_size
+    if (shx_size - 100) % 8 != 0 or shp.stat().st_size != shp_words * 2:
+        return False
+
+    with shx.open("rb") as file:
+        if file.read(100)[32:] != shp_header[32:]:  # shape type and bounding box
+            return False
+        expected_offset = 50  # words, right after the 100 byte shp header
+        while entries := file.read(chunk_records * 8):
+            index = np.frombuffer(entries, dtype=">i4").reshape(-1, 2)
+            offsets, lengths = index[:, 0].astype(np.int64), index[:, 1].astype(np.int64)
+            next_offsets = offsets + 4 + lengths  # 4 words of record header
+            if offsets[0] != expected_offset or not np.array_equal(offsets[1:], next_offsets[:-1]):
+                return False
+            expected_offset = next_offsets[-1]
+    return expected_offset == shp_words
+
+
+def _same_bytes(path_a: Path, path_b: Path, chunk_size: int = CHUNK_SIZE) -> bool:
+    """Compares two files byte by byte, stopping at the first differing chunk."""
+    if path_a.stat().st_size != path_b.stat().st_size:
+        return False
+    with path_a.open("rb") as file_a, path_b.open("rb") as file_b:
+        while chunk := file_a.read(chunk_size):
+            if chunk != file_b.read(chunk_size):
+                return False
+    return True
+
+
+def _same_prj(path_a: Path, path_b: Path) -> bool:
+    """Compares two .prj files, by text and then by the CRS they define."""
+    wkt_a = path_a.read_text(errors="replace").strip()
+    wkt_b = path_b.read_text(errors="replace").strip()
+    return wkt_a == wkt_b or pyproj.CRS.from_wkt(wkt_a) == pyproj.CRS.from_wkt(wkt_b)
+
+
+def _same_sidecars(path_a: Path, path_b: Path) -> bool:
+    """Compares the sidecar files of two shapefiles without reading their
+    records: which sidecars exist, the .prj CRS, the .cpg codepage, and that
+    each .shx index agrees with its .shp."""
+    for suffix in SHAPEFILE_SIDECARS:
+        if path_a.with_suffix(suffix).exists() != path_b.with_suffix(suffix).exists():
+            return False
+
+    prj_a, prj_b = path_a.with_suffix(".prj"), path_b.with_suffix(".prj")
+    if prj_a.exists() and not _same_prj(prj_a, prj_b):
+        return False
+    cpg_a, cpg_b = path_a.with_suffix(".cpg"), path_b.with_suffix(".cpg")
+    if cpg_a.exists() and cpg_a.read_text().strip().lower() != cpg_b.read_text().strip().lower():
+        return False
+    shx_a, shx_b = path_a.with_suffix(".shx"), path_b.with_suffix(".shx")
+    return not shx_a.exists() or (_valid_shx(path_a, shx_a) and _valid_shx(path_b, shx_b))
+
+
+def compare_shapefile(path_a: Path, path_b: Path) -> bool:
+    """Compares two shapefiles as whole datasets: the .shp geometry along
+    with its .shx index, .dbf attributes, .prj and .cpg sidecar files.
+    `path_a` and `path_b` are the .shp files.
+
+    Sidecar presence, .prj, .cpg and the .shx indexes are checked first.
+    Geometry records in the .shp are then streamed and compared, and the
+    .dbf records are compared field by field ignoring the header's
+    last-update date, without loading either into a GeoDataFrame.
+
+    Returns:
+        bool: True if both shapefiles have the same geometry, attributes and
+            CRS; False otherwise.
+    """
+    if not _same_sidecars(path_a, path_b):
+        return False
+    if not _same_bytes(path_a, path_b):
+        return False
+    dbf_a, dbf_b = path_a.with_suffix(".dbf"), path_b.with_suffix(".dbf")
+    return not dbf_a.exists() or compare_dbf(dbf_a, dbf_b)
+
+
+TABLE_ATOL = 0.0
+"""default absolute tolerance for numeric values in tabular files"""
+TABLE_RTOL = 0.0
+"""default relative tolerance for numeric values in tabular files"""
+_DUCKDB_NUMERIC = (
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "UHUGEINT",
+    "FLOAT",
+    "DOUBLE",
+)
+
+
+def _sql_quote(value: str, quote: str) -> str:
+    """Quote a string for sql. `quote` is ' for literals or " for identifiers."""
+    return quote + value.replace(quote, quote * 2) + quote
+
+
+def _column_differs(name: str, sql_type: str, atol: float, rtol: float) -> str:
+    """sql expression, true where column `name` differs between relations a and b"""
+    column = _sql_quote(name, '"')
+    a, b = f"a.{column}", f"b.{column}"
+    numeric = sql_type.startswith(_DUCKDB_NUMERIC + ("DECIMAL",))
+    if (atol == 0 and rtol == 0) or not numeric:
+        return f"{a} IS DISTINCT FROM {b}"
+    # as doubles, as the difference of unsigned (or huge) integers can overflow
+    diff = f"abs(CAST({a} AS DOUBLE) - CAST({b} AS DOUBLE))"
+    close = f"coalesce({diff} <= {atol!r} + {rtol!r} * abs(CAST({b} AS DOUBLE)), false)"
+    return f"NOT ({a} IS NOT DISTINCT FROM {b} OR {close})"
+
+
+def compare_csv(
+    path_a: Path,
+    path_b: Path,
+    ordered: bool = True,
+    atol: float = TABLE_ATOL,
+    rtol: float = TABLE_RTOL,
+) -> bool:
+    """Compares two delimited text files (csv, or delimited txt) for data
+    equality using DuckDB, which streams the files on all cores in bounded
+    memory. The delimiter, header and column types are detected.
+
+    Column names and types are compared first, then row counts, then the
+    rows themselves, stopping at the first difference.
+
+    Args:
+        path_a (Path): a delimited text file
+        path_b (Path): a delimited text file
+        ordered (bool, optional): rows must be in the same order. When False,
+            rows are compared as multisets (with tolerance, after sorting
+            both sides). Defaults to True.
+        atol (float, optional): absolute tolerance for numeric columns.
+            Defaults to TABLE_ATOL.
+        rtol (float, optional): relative tolerance for numeric columns.
+            Defaults to TABLE_RTOL.
+
+    Returns:
+        bool: True if both files have the same columns and rows; False
+            otherwise, including when either can't be read as a table.
+    """
+    with closing(duckdb.connect()) as con:
+        try:
+            for name, path in (("a", path_a), ("b", path_b)):
+                source = _sql_quote(str(path), "'")
+                con.execute(f"CREATE VIEW {name} AS SELECT * FROM read_csv({source})")
+            schema_a = [row[:2] for row in con.execute("DESCRIBE a").fetchall()]
+            schema_b = [row[:2] for row in con.execute("DESCRIBE b").fetchall()]
+        except duckdb.Error:
+            return False  # not tabular
+        if schema_a != schema_b:
+            return False
+
+        (rows_a,) = con.execute("SELECT count(*) FROM a").fetchone()
+        (rows_b,) = con.execute("SELECT count(*) FROM b").fetchone()
+        if rows_a != rows_b:
+            return False
+
+        if not ordered and atol == 0 and rtol == 0:
+            query = "SELECT EXISTS (SELECT * FROM a EXCEPT ALL SELECT * FROM b)"
+        else:
+            differs = " OR ".join(_column_differs(n, t, atol, rtol) for n, t in schema_a)
+            sources = "a POSITIONAL JOIN b"
+            if not ordered:
+                sorted_a = "(SELECT * FROM a ORDER BY ALL) a"
+                sorted_b = "(SELECT * FROM b ORDER BY ALL) b"
+                sources = f"{sorted_a} POSITIONAL JOIN {sorted_b}"
+            query = f"SELECT EXISTS (SELECT 1 FROM {sources} WHERE {differs})"
+        (any_differ,) = con.execute(query).fetchone()
+        return not any_differ
+
+
+def _delimited(path: Path) -> bool:
+    """True if DuckDB's sniffer splits a text file into more than one column."""
+    with closing(duckdb.connect()) as con:
+        source = _sql_quote(str(path), "'")
+        try:
+            columns = con.execute(f"DESCRIBE SELECT * FROM read_csv({source})").fetchall()
+        except duckdb.Error:
+            return False
+    return len(columns) > 1
+
+
+def _values_close(a: Any, b: Any, atol: float, rtol: float) -> bool:
+    """Compares two cell values, with tolerance for numbers"""
+    if a == b:
+        return True
+    numbers = (int, float)
+    if isinstance(a, numbers) and isinstance(b, numbers):
+        if math.isnan(a) and math.isnan(b):
+            return True
+        return abs(a - b) <= atol + rtol * abs(b)
+    return False
+
+
+def _cell_key(value: Any) -> tuple:
+    """Sort key for a cell value, ordering cells of every type consistently:
+    empty cells, then numbers (NaN first), then text, then anything else."""
+    if value is None:
+        return (0, 0.0, "")
+    if isinstance(value, (int, float)):
+        return (1, -math.inf if math.isnan(value) else value, "nan" if math.isnan(value) else "")
+    if isinstance(value, str):
+        return (2, 0.0, value)
+    text = value.isoformat() if hasattr(value, "isoformat") else repr(value)  # eg datetimes
+    return (3, 0.0, f"{type(value).__name__} {text}")
+
+
+def _cell_counted(value: Any) -> Any:
+    """A cell value as a Counter key. NaN isn't equal to itself, so it gets one key."""
+    if isinstance(value, float) and math.isnan(value):
+        return _cell_counted
+    return value
+
+
+def _sheet_rows(sheet: Any) -> Iterator[tuple]:
+    """Cell values of each row in a worksheet, without trailing empty cells."""
+    for row in sheet.iter_rows(values_only=True):
+        end = len(row)
+        while end and row[end - 1] is None:
+            end -= 1
+        yield row[:end]
+
+
+def compare_xlsx(
+    path_a: Path,
+    path_b: Path,
+    ordered: bool = True,
+    atol: float = TABLE_ATOL,
+    rtol: float = TABLE_RTOL,
+) -> bool:
+    """Compares two Excel workbooks for data equality, ignoring the embedded
+    timestamps and zip details that change the bytes. Sheet names are
+    compared first, then cell values row by row, streamed from both
+    workbooks so memory does not depend on sheet size.
+
+    Args:
+        path_a (Path): an xlsx file
+        path_b (Path): an xlsx file
+        ordered (bool, optional): rows of each sheet must be in the same order.
+            When False, each sheet's rows are compared as multisets, which
+            holds a sheet's distinct rows in memory (and sorts them, to pair
+            them up with tolerance). Defaults to True.
+        atol (float, optional): absolute tolerance for numeric cells.
+            Defaults to TABLE_ATOL.
+        rtol (float, optional): relative tolerance for numeric cells.
+            Defaults to TABLE_RTOL.
+
+    Returns:
+        bool: True if both workbooks have the same sheets and cell values;
+            False otherwise.
+    """
+    book_a = openpyxl.load_workbook(path_a, read_only=True, data_only=True)
+    book_b = openpyxl.load_workbook(path_b, read_only=True, data_only=True)
+    try:
+        if book_a.sheetnames != book_b.sheetnames:
+            return False
+        for name in book_a.sheetnames:
+            rows_a, rows_b = _sheet_rows(book_a[name]), _sheet_rows(book_b[name])
+            if not ordered and atol == 0 and rtol == 0:
+                count_a = Counter(tuple(map(_cell_counted, row)) for row in rows_a)
+                if count_a != Counter(tuple(map(_cell_counted, row)) for row in rows_b):
+                    return False
+                continue
+            if not ordered:
+                rows_a = sorted(rows_a, key=lambda row: tuple(map(_cell_key, row)))
+                rows_b = sorted(rows_b, key=lambda row: tuple(map(_cell_key, row)))
+            for row_a, row_b in zip_longest(rows_a, rows_b):
+                if row_a is None or row_b is None or len(row_a) != len(row_b):
+                    return False
+                if not all(_values_close(a, b, atol, rtol) for a, b in zip(row_a, row_b)):
+                    return False
+    finally:
+        book_a.close()
+        book_b.close()
+    return True
+
+
+class Verdict(Enum):
+    """What a comparator concluded about a pair of paths."""
+
+    EQUAL = "equal"
+    DIFFERENT = "different"
+    UNDECIDED = "undecided"
+    """the evidence the comparator looked at can't settle it"""
+
+
+class Cost(IntEnum):
+    """How much of a pair of paths a comparator reads. Cheaper comparators run first."""
+
+    STAT = 0
+    """stat() and directory listings only"""
+    HEADER = 1
+    """file headers or dataset metadata"""
+    SAMPLED = 2
+    """a small, fixed-size sample of the content"""
+    FULL = 3
+    """all of the content"""
+
+
+Decision = Union[Verdict, tuple[Verdict, Sequence[str]]]
+"""what a comparator returns: a verdict, optionally with details such as the
+relative paths that differ"""
+ComparatorFunc = Callable[[Path, Path, 'CompareSession'], Decision]
+"""compares two paths. The session memoizes facts and digests shared between comparators."""
+
+
+@dataclass(frozen=True)
+class Comparator:
+    """A registered comparison and the pairs of paths it applies to."""
+
+    name: str
+    func: ComparatorFunc
+    cost: Cost
+    extensions: frozenset[str] = frozenset()
+    """lowercase suffixes both paths must have. Empty matches any suffix."""
+    predicate: Optional[Callable[[Path, Path], bool]] = None
+    """further condition on the pair of paths"""
+    exact: bool = False
+    """compares bytes rather than data. A DIFFERENT verdict from an exact
+    comparator is ignored when a content-aware comparator also applies."""
+    version: int = 1
+    """bump when a change to `func` could change its verdicts"""
+    memoize: bool = False
+    """cache verdicts by the digests of both paths. See `VerdictCache`."""
+
+    @property
+    def content_aware(self) -> bool:
+        """True if this compares the data of particular types of path, so
+        differing bytes alone don't make those paths different."""
+        return not self.exact and bool(self.extensions or self.predicate)
+
+    def matches(self, path_a: Path, path_b: Path) -> bool:
+        """True if this comparator applies to the pair of paths."""
+        if self.extensions and not (
+            path_a.suffix.lower() in self.extensions and path_b.suffix.lower() in self.extensions
+        ):
+            return False
+        return self.predicate is None or self.predicate(path_a, path_b)
+
+
+COMPARATORS: dict[str, Comparator] = {}
+"""registered comparators by name, in registration order. See `register_comparator()`."""
+
+
+def register_comparator(
+    name: str,
+    func: ComparatorFunc,
+    cost: Cost,
+    extensions: Iterable[str] = (),
+    predicate: Optional[Callable[[Path, Path], bool]] = None,
+    exact: bool = False,
+    version: int = 1,
+    memoize: bool = False,
+) -> Comparator:
+    """Registers a comparator, replacing any registered with the same name.
+
+    The comparators that apply to a pair of paths run cheapest `cost` first
+    (in registration order within a cost class) until one of them is not
+    undecided, so expensive comparators only run when cheaper evidence
+    can't settle the result.
+
+    Args:
+        name (str): unique name, eg "raster"
+        func (ComparatorFunc): the comparison. See `as_comparator()` and
+            `as_precheck()` to adapt functions that return a bool.
+        cost (Cost): how much of the paths `func` reads
+        extensions (Iterable[str], optional): suffixes both paths must have,
+            eg (".tif", ".tiff"). Defaults to any suffix.
+        predicate (Callable[[Path, Path], bool], optional): further condition
+            on the paths. Defaults to None.
+        exact (bool, optional): `func` compares bytes, so its DIFFERENT
+            verdicts only count for paths without a content-aware
+            comparator. Defaults to False.
+        version (int, optional): version of `func`'s verdicts. Defaults to 1.
+        memoize (bool, optional): cache verdicts in the active `VerdictCache`.
+            The digests of both paths are needed to look them up, so this
+            only pays off for FULL cost comparators, which run after the
+            digests are known anyway. Defaults to False.
+
+    Returns:
+        Comparator: the registered comparator
+    """
+    extensions = frozenset(e.lower() for e in extensions)
+    comparator = Comparator(name, func, cost, extensions, predicate, exact, version, memoize)
+    COMPARATORS[name] = comparator
+    return comparator
+
+
+def comparators_for(path_a: Path, path_b: Path) -> list[Comparator]:
+    """The registered comparators that apply to a pair of paths, in the order they run."""
+    return sorted(
+        (c for c in COMPARATORS.values() if c.matches(path_a, path_b)), key=lambda c: c.cost
+    )
+
+
+def as_comparator(compare_func: Callable[[Path, Path], bool]) -> ComparatorFunc:
+    """Adapts a comparison that returns True/False (eg `compare_raster`) into
+    a comparator that is never undecided."""
+
+    def _comparator(path_a: Path, path_b: Path, session: 'CompareSession') -> Verdict:
+        return Verdict.EQUAL if compare_func(path_a, path_b) else Verdict.DIFFERENT
+
+    return _comparator
+
+
+def as_precheck(same_func: Callable[[Path, Path], bool]) -> ComparatorFunc:
+    """Adapts a check of facts that must match for two paths to be equal (eg
+    their headers) into a comparator that is DIFFERENT when the facts don't
+    match and UNDECIDED otherwise."""
+
+    def _comparator(path_a: Path, path_b: Path, session: 'CompareSession') -> Verdict:
+        return Verdict.UNDECIDED if same_func(path_a, path_b) else Verdict.DIFFERENT
+
+    return _comparator
+
+
+def _has_comparator(name: str) -> bool:
+    """True if files (or directories, eg .gdb) named like `name` have a
+    content-aware comparator, so their bytes alone don't decide equality."""
+    suffix = Path(name).suffix.lower()
+    return any(c.content_aware and suffix in c.extensions for c in COMPARATORS.values())
+
+
+def _leaf_relpath(relpath: str) -> str:
+    """The relative path of the 'leaf' a file belongs to within a directory
+    tree: the file itself, or the nearest enclosing directory that has a
+    content-aware comparator (eg `out/data.gdb` for `out/data.gdb/a00000001.gdbtable`)."""
+    parts = relpath.split("/")
+    for i, part in enumerate(parts[:-1]):
+        if _has_comparator(part):
+            return "/".join(parts[: i + 1])
+    return relpath
+
+
+@dataclass(frozen=True)
+class PathFacts:
+    """Cheap facts about a path, gathered with `stat()` and directory
+    listings only. Paths with different facts are never equal, so only facts
+    that decide equality are kept: sizes are omitted for files that have a
+    content-aware comparator."""
+
+    exists: bool
+    is_dir: bool = False
+    size: Optional[int] = None
+    """file size, if it decides equality"""
+    members: tuple[tuple[str, Optional[int]], ...] = ()
+    """(relative path, size if it decides equality) of every leaf within a
+    directory, sorted. see `_leaf_relpath`"""
+
+
+def _gather_facts(p: Path) -> tuple[PathFacts, list[TreeEntry]]:
+    """Gets the facts about a path, plus the walked files of a directory so
+    they don't need to be walked again to compute its digest."""
+    if p.is_file():
+        size = None if _has_comparator(p.name) else p.stat().st_size
+        return PathFacts(exists=True, size=size), []
+    if p.is_dir():
+        entries = walk_tree(p)
+        if _has_comparator(p.name):
+            return PathFacts(exists=True, is_dir=True), entries
+        members: dict[str, Optional[int]] = {}
+        for e in entries:
+            leaf = _leaf_relpath(e.relpath)
+            exact = leaf == e.relpath and not _has_comparator(leaf)
+            members[leaf] = e.size if exact else None
+        return PathFacts(True, True, members=tuple(members.items())), entries
+    return PathFacts(exists=False), []
+
+
+@dataclass(frozen=True)
+class Outcome:
+    """The result of comparing two paths."""
+
+    same: bool
+    comparator: Optional[str] = None
+    """name of the comparator that decided; None if all were undecided"""
+    details: tuple[str, ...] = ()
+    """eg relative paths that differ between two directories"""
+
+
+class VerdictCache(SqliteCache):
+    """A persistent cache of comparator verdicts kept in a local sqlite file,
+    so a pair of outputs that was compared before isn't compared again.
+
+    Entries are keyed by the digests of both paths, the hash algorithm and
+    the comparator's name, and store the verdict, its details and how long
+    the comparison took. An entry only matches the comparator version that
+    produced it, so bumping a comparator's version invalidates just that
+    comparator's entries. When the cache grows past `max_entries`, the least
+    recently used entries are evicted.
+    """
+
+    _table = "verdicts"
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS verdicts ("
+        "digest_a BLOB NOT NULL, "
+        "digest_b BLOB NOT NULL, "
+        "algorithm TEXT NOT NULL, "
+        "comparator TEXT NOT NULL, "
+        "version INTEGER NOT NULL, "
+        "verdict TEXT NOT NULL, "
+        "details TEXT NOT NULL, "
+        "seconds REAL NOT NULL, "
+        "last_used REAL NOT NULL, "
+        "PRIMARY KEY (digest_a, digest_b, algorithm, comparator))"
+    )
+
+    def get(
+        self, digest_a: bytes, digest_b: bytes, algorithm: str, comparator: Comparator
+    ) -> Optional[tuple[Verdict, tuple[str, ...], float]]:
+        """Look up a comparator's verdict on a pair of paths.
+
+        Args:
+            digest_a (bytes): digest of the first path
+            digest_b (bytes): digest of the second path
+            algorithm (str): hash algorithm of the digests
+            comparator (Comparator): the comparator
+
+        Returns:
+            Optional[tuple[Verdict, tuple[str, ...], float]]: the verdict, its
+                details and the seconds the comparison took, or None if the
+                pair was not compared by this version of the comparator.
+        """
+        query = (
+            "SELECT verdict, details, seconds, last_used FROM verdicts "
+            "WHERE digest_a=? AND digest_b=? AND algorithm=? AND comparator=? AND version=?"
+        )
+        touch = (
+            "UPDATE verdicts SET last_used=? "
+            "WHERE digest_a=? AND digest_b=? AND algorithm=? AND comparator=?"
+        )
+        key = (digest_a, digest_b, algorithm, comparator.name)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(query, (*key, comparator.version)).fetchone()
+            if row is None:
+                return None
+            verdict, details, seconds, last_used = row
+            now = time.time()
+            if now - last_used > TOUCH_SECONDS:
+                conn.execute(touch, (now, *key))
+        return Verdict(verdict), tuple(json.loads(details)), seconds
+
+    def put(
+        self,
+        digest_a: bytes,
+        digest_b: bytes,
+        algorithm: str,
+        comparator: Comparator,
+        verdict: Verdict,
+        details: Sequence[str],
+        seconds: float,
+    ) -> None:
+        """Remember a comparator's verdict on a pair of paths. See `get()`."""
+        upsert = (
+            "INSERT OR REPLACE INTO verdicts "
+            "(digest_a, digest_b, algorithm, comparator, version, verdict, details, seconds, "
+            "last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        row = (
+            digest_a,
+            digest_b,
+            algorithm,
+            comparator.name,
+            comparator.version,
+            verdict.value,
+            json.dumps(list(details)),
+            seconds,
+            time.time(),
+        )
+        with self._lock:
+            self._connection().execute(upsert, row)
+            self._counted_put()
+
+
+_verdict_cache: Optional[VerdictCache] = None
+"""the cache consulted for memoized comparators, if any. see `use_verdict_cache`"""
+
+
+def use_verdict_cache(cache: Optional[VerdictCache]) -> Optional[VerdictCache]:
+    """Sets the verdict cache consulted by comparators registered with
+    `memoize=True`. Pass None to disable caching.
+
+    Args:
+        cache (Optional[VerdictCache]): the cache to use, or None.
+
+    Returns:
+        Optional[VerdictCache]: the previously used cache.
+    """
+    global _verdict_cache
+    previous, _verdict_cache = _verdict_cache, cache
+    return previous
+
+
+def active_verdict_cache() -> Optional[VerdictCache]:
+    """The verdict cache set with `use_verdict_cache`, if any."""
+    return _verdict_cache
+
+
+class CompareSession:
+    """Compares paths with the registered comparators, memoizing what is
+    learned about each path (facts, digests, Merkle trees) and each pair, so
+    comparators share evidence and no path is read twice within a comparison.
+    A session assumes the paths don't change, so use one per comparison.
+
+    Args:
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+    """
+
+    def __init__(self, algorithm: str = DEFAULT_ALGORITHM):
+        self.algorithm = algorithm
+        self._facts: dict[Path, tuple[PathFacts, list[TreeEntry]]] = {}
+        self._trees: dict[Path, MerkleNode] = {}
+        self._digests: dict[Path, bytes] = {}
+        self._outcomes: dict[tuple[Path, Path], Outcome] = {}
+
+    def facts(self, p: Path) -> PathFacts:
+        """The facts about a path. See `PathFacts`."""
+        if p not in self._facts:
+            self._facts[p] = _gather_facts(p)
+        return self._facts[p][0]
+
+    def tree(self, p: Path) -> MerkleNode:
+        """The Merkle tree of a directory. The digests of everything within
+        it are remembered too."""
+        if p not in self._trees:
+            self.facts(p)
+            tree = merkle_tree(p, self.algorithm, entries=self._facts[p][1])
+            nodes = list(tree.children.values())
+            while nodes:
+                node = nodes.pop()
+                if node.is_dir:
+                    nodes.extend(node.children.values())
+                if Path(node.relpath).suffix.lower() not in DATASET_SIDECARS:
+                    self._digests.setdefault(p / node.relpath, node.digest)
+            self._trees[p] = tree
+        return self._trees[p]
+
+    def digest(self, p: Path) -> bytes:
+        """The digest of a file along with any sidecar files of its dataset
+        (see `DATASET_SIDECARS`), or the Merkle digest of a directory."""
+        if p not in self._digests:
+            if self.facts(p).is_dir:
+                self._digests[p] = self.tree(p).digest
+            else:
+                self._digests[p] = self._dataset_digest(p)
+        return self._digests[p]
+
+    def _dataset_digest(self, p: Path) -> bytes:
+        digest = cached_file_digest(p.absolute(), p.stat(), self.algorithm)
+        sidecars = [p.with_suffix(s) for s in DATASET_SIDECARS.get(p.suffix.lower(), ())]
+        sidecars = [sidecar for sidecar in sidecars if sidecar.is_file()]
+        if not sidecars:
+            return digest
+        hash = new_hash(self.algorithm)
+        hash.update(digest)
+        for sidecar in sidecars:
+            hash.update(sidecar.suffix.lower().encode() + b"\0")
+            hash.update(cached_file_digest(sidecar.absolute(), sidecar.stat(), self.algorithm))
+        return hash.digest()
+
+    def evaluate(self, path_a: Path, path_b: Path) -> Outcome:
+        """Compares two paths with the comparators that apply to them,
+        cheapest first, stopping at the first that is not undecided.
+
+        DIFFERENT from an exact (byte) comparator is ignored when a
+        content-aware comparator applies, since differing bytes may still
+        be equal data. Paths are not equal if every comparator is undecided.
+        """
+        key = (path_a, path_b)
+        if key not in self._outcomes:
+            self._outcomes[key] = self._evaluate(path_a, path_b)
+        return self._outcomes[key]
+
+    def _evaluate(self, path_a: Path, path_b: Path) -> Outcome:
+        comparators = comparators_for(path_a, path_b)
+        content_aware = any(c.content_aware for c in comparators)
+        for comparator in comparators:
+            verdict, details = self._decide(comparator, path_a, path_b)
+            if verdict is Verdict.DIFFERENT and comparator.exact and content_aware:
+                continue
+            if verdict is not Verdict.UNDECIDED:
+                return Outcome(verdict is Verdict.EQUAL, comparator.name, tuple(details))
+        return Outcome(same=False)
+
+    def differ_before_reading(self, path_a: Path, path_b: Path) -> bool:
+        """True if the comparators that read at most headers or samples of
+        two paths (see `Cost`) find them different, eg by raster profile or
+        geodatabase layers, without reading either in full."""
+        comparators = comparators_for(path_a, path_b)
+        content_aware = any(c.content_aware for c in comparators)
+        for comparator in comparators:
+            if comparator.cost not in (Cost.HEADER, Cost.SAMPLED):
+                continue
+            verdict, _ = self._decide(comparator, path_a, path_b)
+            if verdict is Verdict.DIFFERENT and not (comparator.exact and content_aware):
+                return True
+        return False
+
+    def _decide(
+        self, comparator: Comparator, path_a: Path, path_b: Path
+    ) -> tuple[Verdict, tuple[str, ...]]:
+        """Runs one comparator, or takes its verdict from the verdict cache."""
+        cache = _verdict_cache
+        if cache is None or not comparator.memoize:
+            return _split_decision(comparator.func(path_a, path_b, self))
+
+        key = (self.digest(path_a), self.digest(path_b), self.algorithm)
+        cached = cache.get(*key, comparator)
+        if cached is not None:
+            return cached[:2]
+        start = time.perf_counter()
+        verdict, details = _split_decision(comparator.func(path_a, path_b, self))
+        cache.put(*key, comparator, verdict, details, time.perf_counter() - start)
+        return verdict, details
+
+
+def _split_decision(decision: Decision) -> tuple[Verdict, tuple[str, ...]]:
+    """A comparator's decision as a verdict and (possibly no) details."""
+    if isinstance(decision, Verdict):
+        return decision, ()
+    verdict, details = decision
+    return verdict, tuple(details)
+
+
+def _tree_differences(
+    root_a: Path, tree_a: MerkleNode, root_b: Path, tree_b: MerkleNode, session: CompareSession
+) -> list[str]:
+    """Relative paths of the leaves that differ between two Merkle trees.
+    Only subtrees with different digests are descended into. Leaves with a
+    content-aware comparator (including directories such as .gdb) are
+    compared with the registered comparators, in parallel; other differing
+    leaves just differ."""
+    differences: list[str] = []
+    candidates: list[str] = []
+
+    def _visit(node_a: MerkleNode, node_b: MerkleNode):
+        if node_a.digest == node_b.digest:
+            return
+        relpath = node_a.relpath
+        if node_a.is_dir != node_b.is_dir:
+            differences.append(relpath)
+        elif not node_a.is_dir or (relpath and _has_comparator(relpath)):
+            (candidates if _has_comparator(relpath) else differences).append(relpath)
+        else:
+            for name in sorted(node_a.children.keys() | node_b.children.keys()):
+                child_a, child_b = node_a.children.get(name), node_b.children.get(name)
+                if child_a is None or child_b is None:
+                    differences.append((child_a or child_b).relpath)  # only on one side
+                else:
+                    _visit(child_a, child_b)
+
+    _visit(tree_a, tree_b)
+
+    def _same(relpath: str) -> bool:
+        return session.evaluate(root_a / relpath, root_b / relpath).same
+
+    with ThreadPoolExecutor() as pool:
+        same = pool.map(_same, candidates)
+        differences.extend(relpath for relpath, s in zip(candidates, same) if not s)
+    return sorted(differences)
+
+
+def compare_tree(path_a: Path, path_b: Path, algorithm: str = DEFAULT_ALGORITHM) -> list[str]:
+    """Compares two directory trees, reporting which of their contents differ.
+
+    A Merkle tree of file digests is built for both directories, and only
+    subtrees whose digests differ are descended into. Differing files (or
+    directories such as .gdb) that have a content-aware comparator are then
+    compared with the registered comparators in parallel, so a large tree
+    with one changed file costs one file's comparison and the difference is
+    located exactly.
+
+    Args:
+        path_a (Path): a directory
+        path_b (Path): a directory
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+
+    Returns:
+        list[str]: sorted relative paths that differ or exist on only one
+            side. Empty if the trees are "equal".
+    """
+    session = CompareSession(algorithm)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        tree_a, tree_b = pool.map(session.tree, (path_a, path_b))
+    return _tree_differences(path_a, tree_a, path_b, tree_b, session)
+
+
+def _same_facts(path_a: Path, path_b: Path, session: CompareSession) -> Verdict:
+    """Missing paths, and paths with different facts, are different. A path
+    that exists is equal to itself."""
+    facts_a, facts_b = session.facts(path_a), session.facts(path_b)
+    if not (facts_a.exists and facts_b.exists) or facts_a != facts_b:
+        return Verdict.DIFFERENT
+    return Verdict.EQUAL if path_a == path_b else Verdict.UNDECIDED
+
 
-    fcs_same = []
-    for fc_a, fc_b in zip(fcs_a, fcs_b):
-        a = path_a / fc_a
-        b = path_b / fc_b
-        fcs_same.append(compare_featureclass(a, b))
+SAMPLE_BYTES = 1 << 16
+"""bytes read from the start, middle and end of each file by the sampled comparison"""
 
-    return all(fcs_same)
 
+def _same_samples(path_a: Path, path_b: Path, session: CompareSession) -> Verdict:
+    """Compares samples from the start, middle and end of two large files of
+    equal size, so a difference is usually found without reading either in
+    full. Files that are small enough to be read whole are left undecided."""
+    size = path_a.stat().st_size
+    if size != path_b.stat().st_size:
+        return Verdict.DIFFERENT
+    if size <= 4 * SAMPLE_BYTES:
+        return Verdict.UNDECIDED
+    with path_a.open("rb") as file_a, path_b.open("rb") as file_b:
+        for offset in (0, (size - SAMPLE_BYTES) // 2, size - SAMPLE_BYTES):
+            file_a.seek(offset)
+            file_b.seek(offset)
+            if file_a.read(SAMPLE_BYTES) != file_b.read(SAMPLE_BYTES):
+                return Verdict.DIFFERENT
+    return Verdict.UNDECIDED
 
-TYPE_SPECIFIC_COMPARISONS = {
-    (".gdb", ".gdb"): compare_gdb,
-}
-"""Maps file extension to a specific comparison function for that type."""
+
+def _same_digest(path_a: Path, path_b: Path, session: CompareSession) -> Verdict:
+    """Paths with the same digest (Merkle digest for directories) are equal."""
+    return Verdict.EQUAL if session.digest(path_a) == session.digest(path_b) else Verdict.DIFFERENT
+
+
+def _same_tree(path_a: Path, path_b: Path, session: CompareSession) -> Decision:
+    """Compares two plain directories leaf by leaf. See `compare_tree()`."""
+    tree_a, tree_b = session.tree(path_a), session.tree(path_b)
+    differences = _tree_differences(path_a, tree_a, path_b, tree_b, session)
+    return (Verdict.DIFFERENT, differences) if differences else Verdict.EQUAL
+
+
+def _plain_files(path_a: Path, path_b: Path) -> bool:
+    """Both paths are files without a content-aware comparator."""
+    return path_a.is_file() and path_b.is_file() and not _has_comparator(path_a.name)
+
+
+def _plain_dirs(path_a: Path, path_b: Path) -> bool:
+    """Both paths are directories that aren't compared as a whole (eg .gdb)."""
+    return (
+        path_a.is_dir()
+        and path_b.is_dir()
+        and not _has_comparator(path_a.name)
+        and not _has_comparator(path_b.name)
+    )
+
+
+def _same_raster_header(path_a: Path, path_b: Path) -> bool:
+    with rio.open(path_a) as src_a, rio.open(path_b) as src_b:
+        return _same_raster_profile(src_a, src_b)
+
+
+def _same_las_header(path_a: Path, path_b: Path) -> bool:
+    with (
+        laspy.open(str(path_a), laz_backend=LAZ_BACKENDS) as las_a,
+        laspy.open(str(path_b), laz_backend=LAZ_BACKENDS) as las_b,
+    ):
+        return _las_header_facts(las_a.header) == _las_header_facts(las_b.header)
+
+
+def _same_dbf_header(path_a: Path, path_b: Path) -> bool:
+    with path_a.open("rb") as file_a, path_b.open("rb") as file_b:
+        return _read_dbf_header(file_a) == _read_dbf_header(file_b)
+
+
+def _same_table(path_a: Path, path_b: Path, session: CompareSession) -> Verdict:
+    """Compares delimited text files as tables (see `compare_csv`). A .txt
+    file is only a table if it has more than one column. Other text, such
+    as a report or log, is left undecided for its digest to settle, since
+    as a one-column table its quotes are stripped and its numbers coerced."""
+    if path_a.suffix.lower() == ".txt" and not (_delimited(path_a) and _delimited(path_b)):
+        return Verdict.UNDECIDED
+    return Verdict.EQUAL if compare_csv(path_a, path_b) else Verdict.DIFFERENT
+
+
+RASTER_EXTENSIONS = (".tif", ".tiff", ".img")
+"""raster formats compared by profile and pixels"""
+LAS_EXTENSIONS = (".las", ".laz")
+"""point cloud formats compared by header invariants and points"""
+TABLE_EXTENSIONS = (".csv", ".txt")
+"""delimited text formats compared as tables. A .txt file must have more than one column"""
+
+register_comparator("stat", _same_facts, Cost.STAT)
+register_comparator("gdb_metadata", as_precheck(_same_gdb_metadata), Cost.HEADER, [".gdb"])
+register_comparator(
+    "raster_profile", as_precheck(_same_raster_header), Cost.HEADER, RASTER_EXTENSIONS
+)
+register_comparator("las_header", as_precheck(_same_las_header), Cost.HEADER, LAS_EXTENSIONS)
+register_comparator("shapefile_sidecars", as_precheck(_same_sidecars), Cost.HEADER, [".shp"])
+register_comparator("dbf_header", as_precheck(_same_dbf_header), Cost.HEADER, [".dbf"])
+register_comparator("sample", _same_samples, Cost.SAMPLED, predicate=_plain_files, exact=True)
+register_comparator("digest", _same_digest, Cost.FULL, exact=True)
+register_comparator("gdb", as_comparator(compare_gdb), Cost.FULL, [".gdb"], memoize=True)
+register_comparator(
+    "raster", as_comparator(compare_raster), Cost.FULL, RASTER_EXTENSIONS, memoize=True
+)
+register_comparator("las", as_comparator(compare_las), Cost.FULL, LAS_EXTENSIONS, memoize=True)
+register_comparator(
+    "shapefile", as_comparator(compare_shapefile), Cost.FULL, [".shp"], memoize=True
+)
+register_comparator("dbf", as_comparator(compare_dbf), Cost.FULL, [".dbf"], memoize=True)
+register_comparator("table", _same_table, Cost.FULL, TABLE_EXTENSIONS, version=2, memoize=True)
+register_comparator("xlsx", as_comparator(compare_xlsx), Cost.FULL, [".xlsx"], memoize=True)
+register_comparator("tree", _same_tree, Cost.FULL, predicate=_plain_dirs)
+
+
+def equivalence_classes(
+    *paths: Path,
+    algorithm: str = DEFAULT_ALGORITHM,
+    stop_at_difference: bool = False,
+    session: Optional[CompareSession] = None,
+) -> list[list[Path]]:
+    """Groups files or directories into classes of "equal" paths. See `compare()`.
+
+    The comparison is done in stages, cheapest first, so most differences
+    are found without reading any path in full:
+    1. cheap facts (existence, size, sorted directory listing) are gathered
+       for every path, and paths are split by their facts.
+    2. paths with the same facts are split by the comparators that read
+       only headers or samples (eg raster profiles, geodatabase layers).
+    3. the digest of each path left with others is computed exactly once,
+       and paths are split by digest. Directories are hashed as Merkle trees.
+    4. one representative of each digest class is compared with the others
+       using the registered comparators (see `CompareSession.evaluate()`),
+       merging classes that are equal despite different bytes. Those
+       representatives may be read again, by content-aware comparators.
+
+    Missing paths are never equal to anything, including themselves.
+
+    Args:
+        *paths (Path): the paths to files or directories.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+        stop_at_difference (bool, optional): return as soon as more than one
+            class is known, without finishing the grouping. The classes
+            returned are then incomplete. Defaults to False.
+        session (CompareSession, optional): session to compare in, eg to
+            look at the outcomes afterwards. Defaults to a new session.
+
+    Returns:
+        list[list[Path]]: the classes of equal paths, in order of each class's
+            first path. All paths are equal when there is a single class.
+    """
+    session = session or CompareSession(algorithm)
+    unique = list(dict.fromkeys(paths))  # same path given twice is only read once
+    facts = {p: session.facts(p) for p in unique}
+
+    missing = [[p] for p in paths if not facts[p].exists]
+    existing = [p for p in unique if facts[p].exists]
+    if stop_at_difference and missing and len(paths) > 1:
+        return missing + ([existing] if existing else [])
+
+    # stage 1: split on facts
+    fact_groups: dict[PathFacts, list[Path]] = {}
+    for p in existing:
+        fact_groups.setdefault(facts[p], []).append(p)
+    if stop_at_difference and len(fact_groups) > 1:
+        return list(fact_groups.values())
+
+    # stage 2: split on headers and samples, so paths that differ there aren't read in full
+    groups: list[list[Path]] = []
+    for fact_group in fact_groups.values():
+        split: list[list[Path]] = []
+        for p in fact_group:
+            for other in split:
+                if not session.differ_before_reading(other[0], p):
+                    other.append(p)
+                    break
+            else:
+                split.append([p])
+                if stop_at_difference and len(split) > 1:
+                    return split
+        groups.extend(split)
+
+    # stage 3: digest each path once. a path alone in its group needs no digest
+    to_hash = [p for group in groups if len(group) > 1 for p in group]
+    with ThreadPoolExecutor() as pool:
+        digests = dict(zip(to_hash, pool.map(session.digest, to_hash)))
+
+    # stage 4: within each group, merge digest classes that compare equal
+    merged: list[list[Path]] = []
+    for group in groups:
+        by_digest: dict[Optional[bytes], list[Path]] = {}
+        for p in group:
+            by_digest.setdefault(digests.get(p), []).append(p)
+        group_merged: list[list[Path]] = []
+        for paths_class in by_digest.values():
+            for other in group_merged:
+                if session.evaluate(other[0], paths_class[0]).same:
+                    other.extend(paths_class)
+                    break
+            else:
+                group_merged.append(paths_class)
+                if stop_at_difference and len(group_merged) > 1:
+                    return group_merged
+        merged.extend(group_merged)
+
+    # repeat any duplicated paths within their class and order classes by first path
+    position = {p: i for i, p in reversed(list(enumerate(paths)))}
+    result = [[p for p in paths if p in c] for c in merged] + missing
+    result.sort(key=lambda c: position[c[0]])
+    return result
 
 
 def compare(path_a: Path, path_b: Path) -> bool:
     """Compares two files or directories for equality.
 
     Equality in this context means that the important data contents of
-    each file (or of all files within a directory tree) are equal.
+    each file (or of all files within a directory tree) are equal, as
+    decided by the registered comparators. See `register_comparator()`.
 
     Args:
         path_a (Path): the path to a file or directory
@@ -94,25 +1504,19 @@ def compare(path_a: Path, path_b: Path) -> bool:
     Returns:
         bool: True if both paths are "equal"; False otherwise
     """
-    file_pair_key = (path_a.suffix.lower(), path_b.suffix.lower())
+    return compare_all(path_a, path_b)
 
-    same = compare_hash(path_a, path_b)
 
-    if not same:
-        compare_func = TYPE_SPECIFIC_COMPARISONS.get(file_pair_key)
-        if compare_func is not None:
-            same = compare_func(path_a, path_b)
-
-    return same
-
-
-def compare_all(*paths: Path) -> bool:
+def compare_all(*paths: Path, session: Optional[CompareSession] = None) -> bool:
     """Compares all files or directories for equality. See `compare()`.
 
+    Every path is digested at most once, so comparing N paths costs N reads
+    rather than one per pair (plus content-aware comparisons of paths whose
+    bytes differ), and most differences are found from file sizes,
+    directory listings and headers without reading any content in full.
+    See `equivalence_classes()`.
+
     Returns:
         bool: True if all paths are "equal"; False otherwise.
     """
-    first = paths[0]
-    rest = paths[1:]
-    same = all(compare(first, other) for other in rest)
-    return same
+    return len(equivalence_classes(*paths, stop_at_difference=True, session=session)) == 1
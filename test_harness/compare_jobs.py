@@ -0,0 +1,323 @@
+"""
+Comparing the outputs of a run's tests among the envs, on a pool of
+processes with `compare --workers`, or while the run goes on with
+`run_all --compare`.
+
+This is kept apart from runner.py, which imports arcpy for running tools.
+On Windows each pool process starts afresh and imports the module of the
+function it runs. Importing arcpy there would take several seconds and
+check out a license, just to run comparators that never use it. So nothing
+imported here may import arcpy.
+"""
+
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+import formats
+
+from compare import (
+    CompareSession,
+    VerdictCache,
+    active_verdict_cache,
+    compare_all,
+    use_gdb_workers,
+    use_verdict_cache,
+)
+from db import DB
+from digest import DigestCache, active_cache, use_cache, walk_tree
+from manifest import Manifest
+from perf import PERF_ALPHA, PERF_RATIO, PerfVerdict, judge
+from test import Test
+from test_logging import setup_logger
+
+LARGE_OUTPUT_BYTES = 1 << 30
+"""total size of an output file set (all envs) above which comparing it counts as large"""
+MAX_LARGE_COMPARES = 2
+"""default number of large output comparisons run at once, to cap worker memory"""
+
+
+@dataclass(frozen=True)
+class CompareConfig:
+    """What comparing needs from the harness config (see
+    `GeneralConfig.compare_config`), so a compare worker needn't import
+    runner.py to unpickle it."""
+
+    database: Path
+    logs_dir: Path
+    envs: tuple[str, ...]
+    """env names. Each env's outputs are compared with the first's"""
+    perf_ratio: float = PERF_RATIO
+    perf_alpha: float = PERF_ALPHA
+
+
+def _output_size(p: Path) -> int:
+    """Bytes in an output file or directory tree, from stat() only. 0 if missing."""
+    if p.is_file():
+        return p.stat().st_size
+    if p.is_dir():
+        return sum(e.size for e in walk_tree(p))
+    return 0
+
+
+def compare_file_set(file_set: Sequence[Path], envs: list[str]) -> tuple[bool, list[str]]:
+    """Compares one test output among all envs. Runs in a compare worker
+    process when comparing in parallel.
+
+    Args:
+        file_set (Sequence[Path]): the output's path in each env, in env order
+        envs (list[str]): the env names
+
+    Returns:
+        tuple[bool, list[str]]: True if the output is "equal" in all envs, and
+            log lines saying how each env's output differs from the first env's.
+    """
+    session = CompareSession()
+    same = compare_all(*file_set, session=session)
+    explanation: list[str] = []
+    if not same:
+        for env, other in zip(envs[1:], file_set[1:]):
+            outcome = session.evaluate(file_set[0], other)
+            if outcome.same:
+                continue
+            explanation.append(f"   {env} differs by {outcome.comparator or 'no comparator'}")
+            explanation.extend(f"   {env} differs: {detail}" for detail in outcome.details)
+    return same, explanation
+
+
+def same_by_manifest(file_set: Sequence[Path], manifests: Sequence[Optional[Manifest]]) -> bool:
+    """True if the manifests show one test output is byte-identical in all
+    envs, without reading it. Otherwise, the digests the manifests know are
+    added to the active digest cache, so a full comparison needn't read
+    those files either.
+
+    Args:
+        file_set (Sequence[Path]): the output's path in each env, in env order
+        manifests (Sequence[Optional[Manifest]]): each env's output manifest, if any
+    """
+    listed = [
+        (manifest.algorithm, files)
+        for p, manifest in zip(file_set, manifests)
+        if manifest is not None and (files := manifest.verified(p)) is not None
+    ]
+    keys = {
+        (algorithm, tuple(sorted((k, e.size, e.digest) for k, (_, _, e) in files.items())))
+        for algorithm, files in listed
+    }
+    if len(listed) == len(file_set) and len(keys) == 1:
+        return True
+    cache = active_cache()
+    if cache is not None:
+        for algorithm, files in listed:
+            for path, st, entry in files.values():
+                cache.put(path.absolute(), st, algorithm, entry.digest)
+    return False
+
+
+def init_compare_worker(digest_cache: Optional[DigestCache], verdict_cache: Optional[VerdictCache]):
+    """Use the same caches as the parent process in a compare worker, and
+    compare geodatabases in the worker, as it is one of a pool already."""
+    use_cache(digest_cache)
+    use_verdict_cache(verdict_cache)
+    use_gdb_workers(1)
+
+
+def compare_file_sets(
+    file_sets: list[Sequence[Path]], envs: list[str], workers: int, max_large: int
+) -> Iterator[tuple[bool, list[str]]]:
+    """Compares file sets on a pool of `workers` processes, yielding each
+    result (see `compare_file_set`) in order as soon as it and all before it
+    are done. At most `max_large` large file sets (see LARGE_OUTPUT_BYTES)
+    are compared at once; smaller ones are compared meanwhile."""
+    if workers <= 1:
+        for file_set in file_sets:
+            yield compare_file_set(file_set, envs)
+        return
+
+    large = [sum(_output_size(p) for p in file_set) > LARGE_OUTPUT_BYTES for file_set in file_sets]
+    max_large = max(1, max_large)
+    waiting = list(range(len(file_sets)))  # not yet submitted, in order
+    futures: dict[int, Future] = {}
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=init_compare_worker,
+        initargs=(active_cache(), active_verdict_cache()),
+    ) as pool:
+        for i in range(len(file_sets)):
+            while not (i in futures and futures[i].done()):
+                in_flight = [j for j, future in futures.items() if not future.done()]
+                free = workers - len(in_flight)
+                large_in_flight = sum(large[j] for j in in_flight)
+                for j in list(waiting):
+                    if free <= 0:
+                        break
+                    if large[j] and large_in_flight >= max_large:
+                        continue  # hold back until a large compare finishes
+                    futures[j] = pool.submit(compare_file_set, file_sets[j], envs)
+                    waiting.remove(j)
+                    free -= 1
+                    large_in_flight += large[j]
+                running = [future for future in futures.values() if not future.done()]
+                if running:
+                    wait(running, return_when=FIRST_COMPLETED)
+            yield futures.pop(i).result()
+
+
+def _perf_verdict(
+    config: CompareConfig, db: DB, run_id: int, test_id: str, envs: list[str], warmups: int
+) -> Optional[PerfVerdict]:
+    """Whether a test of a perf run is slower in the last env than the first
+    (eg target than baseline), from the wall times of its samples."""
+    samples = db.get_wall_samples(run_id, test_id)
+    baseline, target = samples.get(envs[0], []), samples.get(envs[-1], [])
+    return judge(baseline, target, warmups, config.perf_ratio, config.perf_alpha)
+
+
+def compare_test_outputs(
+    config: CompareConfig,
+    run_id: int,
+    tests: Iterable[tuple[Path, str, Test]],
+    workers: int = 1,
+    max_large: int = MAX_LARGE_COMPARES,
+):
+    """
+    Compare every listed output of each test among the envs.
+    This is a little goofy since, until now, each env has been treated
+    separately but here they are 'grouped'.
+
+    With `workers` > 1, the outputs of all tests are compared on a pool of
+    processes, at most `max_large` large outputs at a time. Results are
+    still logged in test order, and each test's status is updated for all
+    envs at once as soon as all of its outputs are compared.
+
+    Args:
+        config (CompareConfig): what comparing needs from the harness config.
+        run_id (int): id number for the set of tool tests.
+        tests (Iterable[tuple[Path, str, Test]]): the tests to compare.
+        workers (int, optional): processes comparing outputs at once.
+            Defaults to 1, comparing in this process.
+        max_large (int, optional): large outputs compared at once. Defaults
+            to MAX_LARGE_COMPARES.
+    """
+    db = DB(str(config.database))
+    perf = db.get_perf_settings(run_id)
+
+    # all run-env logfiles will get a copy of the same messages
+    run_log_files = (config.logs_dir / formats.run_logfile(run_id, env) for env in config.envs)
+    logger = setup_logger(logging.getLogger(f"run_{run_id}"), run_log_files, add_timestamp=False)
+    envs = list(config.envs)
+
+    tests = list(tests)
+    tests_file_sets: list[list[tuple[Path, ...]]] = []
+    tests_manifested: list[list[bool]] = []
+    for test_path, test_id, test in tests:
+        # each env's output directory in test folder
+        env_output_dirs = [
+            test_path.parent / formats.single_test_outputs(env, test_id) for env in envs
+        ]
+        # expected output files from test config for each env
+        env_outputs = (
+            [p[1] for p in test.resolve_outputs(Path(), output_dir)]  # only care about output paths
+            for output_dir in env_output_dirs
+        )
+        # transform from per-env to per-file
+        file_sets = list(zip(*env_outputs))
+        tests_file_sets.append(file_sets)
+        # outputs byte-identical in every env per the manifests written when collected
+        manifests = [
+            Manifest.read(test_path.parent / formats.single_test_manifest(env, test_id), output_dir)
+            for env, output_dir in zip(envs, env_output_dirs)
+        ]
+        tests_manifested.append([same_by_manifest(fs, manifests) for fs in file_sets])
+
+    # do comparison among the other files of all tests, getting results back in order
+    all_file_sets = [
+        file_set
+        for file_sets, manifested in zip(tests_file_sets, tests_manifested)
+        for file_set, same in zip(file_sets, manifested)
+        if not same
+    ]
+    logger.debug(
+        f"{sum(map(sum, tests_manifested))} outputs identical by manifest, "
+        f"{len(all_file_sets)} to compare"
+    )
+    results = compare_file_sets(all_file_sets, envs, workers, max_large)
+
+    for i, ((test_path, test_id, test), file_sets, manifested) in enumerate(
+        zip(tests, tests_file_sets, tests_manifested)
+    ):
+        logger.info(f"{i} COMPARE {test_id}")
+        all_same = True
+        for file_set, by_manifest in zip(file_sets, manifested):
+            same, explanation = (True, []) if by_manifest else next(results)
+            all_same = all_same and same
+            logger.info(f" {same=!s:<6}{file_set[0].name}")
+            # say how each env's output differs from the first env's
+            for line in explanation:
+                logger.info(line)
+
+        # update all env entries for the test
+        result = "PASS" if all_same else "FAIL"
+        logger.info(f" {result}")
+        perf_result = None
+        if perf is not None:
+            verdict = _perf_verdict(config, db, run_id, test_id, envs, perf[1])
+            logger.info(f" PERF {verdict or 'not enough samples'}")
+            perf_result = None if verdict is None else verdict.perf_result
+        db.update_test_status_for_envs(
+            run_id, envs, test_id, "complete", compare_result=result, perf_result=perf_result
+        )
+
+
+class ComparePipeline:
+    """Compares each test of a run as soon as every env has run it, on a
+    pool of processes, while the run goes on. The tests are claimed in the
+    database first, so a test is only compared once even if other
+    `run_all --compare` or `compare` processes are also watching the run.
+
+    Args:
+        config (CompareConfig): what comparing needs from the harness config.
+        run_id (int): id number for the set of tool tests.
+        workers (int, optional): tests compared at once. Defaults to 1.
+    """
+
+    def __init__(self, config: CompareConfig, run_id: int, workers: int = 1) -> None:
+        self.config = config
+        self.run_id = run_id
+        self._db = DB(str(config.database))
+        self._pool = ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            initializer=init_compare_worker,
+            initargs=(active_cache(), active_verdict_cache()),
+        )
+        self._futures: dict[Future, str] = {}
+
+    def test_run(self, test_path: Path, test_id: str, test: Test) -> bool:
+        """Starts comparing a test if it was the last env to run it.
+
+        Returns:
+            bool: True if the test is now being compared.
+        """
+        if not self._db.claim_test_for_comparison(self.run_id, test_id):
+            return False
+        tests = [(test_path, test_id, test)]
+        future = self._pool.submit(compare_test_outputs, self.config, self.run_id, tests)
+        self._futures[future] = test_id
+        return True
+
+    def close(self, logger: logging.Logger) -> int:
+        """Waits for the comparisons started, logging any that failed.
+
+        Returns:
+            int: the number of tests compared.
+        """
+        try:
+            for future in as_completed(self._futures):
+                error = future.exception()
+                if error is not None:
+                    logger.error(f"comparing {self._futures[future]} failed: {error!r}")
+        finally:
+            self._pool.shutdown()
+        return len(self._futures)
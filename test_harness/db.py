@@ -4,31 +4,100 @@ test status.
 """
 
 from itertools import product
+import os
 import sqlite3
 from contextlib import closing
+from dataclasses import astuple, fields
 from datetime import datetime as dt  # broken for no reason
 from datetime import timezone
 from pathlib import Path
 import time
+import uuid
 from typing import Any, Generator, Iterable, Literal, Optional, Union
 
+from lease import LEASE_SECONDS, MAX_ATTEMPTS
+from scheduling import DEFAULT_ESTIMATE_SECONDS, DURATION_WEIGHT
+from usage import ResourceUsage
+
+LOCK_STALE_SECONDS = 120
+"""age after which a db.lock file is assumed abandoned. database calls take far less"""
+
+# upsert SET clause releasing a test instance's lease once it's no longer waiting or running
+_KEEP_LEASE_WHILE_RUNNING = (
+    "lease_owner=CASE WHEN excluded.status IN ('waiting', 'running') THEN lease_owner END, "
+    "lease_expires=CASE WHEN excluded.status IN ('waiting', 'running') THEN lease_expires END"
+)
+
 
 # keep multiple computers from writing to the sqlite db simultaneously
 # using super janky and probably-wont-work "lock file" to attempt to
 class Lockfile:
     """A context manager that attempts to use the existence of a file
-    as a means of synchronization across multiple PCs."""
+    as a means of synchronization across multiple PCs.
+
+    The file is created exclusively, so two processes can't both take the
+    lock, and a lock older than LOCK_STALE_SECONDS is assumed to be left by
+    a process that died holding it and is broken. Its age is measured by
+    the share's clock, as the PCs' clocks may not agree with it."""
 
     def __init__(self, file: Union[str, Path]) -> None:
         self._lockfile = Path(file).absolute()
 
     def __enter__(self) -> None:
-        while self._lockfile.exists():
+        while True:
+            try:
+                os.close(os.open(self._lockfile, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                pass
+            try:
+                locked = self._lockfile.stat().st_mtime
+                # only ask the share's clock once this one's says the lock is stale
+                if time.time() - locked > LOCK_STALE_SECONDS:
+                    if self.share_now() - locked > LOCK_STALE_SECONDS:
+                        self._lockfile.unlink(missing_ok=True)
+                        continue
+            except FileNotFoundError:
+                continue  # just released
             time.sleep(0.1)
-        self._lockfile.touch()
+
+    def share_now(self) -> float:
+        """The time by the share's clock: the mtime of a probe file written
+        next to the lock file. Every machine reads the same clock this way,
+        however far their own clocks are from it."""
+        probe = self._lockfile.with_name(f"{self._lockfile.name}.{uuid.uuid4().hex}.probe")
+        try:
+            probe.touch()
+            return probe.stat().st_mtime
+        finally:
+            probe.unlink(missing_ok=True)
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._lockfile.unlink()
+        self._lockfile.unlink(missing_ok=True)
+
+
+def _lease_modifier(lease_seconds: float) -> str:
+    """sqlite datetime() modifier for a lease's expiry from now."""
+    return f"{lease_seconds:+g} seconds"
+
+
+def _requeue_expired(
+    conn: sqlite3.Connection, now: float, max_attempts: int = MAX_ATTEMPTS
+) -> tuple[int, int]:
+    """See `DB.requeue_expired_leases`. Runs within the caller's transaction.
+    `now` is the share's time (see `Lockfile.share_now`), as are the leases'."""
+    requeue = (
+        "UPDATE test_instances SET status='queued', lease_owner=NULL, lease_expires=NULL "
+        "WHERE status IN ('waiting', 'running') AND lease_expires<datetime(?, 'unixepoch') "
+        "AND attempts<?"
+    )
+    give_up = (
+        "UPDATE test_instances "
+        "SET status='compare', run_result='FAIL', lease_owner=NULL, lease_expires=NULL "
+        "WHERE status IN ('waiting', 'running') AND lease_expires<datetime(?, 'unixepoch')"
+    )
+    requeued = conn.execute(requeue, (now, max_attempts)).rowcount
+    return requeued, conn.execute(give_up, (now,)).rowcount
 
 
 class DB:
@@ -68,7 +137,9 @@ class DB:
 
     def get_passing_views(
         self,
-    ) -> tuple[list[tuple[int, int, int, bool]], list[tuple[int, str, bool, bool, bool]]]:
+    ) -> tuple[
+        list[tuple[int, int, int, bool]], list[tuple[int, str, bool, bool, bool, Optional[bool]]]
+    ]:
         """Get the rows from views summarizing what runs and tests have
         completed and their pass/fail status.
 
@@ -77,7 +148,7 @@ class DB:
             The view data
             `complete_runs_passing` = (run_id:int, num_tests:int, num_passed:int, passed:bool)
             and
-            `complete_tests_passing` = (run_id:int, id:str, run_passed:bool, compare_passed:bool, both_passed:bool)
+            `complete_tests_passing` = (run_id:int, id:str, run_passed:bool, compare_passed:bool, both_passed:bool, perf_passed:Optional[bool])
         """
         query_runs_passing = "SELECT * FROM complete_runs_passing ORDER BY id DESC"
         query_tests_passing = "SELECT * FROM complete_tests_passing ORDER BY run_id DESC"
@@ -116,7 +187,8 @@ class DB:
             "ON CONFLICT DO UPDATE SET "
             "status=excluded.status, "
             "run_result=ifnull(excluded.run_result, run_result), "  # don't nullify existing info
-            "compare_result=ifnull(excluded.compare_result, compare_result)"
+            "compare_result=ifnull(excluded.compare_result, compare_result), "
+            f"{_KEEP_LEASE_WHILE_RUNNING}"
         )
         with (
             self._lockfile,
@@ -127,12 +199,225 @@ class DB:
             conn.execute(upsert_status, row_data)
             conn.commit()
 
+    def update_test_status_for_envs(
+        self,
+        run_id: int,
+        envs: Iterable[str],
+        test_id: str,
+        status: str,
+        run_result: Optional[str] = None,
+        compare_result: Optional[str] = None,
+        perf_result: Optional[str] = None,
+    ) -> None:
+        """Upserts a test's instances for several envs at once, in one
+        transaction. See `update_test_status`.
+
+        Args:
+            run_id (int): the id of the run in question.
+            envs (Iterable[str]): test environment names (eg baseline and target)
+            test_id (str): the test identifier (toolbox.alias.variant.subtest)
+            status (str): status string
+            run_result (Optional[str], optional): PASS/FAIL. Defaults to None.
+            compare_result (Optional[str], optional): PASS/FAIL. Defaults to None.
+            perf_result (Optional[str], optional): PASS/FAIL, for a perf run.
+                Defaults to None.
+        """
+        upsert_status = (
+            "INSERT INTO test_instances "
+            "(run_id, env, id, status, run_result, compare_result, perf_result) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT DO UPDATE SET "
+            "status=excluded.status, "
+            "run_result=ifnull(excluded.run_result, run_result), "  # don't nullify existing info
+            "compare_result=ifnull(excluded.compare_result, compare_result), "
+            "perf_result=ifnull(excluded.perf_result, perf_result), "
+            f"{_KEEP_LEASE_WHILE_RUNNING}"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            row = (status, run_result, compare_result, perf_result)
+            rows = [(run_id, env, test_id, *row) for env in envs]
+            conn.executemany(upsert_status, rows)
+
+    def fail_unfinished_test(
+        self, run_id: int, env: str, test_id: str, run_result: str = "FAIL"
+    ) -> bool:
+        """Fails a test instance that stopped without reaching the 'compare'
+        status (eg its process crashed), moving it on to 'compare' so the run
+        isn't held up waiting for it.
+
+        Args:
+            run_id (int): the id of the run in question.
+            env (str): test environment name (eg baseline or target)
+            test_id (str): the test identifier (toolbox.alias.variant.subtest)
+            run_result (str, optional): FAIL, or TIMEOUT/OOM if the test was
+                killed by the watchdog. Defaults to "FAIL".
+
+        Returns:
+            bool: True if the test was unfinished and is now failed.
+        """
+        update_status = (
+            "UPDATE test_instances "
+            "SET status='compare', run_result=?, lease_owner=NULL, lease_expires=NULL "
+            "WHERE run_id=? AND env=? AND id=? AND status IN ('queued', 'waiting', 'running')"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            return conn.execute(update_status, (run_result, run_id, env, test_id)).rowcount > 0
+
+    def record_test_usage(
+        self, run_id: int, env: str, test_id: str, usage: ResourceUsage, sample: int = 0
+    ) -> None:
+        """Saves the resources a test instance's tool used, replacing any
+        saved for it before.
+
+        Args:
+            run_id (int): the id of the run in question.
+            env (str): test environment name (eg baseline or target)
+            test_id (str): the test identifier (toolbox.alias.variant.subtest)
+            usage (ResourceUsage): what the tool used.
+            sample (int, optional): which run of the tool, in a perf run.
+                Defaults to 0.
+        """
+        columns = [f.name for f in fields(ResourceUsage)]
+        upsert_usage = (
+            f"INSERT OR REPLACE INTO test_usage (run_id, env, id, sample, {', '.join(columns)}) "
+            f"VALUES (?, ?, ?, ?, {', '.join('?' * len(columns))})"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            row_data = (run_id, env, test_id, sample, *astuple(usage))
+            conn.execute(upsert_usage, row_data)
+
+    def get_test_usage(self) -> dict[tuple[int, str], dict[str, list[ResourceUsage]]]:
+        """Gets the resources used by every test instance that recorded them,
+        leaving out the warm-up samples of perf runs.
+
+        Returns:
+            dict[tuple[int, str], dict[str, list[ResourceUsage]]]: by
+                (run_id, id), newest run first, the usage samples in each env
+                that has them, in the order run.
+        """
+        columns = [f.name for f in fields(ResourceUsage)]
+        query_usage = (
+            f"SELECT run_id, test_usage.id, env, {', '.join(columns)} "
+            "FROM test_usage INNER JOIN runs ON runs.id=run_id "
+            "WHERE perf_repeats IS NULL OR sample>=perf_warmups "
+            "ORDER BY run_id DESC, test_usage.id, sample"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            usage: dict[tuple[int, str], dict[str, list[ResourceUsage]]] = {}
+            for run_id, test_id, env, *values in conn.execute(query_usage):
+                by_env = usage.setdefault((run_id, test_id), {})
+                by_env.setdefault(env, []).append(ResourceUsage(*values))
+            return usage
+
+    def get_wall_samples(self, run_id: int, test_id: str) -> dict[str, list[float]]:
+        """Gets the wall times of every sample of a test, warm-ups included.
+
+        Args:
+            run_id (int): the id of the run in question.
+            test_id (str): the test identifier (toolbox.alias.variant.subtest)
+
+        Returns:
+            dict[str, list[float]]: by env, the wall times in the order run.
+        """
+        query_samples = (
+            "SELECT env, wall_seconds FROM test_usage WHERE run_id=? AND id=? ORDER BY sample"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            samples: dict[str, list[float]] = {}
+            for env, wall_seconds in conn.execute(query_samples, (run_id, test_id)):
+                samples.setdefault(env, []).append(wall_seconds)
+            return samples
+
+    def record_test_duration(
+        self, env: str, test_id: str, seconds: float, weight: float = DURATION_WEIGHT
+    ) -> None:
+        """Remembers how long a test took in an env, averaged with how long
+        it took before.
+
+        Args:
+            env (str): test environment name (eg baseline or target)
+            test_id (str): the test identifier (toolbox.alias.variant.subtest)
+            seconds (float): how long the test took.
+            weight (float, optional): weight of `seconds` against the test's
+                remembered duration. Defaults to DURATION_WEIGHT.
+        """
+        upsert_duration = (
+            "INSERT INTO test_durations (env, id, seconds) VALUES (?, ?, ?) "
+            "ON CONFLICT DO UPDATE SET "
+            "seconds=seconds*(1-?)+excluded.seconds*?, "
+            "samples=samples+1"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            conn.execute(upsert_duration, (env, test_id, seconds, weight, weight))
+
+    def get_test_durations(self) -> dict[tuple[str, str], float]:
+        """Gets how long each test is expected to take in each env.
+
+        Returns:
+            dict[tuple[str, str], float]: seconds by (env, id), for tests that
+                have run before.
+        """
+        query_durations = "SELECT env, id, seconds FROM test_durations"
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            return {(env, id): seconds for env, id, seconds in conn.execute(query_durations)}
+
+    def get_perf_settings(self, run_id: int) -> Optional[tuple[int, int]]:
+        """Gets how a perf run repeats its tests.
+
+        Args:
+            run_id (int): the ID for the run.
+
+        Returns:
+            Optional[tuple[int, int]]: times each test runs per env, and the
+                leading samples dropped as warm-ups. None if not a perf run.
+        """
+        query_perf = "SELECT perf_repeats, perf_warmups FROM runs WHERE id=?"
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            row = conn.execute(query_perf, (run_id,)).fetchone()
+            if row is None or row[0] is None:
+                return None
+            return row[0], row[1]
+
     def add_run_enqueue_tests(
         self,
         test_ids: Iterable[str],
         envs: list[str],
         include_passes: bool = False,
         start_local: Optional[dt] = None,
+        perf_repeats: Optional[int] = None,
+        perf_warmups: int = 0,
     ) -> tuple[int, list[str]]:
         """Creates a new run and test instances for it.
 
@@ -144,15 +429,20 @@ class DB:
             start_local (Optional[datetime], optional): The date and time after
                 which the test can begin, in the operator's local time zone.
                 Defaults to None, which means 'now'.
+            perf_repeats (Optional[int], optional): make this a perf run,
+                running each test this many times per env. Defaults to None,
+                a normal run.
+            perf_warmups (int, optional): leading samples of each test a perf
+                run drops as warm-ups. Defaults to 0.
 
         Returns:
             tuple[int, list[str]]: the newly added run ID and the test IDs enqueued.
         """
         # query_next_runid = "SELECT ifnull(max(run_id)+1, 0) FROM test_instances"
-        insert_run = "INSERT INTO runs (start) VALUES (?)"
+        insert_run = "INSERT INTO runs (start, perf_repeats, perf_warmups) VALUES (?, ?, ?)"
         query_failures = (
             "SELECT DISTINCT id FROM test_instances "  # DISTINCT not strictly required in sqlite
-            "WHERE run_result='FAIL' "
+            "WHERE run_result IN ('FAIL', 'TIMEOUT', 'OOM') "
             "AND run_id=(SELECT max(id) FROM runs) "
             "GROUP BY id"
         )
@@ -177,16 +467,25 @@ class DB:
                 conn.rollback()
                 return (-1, [])
 
-            next_runid = conn.execute(insert_run, (start,)).lastrowid
+            run_values = (start, perf_repeats, perf_warmups)
+            next_runid = conn.execute(insert_run, run_values).lastrowid
             instance_keys = [(next_runid, env, id) for env, id in product(envs, test_ids)]
             conn.executemany(insert_instance, instance_keys)
             return (next_runid, sorted(test_ids))
 
-    def dequeue_tests(self, env: str) -> tuple[int, set[str]]:
-        """Fetch 'queued' tests and change their status to 'waiting'.
+    def dequeue_tests(
+        self, env: str, owner: Optional[str] = None, lease_seconds: float = LEASE_SECONDS
+    ) -> tuple[int, set[str]]:
+        """Fetch 'queued' tests and change their status to 'waiting'. Tests
+        whose lease has expired are requeued first (see `claim_tests`).
 
         Args:
             env (str): the test environment to get tests for (eg baseline).
+            owner (Optional[str], optional): lease the tests to this owner,
+                who must renew the lease with `renew_leases`. Defaults to
+                None, no lease.
+            lease_seconds (float, optional): how long the lease lasts without
+                renewal. Defaults to LEASE_SECONDS.
 
         Returns:
             tuple[int, set[str]]: the run ID of the tests and the test IDs.
@@ -196,7 +495,8 @@ class DB:
             "AND run_id=(SELECT max(id) FROM runs WHERE start<=datetime('now'))"
         )
         update_status = (
-            "UPDATE test_instances SET status='waiting' "
+            "UPDATE test_instances SET status='waiting', "
+            "lease_owner=?, lease_expires=datetime(?, 'unixepoch', ?), attempts=attempts+1 "
             "WHERE run_id=? AND env=? AND status='queued'"
         )
 
@@ -205,6 +505,9 @@ class DB:
             closing(sqlite3.connect(self._sqlite_file)) as conn,
             conn,
         ):
+            conn.execute("BEGIN IMMEDIATE")  # no other process can claim in between
+            now = self._lockfile.share_now()
+            _requeue_expired(conn, now)
             enqueued = conn.execute(query_queued, (env,)).fetchall()
             if not enqueued:
                 return (-1, set())
@@ -212,9 +515,117 @@ class DB:
             run_ids: set[int] = set(run_id for run_id, _ in enqueued)
             assert len(run_ids) == 1
             run_id = run_ids.pop()  # get any since should be only 1
-            conn.execute(update_status, (run_id, env))
+            expires = None if owner is None else _lease_modifier(lease_seconds)
+            conn.execute(update_status, (owner, now, expires, run_id, env))
             return run_id, test_ids
 
+    def claim_tests(
+        self,
+        envs: list[str],
+        owner: str,
+        limit: int = 1,
+        lease_seconds: float = LEASE_SECONDS,
+        run_id: Optional[int] = None,
+        default_estimate_seconds: float = DEFAULT_ESTIMATE_SECONDS,
+    ) -> tuple[int, list[tuple[str, str]]]:
+        """Claim up to `limit` 'queued' test instances for one worker, moving
+        them to 'waiting' under a lease. The longest tests (by
+        `test_durations`) are claimed first. Tests whose lease has expired
+        are requeued first, or failed once claimed MAX_ATTEMPTS times.
+
+        The worker must renew its lease with `renew_leases` more often than
+        `lease_seconds`, until each test moves on to 'compare'.
+
+        Args:
+            envs (list[str]): test environments to claim tests of (eg baseline).
+            owner (str): the claiming worker, eg from `lease.worker_owner`.
+            limit (int, optional): most tests to claim. Defaults to 1.
+            lease_seconds (float, optional): how long the lease lasts without
+                renewal. Defaults to LEASE_SECONDS.
+            run_id (Optional[int], optional): the run to claim tests of.
+                Defaults to None, the latest started run.
+            default_estimate_seconds (float, optional): duration assumed for
+                tests that haven't run before. Defaults to DEFAULT_ESTIMATE_SECONDS.
+
+        Returns:
+            tuple[int, list[tuple[str, str]]]: the run ID, and the env and
+                test ID of each test claimed. -1 and none if nothing is queued.
+        """
+        run_filter = "ti.run_id=(SELECT max(id) FROM runs WHERE start<=datetime('now'))"
+        if run_id is not None:
+            run_filter = "ti.run_id=?"
+        query_queued = (
+            "SELECT ti.run_id, ti.env, ti.id FROM test_instances AS ti "
+            "LEFT JOIN test_durations AS d ON d.env=ti.env AND d.id=ti.id "
+            f"WHERE ti.status='queued' AND ti.env IN ({', '.join('?' * len(envs))}) "
+            f"AND {run_filter} "
+            "ORDER BY ifnull(d.seconds, ?) DESC, ti.id, ti.env LIMIT ?"
+        )
+        update_status = (
+            "UPDATE test_instances SET status='waiting', "
+            "lease_owner=?, lease_expires=datetime(?, 'unixepoch', ?), attempts=attempts+1 "
+            "WHERE run_id=? AND env=? AND id=? AND status='queued'"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            conn.execute("BEGIN IMMEDIATE")  # no other process can claim in between
+            now = self._lockfile.share_now()
+            _requeue_expired(conn, now)
+            run_param = () if run_id is None else (run_id,)
+            query_data = (*envs, *run_param, default_estimate_seconds, limit)
+            claimed = conn.execute(query_queued, query_data).fetchall()
+            if not claimed:
+                return (-1, [])
+            expires = _lease_modifier(lease_seconds)
+            conn.executemany(update_status, [(owner, now, expires, *row) for row in claimed])
+            return claimed[0][0], [(env, id) for _, env, id in claimed]
+
+    def renew_leases(self, owner: str, lease_seconds: float = LEASE_SECONDS) -> int:
+        """Extend the leases on an owner's waiting and running tests.
+
+        Args:
+            owner (str): the worker holding the leases.
+            lease_seconds (float, optional): how long from now the leases
+                last. Defaults to LEASE_SECONDS.
+
+        Returns:
+            int: the number of leases renewed.
+        """
+        update_lease = (
+            "UPDATE test_instances SET lease_expires=datetime(?, 'unixepoch', ?) "
+            "WHERE lease_owner=? AND status IN ('waiting', 'running')"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            expires = _lease_modifier(lease_seconds)
+            now = self._lockfile.share_now()
+            return conn.execute(update_lease, (now, expires, owner)).rowcount
+
+    def requeue_expired_leases(self, max_attempts: int = MAX_ATTEMPTS) -> tuple[int, int]:
+        """Requeue tests whose worker stopped renewing their lease (eg its
+        machine crashed), or fail them if they have been claimed
+        `max_attempts` times already.
+
+        Args:
+            max_attempts (int, optional): claims after which a test is failed
+                rather than requeued. Defaults to MAX_ATTEMPTS.
+
+        Returns:
+            tuple[int, int]: the numbers of tests requeued and failed.
+        """
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            return _requeue_expired(conn, self._lockfile.share_now(), max_attempts)
+
     def fetch_tests_for_comparison(self) -> tuple[int, set[str]]:
         """Fetch tests from latest run where all envs have moved to
         the 'compare' status. Updates them to 'comparing'.
@@ -247,6 +658,49 @@ class DB:
             conn.executemany(update_status, compares)
             return run_id, test_ids
 
+    def claim_test_for_comparison(self, run_id: int, test_id: str) -> bool:
+        """Updates a test's instances from 'compare' to 'comparing' if every
+        env has reached 'compare', so exactly one compare worker takes it.
+
+        Args:
+            run_id (int): the id of the run in question.
+            test_id (str): the test identifier (toolbox.alias.variant.subtest)
+
+        Returns:
+            bool: True if the test was claimed and should now be compared.
+        """
+        update_status = (
+            "UPDATE test_instances SET status='comparing' "
+            "WHERE run_id=? AND id=? AND status='compare' "
+            "AND (SELECT min(status='compare') FROM test_instances WHERE run_id=? AND id=?)"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            row_data = (run_id, test_id, run_id, test_id)
+            return conn.execute(update_status, row_data).rowcount > 0
+
+    def count_unfinished_tests(self) -> int:
+        """Counts the test instances of the latest run that have yet to be
+        run or reach comparison.
+
+        Returns:
+            int: instances that are queued, waiting, running or in compare.
+        """
+        query_unfinished = (
+            "SELECT count(*) FROM test_instances "
+            "WHERE run_id=(SELECT max(id) FROM runs WHERE start<=datetime('now')) "
+            "AND status IN ('queued', 'waiting', 'running', 'compare')"
+        )
+        with (
+            self._lockfile,
+            closing(sqlite3.connect(self._sqlite_file)) as conn,
+            conn,
+        ):
+            return conn.execute(query_unfinished).fetchone()[0]
+
     def set_run_endtime(self, run_id: int):
         """Update a run's end time.
 
@@ -0,0 +1,487 @@
+"""
+Content digests of files and directory trees, with an optional persistent
+cache so unchanged files are not read again.
+
+Files are read in fixed-size chunks so memory use stays flat regardless of
+file size. Directory trees are hashed as Merkle trees in sorted order, with
+each entry's name and size mixed into its directory's digest, so two
+identical trees always produce the same digest no matter how the filesystem
+lists them.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional, Union
+
+try:
+    import xxhash  # not in the prod env, but much faster than md5 when present
+except ImportError:
+    xxhash = None
+
+CHUNK_SIZE = 1 << 20
+"""bytes read at a time when hashing a file (1 MiB)"""
+
+DEFAULT_ALGORITHM = "md5"
+"""hash algorithm used when none is specified"""
+
+HASH_ALGORITHMS: dict[str, Callable[[], 'hashlib._Hash']] = {
+    "md5": hashlib.md5,
+    "blake2b": hashlib.blake2b,
+}
+"""Maps algorithm name to a constructor for a hashlib-like hash object."""
+if xxhash is not None:
+    HASH_ALGORITHMS["xxhash"] = xxhash.xxh3_128
+
+DEFAULT_CACHE_ENTRIES = 1_000_000
+"""max files remembered by a `DigestCache` before the least recently used are evicted"""
+TOUCH_SECONDS = 3600.0
+"""age of an entry's last_used before a cache hit refreshes it. hits in between don't write"""
+
+SHAPEFILE_SIDECARS = (".shx", ".dbf", ".prj", ".cpg")
+"""files that make up a shapefile along with the .shp"""
+DATASET_SIDECARS = {".shp": SHAPEFILE_SIDECARS}
+"""Maps file extension to the suffixes of sidecar files that belong to the
+same dataset, and so are part of the file's digest when comparing."""
+
+
+@dataclass(frozen=True)
+class TreeEntry:
+    relpath: str
+    """path relative to the tree root, always with forward slashes"""
+    path: Path
+    """absolute path to the file"""
+    stat: os.stat_result
+    """result of `os.stat` at the time the tree was walked"""
+
+    @property
+    def size(self) -> int:
+        return self.stat.st_size
+
+
+def new_hash(algorithm: str = DEFAULT_ALGORITHM) -> 'hashlib._Hash':
+    """Creates a new hash object for a named algorithm.
+
+    Args:
+        algorithm (str, optional): a key of `HASH_ALGORITHMS`.
+            Defaults to DEFAULT_ALGORITHM.
+
+    Raises:
+        ValueError: if the algorithm is unknown or not installed.
+
+    Returns:
+        hashlib._Hash: a fresh hash object.
+    """
+    try:
+        return HASH_ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(
+            f"unknown hash algorithm {algorithm!r}. available: {sorted(HASH_ALGORITHMS)}"
+        ) from None
+
+
+def file_digest(
+    p: Union[str, Path], algorithm: str = DEFAULT_ALGORITHM, chunk_size: int = CHUNK_SIZE
+) -> bytes:
+    """Gets the digest of a single file's content. The file is read in
+    `chunk_size` pieces into one reused buffer, so peak memory does not depend
+    on the size of the file.
+
+    Args:
+        p (Union[str, Path]): the file to hash.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+        chunk_size (int, optional): bytes per read. Defaults to CHUNK_SIZE.
+
+    Returns:
+        bytes: the digest of the file's content.
+    """
+    hash = new_hash(algorithm)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(p, "rb", buffering=0) as file:
+        while n := file.readinto(buffer):
+            hash.update(view[:n])
+    return hash.digest()
+
+
+class SqliteCache:
+    """Base for persistent caches kept in a local sqlite file, with least
+    recently used eviction. Subclasses define `_table` and its `_schema`,
+    which must have a `last_used` column.
+
+    A cache is safe to share among threads. Each process opens its own
+    connection, so a cache can also be handed to worker processes.
+    """
+
+    _table = ""
+    _schema = ""
+    _evict_every = 1000
+    """puts between eviction passes"""
+
+    def __init__(
+        self, sqlite_file: Union[str, Path], max_entries: int = DEFAULT_CACHE_ENTRIES
+    ) -> None:
+        """Set up the cache. The sqlite file is created on first use.
+
+        Args:
+            sqlite_file (Union[str, Path]): path to the cache database. This
+                should be on a local disk, not a network share.
+            max_entries (int, optional): number of entries to remember.
+                Defaults to DEFAULT_CACHE_ENTRIES.
+        """
+        self.sqlite_file = Path(sqlite_file)
+        self.max_entries = max_entries
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def __getstate__(self) -> dict:
+        # connections and locks cannot be pickled; workers reopen their own
+        return {"sqlite_file": self.sqlite_file, "max_entries": self.max_entries}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["sqlite_file"], state["max_entries"])
+
+    def _connection(self) -> sqlite3.Connection:
+        """Get this process's connection, opening it if needed. Call with `_lock` held."""
+        if self._conn is None or self._pid != os.getpid():
+            self.sqlite_file.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                str(self.sqlite_file), timeout=30, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(self._schema)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _counted_put(self) -> None:
+        """Count a put, evicting every `_evict_every` puts. Call with `_lock` held."""
+        self._puts += 1
+        if self._puts % self._evict_every == 0:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries beyond `max_entries`. Call with `_lock` held."""
+        delete_lru = (
+            f"DELETE FROM {self._table} WHERE rowid IN ("
+            f"SELECT rowid FROM {self._table} ORDER BY last_used DESC, rowid DESC "
+            "LIMIT -1 OFFSET ?)"
+        )
+        self._connection().execute(delete_lru, (self.max_entries,))
+
+    def evict(self) -> None:
+        """Remove least recently used entries beyond `max_entries`."""
+        with self._lock:
+            self._evict()
+
+    def close(self) -> None:
+        """Evict old entries and close this process's connection."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._evict()
+                self._conn.close()
+            self._conn = None
+
+
+class DigestCache(SqliteCache):
+    """A persistent cache of file digests kept in a local sqlite file.
+
+    Entries are keyed by absolute path and algorithm, and are only valid while
+    the file's size, mtime and inode (file index on Windows) are unchanged, so
+    a cache hit costs a single `stat()` instead of reading the whole file.
+    When the cache grows past `max_entries`, the least recently used entries
+    are evicted.
+    """
+
+    _table = "digests"
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS digests ("
+        "path TEXT NOT NULL, "
+        "algorithm TEXT NOT NULL, "
+        "size INTEGER NOT NULL, "
+        "mtime_ns INTEGER NOT NULL, "
+        "inode INTEGER NOT NULL, "
+        "digest BLOB NOT NULL, "
+        "last_used REAL NOT NULL, "
+        "PRIMARY KEY (path, algorithm))"
+    )
+
+    def get(self, path: Path, st: os.stat_result, algorithm: str) -> Optional[bytes]:
+        """Look up the digest of a file.
+
+        Args:
+            path (Path): absolute path to the file.
+            st (os.stat_result): current stat of the file.
+            algorithm (str): hash algorithm name.
+
+        Returns:
+            Optional[bytes]: the cached digest, or None if the file is not
+                cached or has changed since it was cached.
+        """
+        query = (
+            "SELECT digest, last_used FROM digests "
+            "WHERE path=? AND algorithm=? AND size=? AND mtime_ns=? AND inode=?"
+        )
+        touch = "UPDATE digests SET last_used=? WHERE path=? AND algorithm=?"
+        key = (str(path), algorithm)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(query, (*key, st.st_size, st.st_mtime_ns, st.st_ino)).fetchone()
+            if row is None:
+                return None
+            digest, last_used = row
+            now = time.time()
+            if now - last_used > TOUCH_SECONDS:
+                conn.execute(touch, (now, *key))
+            return digest
+
+    def put(self, path: Path, st: os.stat_result, algorithm: str, digest: bytes) -> None:
+        """Remember the digest of a file.
+
+        Args:
+            path (Path): absolute path to the file.
+            st (os.stat_result): stat of the file taken before it was hashed.
+            algorithm (str): hash algorithm name.
+            digest (bytes): the file's digest.
+        """
+        upsert = (
+            "INSERT OR REPLACE INTO digests "
+            "(path, algorithm, size, mtime_ns, inode, digest, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)"
+        )
+        row = (
+            str(path),
+            algorithm,
+            st.st_size,
+            st.st_mtime_ns,
+            st.st_ino,
+            digest,
+            time.time(),
+        )
+        with self._lock:
+            self._connection().execute(upsert, row)
+            self._counted_put()
+
+
+_cache: Optional[DigestCache] = None
+"""the cache consulted by `path_digest`, if any. see `use_cache`"""
+
+
+def use_cache(cache: Optional[DigestCache]) -> Optional[DigestCache]:
+    """Sets the digest cache consulted by `path_digest` and functions that
+    call it (eg `compare.compare_hash`). Pass None to disable caching.
+
+    Args:
+        cache (Optional[DigestCache]): the cache to use, or None.
+
+    Returns:
+        Optional[DigestCache]: the previously used cache.
+    """
+    global _cache
+    previous, _cache = _cache, cache
+    return previous
+
+
+def active_cache() -> Optional[DigestCache]:
+    """The digest cache set with `use_cache`, if any."""
+    return _cache
+
+
+def cached_file_digest(
+    p: Path, st: os.stat_result, algorithm: str = DEFAULT_ALGORITHM
+) -> bytes:
+    """Gets the digest of a file from the active cache, hashing it and
+    updating the cache on a miss.
+
+    Args:
+        p (Path): absolute path to the file.
+        st (os.stat_result): current stat of the file.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+
+    Returns:
+        bytes: the digest of the file's content.
+    """
+    cache = _cache
+    if cache is None:
+        return file_digest(p, algorithm)
+    digest = cache.get(p, st, algorithm)
+    if digest is None:
+        digest = file_digest(p, algorithm)
+        cache.put(p, st, algorithm, digest)
+    return digest
+
+
+def walk_tree(root: Union[str, Path]) -> list[TreeEntry]:
+    """Lists every file within the tree rooted at `root`, sorted by relative path.
+    Directories themselves are not listed, so empty directories are ignored.
+
+    Args:
+        root (Union[str, Path]): the directory to walk.
+
+    Returns:
+        list[TreeEntry]: one entry per file, in a stable order.
+    """
+    root = Path(root).absolute()
+    entries: list[TreeEntry] = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath, name)
+            relpath = path.relative_to(root).as_posix()
+            entries.append(TreeEntry(relpath, path, path.stat()))
+    entries.sort(key=lambda e: e.relpath)
+    return entries
+
+
+def map_file_digests(
+    entries: Iterable[TreeEntry], algorithm: str = DEFAULT_ALGORITHM, workers: Optional[int] = None
+) -> list[bytes]:
+    """Gets the digest of many files, hashing them on a thread pool. hashlib
+    releases the GIL while hashing, so threads overlap both reads and hashing.
+    Files found in the active cache are not read.
+
+    Args:
+        entries (Iterable[TreeEntry]): the files to hash.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+        workers (Optional[int], optional): max threads. None uses the
+            ThreadPoolExecutor default. Defaults to None.
+
+    Returns:
+        list[bytes]: digests in the same order as `entries`.
+    """
+
+    def _digest(entry: TreeEntry) -> bytes:
+        return cached_file_digest(entry.path, entry.stat, algorithm)
+
+    entries = list(entries)
+    if len(entries) <= 1 or workers == 1:
+        return [_digest(e) for e in entries]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_digest, entries))
+
+
+@dataclass(frozen=True)
+class MerkleNode:
+    """A file or directory in a Merkle tree of digests. A directory's digest
+    covers the names, kinds, sizes and digests of its children, so two
+    subtrees with equal digests have identical contents and only subtrees
+    whose digests differ need to be looked into."""
+
+    relpath: str
+    """path relative to the tree root, always with forward slashes. "" for the root"""
+    digest: bytes
+    size: int
+    """file size, or total size of all files within a directory"""
+    children: Optional[dict[str, 'MerkleNode']] = None
+    """a directory's children by name, sorted. None for files"""
+
+    @property
+    def is_dir(self) -> bool:
+        return self.children is not None
+
+
+def _merkle_dir(relpath: str, listing: dict[str, Any], algorithm: str) -> MerkleNode:
+    """Build the node for a directory from a nested listing of its contents,
+    where subdirectories are dicts and files are already MerkleNodes."""
+    children: dict[str, MerkleNode] = {}
+    for name in sorted(listing):
+        child = listing[name]
+        if isinstance(child, dict):
+            child = _merkle_dir(f"{relpath}/{name}" if relpath else name, child, algorithm)
+        children[name] = child
+
+    hash = new_hash(algorithm)
+    for name, child in children.items():
+        hash.update(name.encode("utf-8"))
+        hash.update(b"\0d" if child.is_dir else b"\0f")
+        hash.update(child.size.to_bytes(8, "little"))
+        hash.update(child.digest)
+    return MerkleNode(relpath, hash.digest(), sum(c.size for c in children.values()), children)
+
+
+def merkle_tree(
+    root: Union[str, Path],
+    algorithm: str = DEFAULT_ALGORITHM,
+    workers: Optional[int] = None,
+    entries: Optional[list[TreeEntry]] = None,
+) -> MerkleNode:
+    """Builds a Merkle tree of the digests of all files within `root`.
+
+    Args:
+        root (Union[str, Path]): the directory to hash.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+        workers (Optional[int], optional): max threads for hashing files.
+            Defaults to None.
+        entries (Optional[list[TreeEntry]], optional): the result of
+            `walk_tree(root)`, if already known. Defaults to None.
+
+    Returns:
+        MerkleNode: the root of the tree.
+    """
+    if entries is None:
+        entries = walk_tree(root)
+    digests = map_file_digests(entries, algorithm, workers)
+
+    listing: dict[str, Any] = {}
+    for entry, digest in zip(entries, digests):
+        *parents, name = entry.relpath.split("/")
+        directory = listing
+        for parent in parents:
+            directory = directory.setdefault(parent, {})
+        directory[name] = MerkleNode(entry.relpath, digest, entry.size)
+    return _merkle_dir("", listing, algorithm)
+
+
+def tree_digest(
+    root: Union[str, Path], algorithm: str = DEFAULT_ALGORITHM, workers: Optional[int] = None
+) -> bytes:
+    """Gets the digest of all files within the tree rooted at `root`. This is
+    the digest of the root of its `merkle_tree`.
+
+    Args:
+        root (Union[str, Path]): the directory to hash.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+        workers (Optional[int], optional): max threads for hashing files.
+            Defaults to None.
+
+    Returns:
+        bytes: the digest of the tree.
+    """
+    return merkle_tree(root, algorithm, workers).digest
+
+
+def path_digest(
+    p: Union[str, Path], algorithm: str = DEFAULT_ALGORITHM, workers: Optional[int] = None
+) -> bytes:
+    """Gets the digest of the contents of a path. If path is a single file,
+    the digest is of its content. If path is a directory, the digest is of
+    the content, relative paths, and sizes of all files within the tree
+    rooted at `p` (ie recursive). Digests of unchanged files come from the
+    active `DigestCache`, if one is set with `use_cache`.
+
+    Args:
+        p (Union[str, Path]): a file or directory to hash.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+        workers (Optional[int], optional): max threads for hashing the files
+            of a directory. Defaults to None.
+
+    Raises:
+        FileNotFoundError: if `p` does not exist.
+
+    Returns:
+        bytes: the digest. this can be compared with other digests of the
+            same algorithm.
+    """
+    p = Path(p).absolute()
+    if p.is_file():
+        return cached_file_digest(p, p.stat(), algorithm)
+    if p.is_dir():
+        return tree_digest(p, algorithm, workers)
+    raise FileNotFoundError(f"cannot hash {p}: no such file or directory")
@@ -9,6 +9,16 @@ def single_test_logfile(run_id: int, env: str, test_id: str) -> str:
     return f"{run_id:03d}_{env}_{test_id}.log"
 
 
+def single_test_console_logfile(run_id: int, env: str, test_id: str) -> str:
+    """Format the filename for a single tool test's captured console output."""
+    return f"{run_id:03d}_{env}_{test_id}_console.log"
+
+
+def worker_logfile(env: str, number: int) -> str:
+    """Format the filename for a warm worker's console output."""
+    return f"worker_{env}_{number:03d}.log"
+
+
 def single_test_inputs(env: str, test_id: str) -> str:
     """Format the temp input dir for a single tool test."""
     return f"inputs_{env}_{test_id}"
@@ -19,6 +29,11 @@ def single_test_outputs(env: str, test_id: str) -> str:
     return f"outputs_{env}_{test_id}"
 
 
+def single_test_manifest(env: str, test_id: str) -> str:
+    """Format the filename for the manifest of a single tool test's output dir."""
+    return f"outputs_{env}_{test_id}.manifest.json"
+
+
 def run_logfile(run_id: int, env: str) -> str:
     """Format the filename for a run's log."""
     return f"{run_id:03d}_{env}.log"
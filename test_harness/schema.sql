@@ -3,7 +3,14 @@
 create table if not exists runs (
     id integer primary key autoincrement, -- can be obtained in python via cursor.lastrowid on INSERT
     start timestamp, -- tests for this run cannot run before `start`
-    end timestamp default null -- when run finished
+    end timestamp default null, -- when run finished
+    -- a perf run (enqueue --perf) runs each test this many times per env,
+    -- dropping the first perf_warmups samples. null for a normal run.
+    -- added later, older databases need:
+    --   alter table runs add column perf_repeats integer default null;
+    --   alter table runs add column perf_warmups integer default 0;
+    perf_repeats integer default null,
+    perf_warmups integer default 0
 );
 
 -- a test_instance represents a single tool running in an environment.
@@ -19,13 +26,57 @@ create table if not exists test_instances(
     env text not null, -- baseline, target
     id text not null,
     status text not null, -- queued, waiting, running, compare, comparing, complete
-    run_result text default null, -- PASS, FAIL
+    run_result text default null, -- PASS, FAIL, TIMEOUT, OOM (killed by the watchdog)
     compare_result text default null, -- PASS, FAIL
+    -- PASS, FAIL (target significantly slower than baseline). perf runs only.
+    -- added later, older databases need (and to drop and recreate the views):
+    --   alter table test_instances add column perf_result text default null;
+    perf_result text default null,
+    -- a worker claims a test by leasing it, and renews the lease while it
+    -- runs the test. a test whose lease expires is requeued (see lease.py).
+    -- added later, older databases need:
+    --   alter table test_instances add column lease_owner text default null;
+    --   alter table test_instances add column lease_expires timestamp default null;
+    --   alter table test_instances add column attempts integer not null default 0;
+    lease_owner text default null, -- host:pid of the worker
+    lease_expires timestamp default null, -- utc, by the share's clock (see db.Lockfile)
+    attempts integer not null default 0, -- times the test was claimed
 
     primary key (run_id, env, id)
     -- foreign key (run_id) references runs(id) on delete cascade
 );
 
+-- resources a test_instance's tool used while it ran, measured by the
+-- process running it. a test killed by the watchdog has no row. a perf run
+-- has a row per sample, numbered from 0 including the warm-ups.
+create table if not exists test_usage(
+    run_id integer not null,
+    env text not null,
+    id text not null,
+    sample integer not null default 0,
+    wall_seconds real not null,
+    user_seconds real default null, -- CPU time, including child processes
+    system_seconds real default null,
+    peak_rss_mb real default null, -- peak resident memory of the process tree
+    read_bytes integer default null,
+    write_bytes integer default null,
+
+    primary key (run_id, env, id, sample)
+    -- foreign key (run_id, env, id) references test_instances(run_id, env, id)
+);
+
+-- how long each test takes to run in an env, remembered across runs to
+-- schedule the longest tests first. seconds is a weighted average of the
+-- whole job (staging inputs, running, collecting outputs) per sample.
+create table if not exists test_durations(
+    env text not null,
+    id text not null,
+    seconds real not null,
+    samples integer not null default 1, -- jobs averaged into seconds
+
+    primary key (env, id)
+);
+
 -- Get complete test_instances pass/fail status per tool.
 create view if not exists complete_tests_passing as 
     -- cannot use run_passed and compare_passed within SELECT
@@ -35,7 +86,10 @@ create view if not exists complete_tests_passing as
             run_id, 
             id, 
             cast(min(ifnull(run_result, 0)='PASS') as boolean) as run_passed, 
-            cast(min(ifnull(compare_result, 0)='PASS') as boolean) as compare_passed 
+            cast(min(ifnull(compare_result, 0)='PASS') as boolean) as compare_passed,
+            -- null unless a perf run
+            case when count(perf_result)=0 then null
+                else cast(min(perf_result='PASS') as boolean) end as perf_passed
         from 
             test_instances
         where
@@ -48,7 +102,8 @@ create view if not exists complete_tests_passing as
         id, 
         run_passed, 
         compare_passed, 
-        cast(min(run_passed, compare_passed) as boolean) as both_passed
+        cast(min(run_passed, compare_passed) as boolean) as both_passed,
+        perf_passed
     from complete_tests;
 
 -- Get complete runs pass/fail status.
@@ -0,0 +1,337 @@
+"""
+A local, size-bounded, content-addressed store of test input files, so
+inputs on the network share are fetched once per distinct content rather
+than once per test, env and run.
+
+Each input file is looked up by the digest of its content. The digest of an
+unchanged source file is remembered by path, size and mtime (see
+`digest.DigestCache`), so a repeat run only needs a `stat()` of each input
+on the share. Files not yet in the store are copied in once, hashed while
+they are copied. A test's temp inputs are then built from the store with
+reflinks (copy-on-write clones) where the filesystem supports them,
+otherwise hardlinks, otherwise plain copies.
+
+Hardlinks share the stored file, so a tool that writes into its inputs in
+place would change the store. They are only used for tests that opt in
+with `link_inputs = true`, others get reflinks or copies. As a
+safeguard, a stored file whose size or mtime no longer matches what was
+recorded is discarded and fetched again.
+
+Processes sharing a store take its lock file to add or evict files. A file
+the store can't take or hand out, eg one another process has open on
+Windows, is copied straight from the source instead.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    import fcntl  # not on Windows
+except ImportError:
+    fcntl = None
+
+from db import Lockfile
+from digest import DEFAULT_ALGORITHM, DigestCache, SqliteCache, TreeEntry, new_hash
+from transfer import DEFAULT_COPY_WORKERS, copy_file
+
+DEFAULT_STAGING_BYTES = 50 << 30
+"""bytes kept in a `StagingCache` before the least recently used files are evicted (50 GiB)"""
+FICLONE = 0x40049409
+"""linux ioctl that clones (reflinks) one file into another, eg on btrfs and xfs"""
+
+
+@dataclass(frozen=True)
+class StageStats:
+    """What staging a test's inputs took."""
+
+    files: int
+    bytes: int
+    """total size of the staged files"""
+    fetched_files: int
+    """files copied from the source because their content wasn't stored yet"""
+    fetched_bytes: int
+    reflinked: int
+    hardlinked: int
+    copied: int
+    seconds: float
+
+    def __str__(self) -> str:
+        fetch_rate = self.fetched_bytes / self.seconds / (1 << 20) if self.seconds > 0 else 0.0
+        return (
+            f"{self.files} files ({self.bytes:,} bytes) in {self.seconds:.1f}s, "
+            f"fetched {self.fetched_files} ({self.fetched_bytes:,} bytes) at {fetch_rate:.1f} MiB/s"
+        )
+
+
+def _reflink(src: Path, dst: Path) -> bool:
+    """Clone `src` to `dst` with a copy-on-write reflink if the platform
+    and filesystem support it. Returns False if not, leaving no `dst`."""
+    if fcntl is None:
+        return False
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+            ok = True
+        except OSError:
+            ok = False
+    if not ok:
+        dst.unlink()
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def _walk_inputs(root: Path) -> tuple[list[str], list[TreeEntry]]:
+    """List the directories (including empty ones) and files within `root`,
+    by path relative to root."""
+    dirs: list[str] = []
+    files: list[TreeEntry] = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames:
+            dirs.append(Path(dirpath, name).relative_to(root).as_posix())
+        for name in filenames:
+            path = Path(dirpath, name)
+            files.append(TreeEntry(path.relative_to(root).as_posix(), path, path.stat()))
+    return sorted(dirs), sorted(files, key=lambda e: e.relpath)
+
+
+class StagingCache(SqliteCache):
+    """A store of input files by content digest on a local disk, with least
+    recently used eviction once the stored files pass `max_bytes`. Stores in
+    the same directory can be shared by several processes.
+
+    Args:
+        root (Union[str, Path]): local directory for the store. Should be on
+            the same volume as the temp inputs, so they can be hardlinked.
+        max_bytes (int, optional): total size of stored files to keep.
+            Defaults to DEFAULT_STAGING_BYTES.
+        algorithm (str, optional): hash algorithm name. Defaults to DEFAULT_ALGORITHM.
+    """
+
+    _table = "blobs"
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS blobs ("
+        "digest TEXT NOT NULL PRIMARY KEY, "
+        "size INTEGER NOT NULL, "
+        "mtime_ns INTEGER NOT NULL, "
+        "last_used REAL NOT NULL)"
+    )
+    _evict_every = 100
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        max_bytes: int = DEFAULT_STAGING_BYTES,
+        algorithm: str = DEFAULT_ALGORITHM,
+    ) -> None:
+        self.root = Path(root)
+        super().__init__(self.root / "index.sqlite")
+        self.max_bytes = max_bytes
+        self.algorithm = algorithm
+        self.sources = DigestCache(self.root / "sources.sqlite")
+        """digests of source files by path, size and mtime"""
+        self._can_reflink = True
+        self._store_lock = threading.Lock()
+        self._store_lockfile = Lockfile(self.root / "store.lock")
+
+    @contextmanager
+    def _locked_store(self) -> Iterator[None]:
+        """Hold the store's lock, for other threads and processes sharing the
+        store, while adding or evicting files. Take it before `_lock`."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._store_lock, self._store_lockfile:
+            yield
+
+    def __getstate__(self) -> dict:
+        return {"root": self.root, "max_bytes": self.max_bytes, "algorithm": self.algorithm}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["root"], state["max_bytes"], state["algorithm"])
+
+    def blob_path(self, digest: str) -> Path:
+        """Where the file with a (hex) content digest is stored."""
+        return self.root / "blobs" / digest[:2] / digest
+
+    def _valid_blob(self, digest: str) -> bool:
+        """True if a blob is stored and unchanged since, marking it used.
+        A changed blob is forgotten."""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT size, mtime_ns FROM blobs WHERE digest=?", (digest,))
+            row = row.fetchone()
+            if row is None:
+                return False
+            try:
+                st = self.blob_path(digest).stat()
+            except FileNotFoundError:
+                st = None
+            if st is None or (st.st_size, st.st_mtime_ns) != row:
+                conn.execute("DELETE FROM blobs WHERE digest=?", (digest,))
+                return False
+            conn.execute("UPDATE blobs SET last_used=? WHERE digest=?", (time.time(), digest))
+            return True
+
+    def _fetch(self, entry: TreeEntry) -> str:
+        """Copy a source file into the store, hashing it on the way, and
+        return its digest."""
+        tmp = self.root / "tmp" / uuid.uuid4().hex
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        hash = new_hash(self.algorithm)
+        try:
+            copy_file(entry.path, tmp, hash=hash)
+            digest = hash.hexdigest()
+            blob = self.blob_path(digest)
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            upsert = (
+                "INSERT OR REPLACE INTO blobs (digest, size, mtime_ns, last_used) "
+                "VALUES (?, ?, ?, ?)"
+            )
+            with self._locked_store():
+                try:
+                    os.replace(tmp, blob)  # another process may have stored the same content
+                except OSError:
+                    # eg on Windows while another process has it open. same content anyway
+                    if not blob.exists():
+                        raise
+                st = blob.stat()
+                with self._lock:
+                    row = (digest, st.st_size, st.st_mtime_ns, time.time())
+                    self._connection().execute(upsert, row)
+                    self._counted_put()
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.sources.put(entry.path, entry.stat, self.algorithm, bytes.fromhex(digest))
+        return digest
+
+    def _materialize(self, digest: str, dst: Path, link: bool) -> str:
+        """Put a stored file at `dst`, returning how: reflink, hardlink or copy."""
+        blob = self.blob_path(digest)
+        if self._can_reflink:
+            if _reflink(blob, dst):
+                return "reflink"
+            self._can_reflink = False  # don't keep trying on this filesystem
+        if link:
+            try:
+                os.link(blob, dst)
+                return "hardlink"
+            except FileNotFoundError:
+                raise  # evicted meanwhile, see `stage`
+            except OSError:
+                pass  # eg another volume, or a filesystem without hardlinks
+        shutil.copy2(blob, dst)
+        return "copy"
+
+    def _stage_file(self, entry: TreeEntry, target: Path, link: bool) -> tuple[bool, str]:
+        """Put one source file at `target` from the store, fetching it first
+        if needed, or else copy it from the source. Returns whether it was
+        read from the source, and how it was put there."""
+        target.unlink(missing_ok=True)
+        try:
+            return self._stage_stored(entry, target, link)
+        except OSError:
+            target.unlink(missing_ok=True)
+            copy_file(entry.path, target)  # raises again if the source is the trouble
+            return True, "copy"
+
+    def _stage_stored(self, entry: TreeEntry, target: Path, link: bool) -> tuple[bool, str]:
+        """See `_stage_file`, without the fallback to a copy from the source."""
+        known = self.sources.get(entry.path, entry.stat, self.algorithm)
+        fetched = known is None or not self._valid_blob(known.hex())
+        digest = self._fetch(entry) if fetched else known.hex()
+        try:
+            return fetched, self._materialize(digest, target, link)
+        except FileNotFoundError:
+            if fetched:
+                raise
+            # evicted by another process meanwhile; fetch again
+            return True, self._materialize(self._fetch(entry), target, link)
+
+    def stage(
+        self, src: Path, dst: Path, link: bool = False, workers: int = DEFAULT_COPY_WORKERS
+    ) -> StageStats:
+        """Recreate the directory tree `src` at `dst` from the store, fetching
+        files whose content isn't stored yet. Like `shutil.copytree(src, dst,
+        dirs_exist_ok=True)`, but repeat runs read almost nothing from `src`.
+
+        Args:
+            src (Path): the inputs directory, eg on the network share.
+            dst (Path): where to put the temp inputs. Existing files are replaced.
+            link (bool, optional): allow hardlinks to the stored files. Only
+                if the files are never written in place. Defaults to False.
+            workers (int, optional): files staged at once. Defaults to DEFAULT_COPY_WORKERS.
+
+        Returns:
+            StageStats: counts of files and bytes staged and fetched.
+        """
+        start = time.perf_counter()
+        dirs, entries = _walk_inputs(Path(src))
+        dst = Path(dst)
+        dst.mkdir(parents=True, exist_ok=True)
+        for relpath in dirs:
+            (dst / relpath).mkdir(exist_ok=True)
+
+        # biggest first, so one big fetch doesn't finish last on its own
+        entries.sort(key=lambda e: -e.size)
+
+        def _stage(entry: TreeEntry) -> tuple[bool, str]:
+            return self._stage_file(entry, dst / entry.relpath, link)
+
+        if workers <= 1 or len(entries) <= 1:
+            staged = [_stage(e) for e in entries]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                staged = list(pool.map(_stage, entries))
+        fetched = [e for e, (was_fetched, _) in zip(entries, staged) if was_fetched]
+        how = {"reflink": 0, "hardlink": 0, "copy": 0}
+        for _, mode in staged:
+            how[mode] += 1
+        self.evict()
+        return StageStats(
+            files=len(entries),
+            bytes=sum(e.size for e in entries),
+            fetched_files=len(fetched),
+            fetched_bytes=sum(e.size for e in fetched),
+            reflinked=how["reflink"],
+            hardlinked=how["hardlink"],
+            copied=how["copy"],
+            seconds=time.perf_counter() - start,
+        )
+
+    def _evict(self) -> None:
+        """Remove least recently used files beyond `max_bytes`. Call with the
+        store's lock and `_lock` held. Temp inputs already linked to an
+        evicted file keep their content. A file that can't be removed yet,
+        eg one open on Windows, stays stored until a later eviction."""
+        conn = self._connection()
+        rows = conn.execute("SELECT digest, size FROM blobs ORDER BY last_used DESC, rowid DESC")
+        total = 0
+        evicted: list[str] = []
+        for digest, size in rows.fetchall():
+            total += size
+            if total <= self.max_bytes:
+                continue
+            try:
+                self.blob_path(digest).unlink(missing_ok=True)
+            except OSError:
+                continue
+            evicted.append(digest)
+        conn.executemany("DELETE FROM blobs WHERE digest=?", [(d,) for d in evicted])
+
+    def evict(self) -> None:
+        """Remove least recently used files beyond `max_bytes`."""
+        with self._locked_store():
+            super().evict()
+
+    def close(self) -> None:
+        """Evict old files and close this process's connections."""
+        with self._locked_store():
+            super().close()
+        self.sources.close()
@@ -5,7 +5,6 @@ from datetime import datetime as dt  # broken for no reason
 from pathlib import Path
 from typing import Any, Generator, Literal, Optional, Union
 
-import arcpy
 from formats import PSEUDO_ISO_FMT
 
 
@@ -48,6 +47,14 @@ class Test:
     """SHORT description of test"""
     run_local: bool = True
     """copy inputs to C: if True. set False to keep inputs on I: (ie condor)"""
+    link_inputs: bool = False
+    """hardlink local inputs from the staging cache. only if the tool never writes to inputs"""
+    wall_seconds: Optional[float] = None
+    """wall clock time limit, overriding config.json's"""
+    max_rss_mb: Optional[float] = None
+    """memory (MiB) limit, overriding config.json's"""
+    cpu_seconds: Optional[float] = None
+    """CPU time limit, overriding config.json's"""
     parameters: list[Parameter] = field(default_factory=list)
     """extracted parameter info"""
     outputs: list[str] = field(default_factory=list)
@@ -104,6 +111,13 @@ alias = {self.alias}
 description = {self.description}
 ; inputs will copy to machine C: before run. set false if inputs must stay on I: (ie condor)
 run_local = {str(self.run_local).lower()}
+; set true to hardlink local inputs from a shared cache. only if the tool never modifies inputs.
+link_inputs = {str(self.link_inputs).lower()}
+; optional limits, overriding those in config.json. the tool is killed if it runs longer than
+; wall_seconds, uses more than max_rss_mb of memory or more than cpu_seconds of CPU time.
+{_limit_line("wall_seconds", self.wall_seconds)}
+{_limit_line("max_rss_mb", self.max_rss_mb)}
+{_limit_line("cpu_seconds", self.cpu_seconds)}
 
 [parameters]
 ; tool parameters.
@@ -155,6 +169,8 @@ def parameter_dict(params: list[Parameter]) -> dict[str, Any]:
 # arcpy
 def get_parameters(toolbox_path: Union[str, Path], tool_alias: str) -> list[Parameter]:
     """Get parameters for a specific tool in a toolbox."""
+    import arcpy  # not at the top, see compare_jobs
+
     param_info = arcpy.GetParameterInfo(str(Path(toolbox_path, tool_alias)))
     return [
         Parameter(
@@ -179,6 +195,8 @@ def make_tests(toolbox_path: Union[str, Path], relative_to: Optional[Path] = Non
     Returns:
         list[Test]: a Test object for each tool
     """
+    import arcpy  # not at the top, see compare_jobs
+
     toolbox_path = Path(toolbox_path)
     relative_toolbox = toolbox_path
     if relative_to is not None:
@@ -195,6 +213,11 @@ def make_tests(toolbox_path: Union[str, Path], relative_to: Optional[Path] = Non
     ]
 
 
+def _limit_line(name: str, value: Optional[float]) -> str:
+    """An ini line for an optional limit, commented out if not set."""
+    return f"; {name} =" if value is None else f"{name} = {value:g}"
+
+
 def parse_test_ini(contents: str) -> Test:
     """Parse a test config .ini.
 
@@ -216,6 +239,10 @@ def parse_test_ini(contents: str) -> Test:
         alias=parser["test"]["alias"],
         description=parser["test"]["description"],
         run_local=parser.getboolean("test", "run_local", fallback=True),
+        link_inputs=parser.getboolean("test", "link_inputs", fallback=False),
+        wall_seconds=parser.getfloat("test", "wall_seconds", fallback=None),
+        max_rss_mb=parser.getfloat("test", "max_rss_mb", fallback=None),
+        cpu_seconds=parser.getfloat("test", "cpu_seconds", fallback=None),
         parameters=[Parameter(name=k, value=_strip(v)) for k, v in parser["parameters"].items()],
         outputs=[_strip(k) for k, _ in parser["outputs"].items()],
     )
@@ -2,15 +2,29 @@ import logging
 import sys
 from datetime import datetime as dt  # broken for no reason
 from pathlib import Path
-from typing import Any, Generator, Iterable, Literal, Optional, Union
+from typing import Any, Callable, Generator, Iterable, Literal, Optional, Union
 
-import arcpy
 from formats import PSEUDO_ISO_FMT, EXTRA_PSEUDO_ISO_FMT
 
 # save these for logger before kibana (from toolbox import) clobbers things
 real_stdout = sys.stdout
 real_stderr = sys.stderr
 
+# and arcpy's message functions, saved when arcpy is first imported (see `_real_arcpy_messages`)
+_arcpy_messages: Optional[tuple[Callable[..., Any], Callable[..., Any], Callable[..., Any]]] = None
+
+
+def _real_arcpy_messages() -> tuple[Callable[..., Any], Callable[..., Any], Callable[..., Any]]:
+    """arcpy's AddMessage, AddWarning and AddError as they were when arcpy
+    was first imported, before any toolbox import could replace them. A warm
+    worker runs many tools, so they can't be read again from arcpy later."""
+    global _arcpy_messages
+    import arcpy  # not at the top, see compare_jobs
+
+    if _arcpy_messages is None:
+        _arcpy_messages = (arcpy.AddMessage, arcpy.AddWarning, arcpy.AddError)
+    return _arcpy_messages
+
 
 class OutputCapture:
     """A context manager that captures arcpy tool output to a logger.
@@ -23,35 +37,36 @@ class OutputCapture:
     AddError to logger.ERROR.
     """
 
-    _orig_message = arcpy.AddMessage  # real arcpy funcs?
-    _orig_warning = arcpy.AddWarning
-    _orig_error = arcpy.AddError
-
     def __init__(self, logger: logging.Logger) -> None:
         self.logger = logger
 
     def __enter__(self) -> logging.Logger:
+        import arcpy
+
+        self._orig_message, self._orig_warning, self._orig_error = _real_arcpy_messages()
         arcpy.AddMessage = self._message
         arcpy.AddWarning = self._warning
         arcpy.AddError = self._error
         return self.logger
 
     def __exit__(self, exc_type, exc_value, traceback):
-        arcpy.AddMessage = OutputCapture._orig_message
-        arcpy.AddWarning = OutputCapture._orig_warning
-        arcpy.AddError = OutputCapture._orig_error
+        import arcpy
+
+        arcpy.AddMessage = self._orig_message
+        arcpy.AddWarning = self._orig_warning
+        arcpy.AddError = self._orig_error
 
     def _message(self, message: str, *args: Any, **kwds: Any) -> Any:
         self.logger.debug(message.strip("\n"))  # densify
-        # OutputCapture._orig_message(message) # suppress messages
+        # self._orig_message(message) # suppress messages
 
     def _warning(self, message: str, *args: Any, **kwds: Any) -> Any:
         self.logger.warning(message.strip("\n"))  # densify
-        # OutputCapture._orig_warning(message) # suppress messages
+        # self._orig_warning(message) # suppress messages
 
     def _error(self, message: str, *args: Any, **kwds: Any) -> Any:
         self.logger.error(message.strip("\n"))  # densify
-        OutputCapture._orig_error(message)
+        self._orig_error(message)
 
 
 def get_null_logger() -> logging.Logger:
@@ -108,3 +123,12 @@ def setup_logger(
     logger.addHandler(sh)
 
     return logger
+
+
+def teardown_logger(logger: logging.Logger) -> None:
+    """Removes and closes all handlers of a logger configured by `setup_logger`,
+    so a long-lived process doesn't keep log files open or log twice when the
+    same logger is set up again."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
@@ -0,0 +1,46 @@
+import time
+from pathlib import Path
+from typing import Sequence
+
+import pytest
+
+import compare
+import compare_jobs
+from compare_jobs import LARGE_OUTPUT_BYTES, compare_file_sets
+
+
+def _slow_compare(file_set: Sequence[Path], envs: list[str]) -> tuple[bool, list[str]]:
+    # large outputs take longer, so the small ones behind them finish first
+    start = time.monotonic()
+    time.sleep(0.6 if file_set[0].name.startswith("large") else 0.1)
+    return True, [file_set[0].name, str(start), str(time.monotonic())]
+
+
+def test_compare_file_sets_in_order_and_throttled(monkeypatch: pytest.MonkeyPatch):
+    names = ["large0", "small1", "large2", "small3", "large4", "small5"]
+    sizes = {name: LARGE_OUTPUT_BYTES if name.startswith("large") else 1 for name in names}
+    monkeypatch.setattr(compare_jobs, "_output_size", lambda p: sizes[p.name])
+    monkeypatch.setattr(compare_jobs, "compare_file_set", _slow_compare)
+
+    file_sets = [(Path(name), Path(name)) for name in names]
+    results = list(compare_file_sets(file_sets, ["baseline", "target"], workers=3, max_large=1))
+
+    assert [explanation[0] for _, explanation in results] == names
+    spans = {name: (float(start), float(end)) for _, (name, start, end) in results}
+    large = sorted(spans[name] for name in names if name.startswith("large"))
+    # one large output at a time, each starting after the last finished
+    assert all(end <= next_start for (_, end), (next_start, _) in zip(large, large[1:]))
+    # while the small ones are compared meanwhile
+    assert spans["small5"][1] < large[1][0]
+
+
+def _gdb_workers(file_set: Sequence[Path], envs: list[str]) -> tuple[bool, list[str]]:
+    return True, [str(compare._gdb_workers)]
+
+
+def test_compare_workers_compare_geodatabases_themselves(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(compare_jobs, "compare_file_set", _gdb_workers)
+    file_sets = [(Path("a.gdb"), Path("a.gdb"))] * 2
+    results = list(compare_file_sets(file_sets, ["baseline", "target"], workers=2, max_large=1))
+    assert results == [(True, ["1"])] * 2  # not a pool of their own in each worker
+    assert compare._gdb_workers == compare.GDB_WORKERS
@@ -1,18 +1,46 @@
+from datetime import date
 from pathlib import Path
 from typing import Any
 
 import arcpy
+import duckdb
 import geopandas as gp
 import pandas as pd
 import laspy
 import numpy as np
+import openpyxl
+import pyogrio
 import pyproj
 import pytest
 import rasterio as rio
 from rasterio.transform import Affine
 from shapely.geometry import Point
 
-from compare import compare, compare_featureclass, compare_gdb, compare_hash, compare_all
+from compare import (
+    COMPARATORS,
+    CompareSession,
+    Cost,
+    Verdict,
+    VerdictCache,
+    _column_differs,
+    _compare_featureclass_geopandas,
+    compare,
+    compare_all,
+    compare_csv,
+    compare_dbf,
+    compare_featureclass,
+    compare_gdb,
+    compare_hash,
+    compare_las,
+    compare_raster,
+    compare_shapefile,
+    compare_tree,
+    compare_xlsx,
+    comparators_for,
+    equivalence_classes,
+    register_comparator,
+    use_verdict_cache,
+)
 
 # file types to test
 # text: txt, csv
@@ -73,7 +101,7 @@ def test_compare_text_files(tmp_path: Path):
     assert not compare(file_a, file_b)
 
 
-def _write_tiff(p: Path, data: np.ndarray):
+def _write_tiff(p: Path, data: np.ndarray, **profile: Any):
     res = 1  # degree per px
     nw_corner = (0, 0)  #  lon, lat
     offset = nw_corner[0] - res / 2, nw_corner[1] + res / 2
@@ -88,6 +116,7 @@ def _write_tiff(p: Path, data: np.ndarray):
         dtype=data.dtype,
         crs="EPSG:4326",
         transform=transform,
+        **profile,
     ) as dst:
         dst.write(data, 1)
 
@@ -111,9 +140,47 @@ def test_compare_tiff_files(tmp_path: Path):
     assert not compare(file_a, file_b)
 
 
-def _write_las(p: Path, data: np.ndarray):
+def test_compare_specialization_raster(tmp_path: Path):
+    data_a = np.arange(512 * 256, dtype="float32").reshape((512, 256))
+    file_a = tmp_path / "image_a.tif"
+    _write_tiff(file_a, data_a)
+
+    # same pixels stored differently
+    file_aa = tmp_path / "image_aa.tif"
+    _write_tiff(file_aa, data_a, tiled=True, blockxsize=64, blockysize=64, compress="lzw")
+
+    # difference in the very last block
+    data_b = data_a.copy()
+    data_b[-1, -1] += 0.5
+    file_b = tmp_path / "image_b.tif"
+    _write_tiff(file_b, data_b, tiled=True, blockxsize=64, blockysize=64)
+
+    assert file_a.read_bytes() != file_aa.read_bytes()
+    assert compare_raster(file_a, file_aa)
+    assert compare(file_a, file_aa)
+    assert not compare_raster(file_a, file_b)
+    assert not compare_raster(file_aa, file_b)
+    assert compare_raster(file_a, file_b, atol=1.0)
+
+
+def test_compare_specialization_raster_nodata(tmp_path: Path):
+    data_a = np.array([[-9999, 1], [2, 3]], dtype="int16")
+    file_a = tmp_path / "image_a.tif"
+    _write_tiff(file_a, data_a, nodata=-9999)
+
+    # same values, but the first cell is no longer nodata
+    file_b = tmp_path / "image_b.tif"
+    _write_tiff(file_b, data_a, nodata=-1)
+
+    assert compare_raster(file_a, file_a)
+    assert not compare_raster(file_a, file_b)
+
+
+def _write_las(p: Path, data: np.ndarray, **header_fields: Any):
     # 1. Create a new header
     header = laspy.LasHeader(point_format=6, version="1.4")
+    for name, value in header_fields.items():
+        setattr(header, name, value)
     header.offsets = np.min(data, axis=0)
     header.scales = np.array([0.1, 0.1, 0.1])
     header.add_crs(pyproj.CRS.from_epsg(4326))
@@ -146,6 +213,33 @@ def test_compare_las_files(tmp_path: Path):
     assert not compare(file_a, file_b)
 
 
+def test_compare_specialization_las(tmp_path: Path):
+    data_a = np.array([[0, 0, 0], [0, 0, 1], [0, 0, 2], [1, 2, 3]])
+    file_a = tmp_path / "las_a.las"
+    _write_las(file_a, data_a)
+
+    # same points, different header details and compressed
+    file_aa = tmp_path / "las_aa.laz"
+    _write_las(file_aa, data_a, creation_date=date(2001, 1, 1), generating_software="other")
+
+    # same points, different order
+    file_r = tmp_path / "las_r.las"
+    _write_las(file_r, data_a[::-1])
+
+    # one point moved onto another, keeping count and bounds
+    file_b = tmp_path / "las_b.las"
+    data_b = data_a.copy()
+    data_b[1, 2] = 2
+    _write_las(file_b, data_b)
+
+    assert file_a.read_bytes() != file_aa.read_bytes()
+    assert compare_las(file_a, file_aa, chunk_points=3)
+    assert not compare_las(file_a, file_r)
+    assert compare_las(file_a, file_r, ordered=False, chunk_points=3)
+    assert not compare_las(file_a, file_b)
+    assert not compare_las(file_a, file_b, ordered=False)
+
+
 def _write_3_shapefiles(tmp_path: Path) -> tuple[Path, Path, Path]:
     # 2 shapefiles that are the same
     file_a = tmp_path / "data_a.shp"
@@ -177,8 +271,8 @@ def test_compare_shapefile(tmp_path: Path):
     assert all(
         compare(a, aa)
         for a, aa in zip(
-            file_a.parent.glob(file_a.with_suffix(".*").name),
-            file_aa.parent.glob(file_aa.with_suffix(".*").name),
+            sorted(file_a.parent.glob(file_a.with_suffix(".*").name)),
+            sorted(file_aa.parent.glob(file_aa.with_suffix(".*").name)),
         )
     )
 
@@ -186,12 +280,51 @@ def test_compare_shapefile(tmp_path: Path):
     assert any(
         not compare(a, b)
         for a, b in zip(
-            file_a.parent.glob(file_a.with_suffix(".*").name),
-            file_b.parent.glob(file_b.with_suffix(".*").name),
+            sorted(file_a.parent.glob(file_a.with_suffix(".*").name)),
+            sorted(file_b.parent.glob(file_b.with_suffix(".*").name)),
         )
     )
 
 
+def test_compare_specialization_shapefile(tmp_path: Path):
+    file_a, file_aa, file_b = _write_3_shapefiles(tmp_path)
+
+    # written on a different day
+    dbf = bytearray(file_aa.with_suffix(".dbf").read_bytes())
+    dbf[1:4] = bytes([99, 12, 31])
+    file_aa.with_suffix(".dbf").write_bytes(bytes(dbf))
+    assert not compare_hash(file_a.with_suffix(".dbf"), file_aa.with_suffix(".dbf"))
+
+    # same attributes, different geometry
+    assert compare_dbf(file_a.with_suffix(".dbf"), file_b.with_suffix(".dbf"))
+
+    assert compare_shapefile(file_a, file_a)
+    assert compare_shapefile(file_a, file_aa)
+    assert compare(file_a, file_aa)
+    assert not compare_shapefile(file_a, file_b)
+
+    # different attribute value, same geometry
+    file_c = tmp_path / "data_c.shp"
+    data_c = {"A": [1, 3], "B": ["a", "b"], "geometry": [Point(0, 0), Point(0, 1)]}
+    gp.GeoDataFrame(data_c, geometry="geometry", crs=4326).to_file(file_c)
+    assert not compare_dbf(file_a.with_suffix(".dbf"), file_c.with_suffix(".dbf"))
+    assert not compare_shapefile(file_a, file_c)
+
+    # a missing sidecar
+    file_aa.with_suffix(".prj").unlink()
+    assert not compare_shapefile(file_a, file_aa)
+
+
+def test_compare_specialization_shapefile_index(tmp_path: Path):
+    file_a, file_aa, _ = _write_3_shapefiles(tmp_path)
+
+    # corrupt the second record offset in the index
+    shx = bytearray(file_aa.with_suffix(".shx").read_bytes())
+    shx[108:112] = (1000).to_bytes(4, "big")
+    file_aa.with_suffix(".shx").write_bytes(bytes(shx))
+    assert not compare_shapefile(file_a, file_aa)
+
+
 def _convert_shp_to_fc(*shapefiles: Path) -> list[Path]:
     # convert shp to gdb feature classes
     FC_NAME = "feature_class"
@@ -220,6 +353,22 @@ def test_compare_specialization_featureclass(tmp_path: Path):
     assert not compare_featureclass(file_a, file_b)
 
 
+def test_compare_specialization_featureclass_gpkg(tmp_path: Path):
+    # same as above without arcpy, using geopackage layers
+    gpkgs = []
+    for shp in _write_3_shapefiles(tmp_path):
+        gpkg = shp.with_suffix(".gpkg")
+        gp.read_file(shp).to_file(gpkg, layer="feature_class")
+        gpkgs.append(gpkg / "feature_class")
+    file_a, file_aa, file_b = gpkgs
+
+    assert compare_featureclass(file_a, file_a)
+    assert compare_featureclass(file_a, file_aa)
+    assert not compare_featureclass(file_a, file_b)
+    assert _compare_featureclass_geopandas(file_a, file_aa)
+    assert not _compare_featureclass_geopandas(file_a, file_b)
+
+
 def test_compare_specialization_geodatabase(tmp_path: Path):
     file_a, file_aa, file_b = _convert_shp_to_fc(*_write_3_shapefiles(tmp_path))
 
@@ -232,6 +381,36 @@ def test_compare_specialization_geodatabase(tmp_path: Path):
     assert not compare_gdb(file_a.parent, file_aa.parent)
 
 
+def _write_gdb(p: Path, layers: dict[str, pd.DataFrame]):
+    # file geodatabase written by GDAL, for when arcpy isn't available
+    for name, df in layers.items():
+        pyogrio.write_dataframe(df, p, layer=name, driver="OpenFileGDB")
+
+
+def test_compare_specialization_geodatabase_gdal(tmp_path: Path):
+    points = gp.GeoDataFrame(
+        {"A": [1, 2], "geometry": [Point(0, 0), Point(0, 1)]}, geometry="geometry", crs=4326
+    )
+    moved = points.set_geometry([Point(0, 0), Point(0, 2)])  # different extent
+    shifted = points.set_geometry([Point(0, 1), Point(0, 0)])  # same metadata, different data
+    table = pd.DataFrame({"B": ["x", "y"]})
+
+    layers = {f"fc{i}": points for i in range(3)}
+    _write_gdb(tmp_path / "a.gdb", {**layers, "table": table})
+    _write_gdb(tmp_path / "aa.gdb", {**layers, "table": table})
+    _write_gdb(tmp_path / "b.gdb", {**layers, "fc1": moved, "table": table})
+    _write_gdb(tmp_path / "c.gdb", {**layers, "fc2": shifted, "table": table})
+    _write_gdb(tmp_path / "d.gdb", {**layers, "table": table.iloc[::-1]})
+
+    a = tmp_path / "a.gdb"
+    assert compare_gdb(a, tmp_path / "aa.gdb")
+    assert compare_gdb(a, tmp_path / "aa.gdb", workers=1)
+    assert not compare_gdb(a, tmp_path / "b.gdb")
+    assert not compare_gdb(a, tmp_path / "c.gdb")
+    assert not compare_gdb(a, tmp_path / "c.gdb", workers=1)
+    assert not compare_gdb(a, tmp_path / "d.gdb")
+
+
 def _write_xlsx(p: Path, data: dict[str, list[Any]]):
     df = pd.DataFrame(data)
     df.to_excel(p)
@@ -256,6 +435,140 @@ def test_compare_excel(tmp_path: Path):
     assert not compare(file_a, file_b)
 
 
+def test_compare_specialization_excel(tmp_path: Path):
+    file_a = tmp_path / "sheet_a.xlsx"
+    _write_xlsx(file_a, {"A": [1, 2, 3], "B": [0.5, 1.5, 2.5]})
+
+    # same values, written with different workbook metadata
+    file_aa = tmp_path / "sheet_aa.xlsx"
+    _write_xlsx(file_aa, {"A": [1, 2, 3], "B": [0.5, 1.5, 2.5]})
+    book = openpyxl.load_workbook(file_aa)
+    book.properties.creator = "someone else"
+    book.save(file_aa)
+
+    file_b = tmp_path / "sheet_b.xlsx"
+    _write_xlsx(file_b, {"A": [1, 2, 3], "B": [0.5, 1.5, 2.5000001]})
+
+    assert compare_xlsx(file_a, file_aa)
+    assert compare(file_a, file_aa)
+    assert not compare_xlsx(file_a, file_b)
+    assert compare_xlsx(file_a, file_b, atol=1e-6)
+
+
+def test_compare_xlsx_unordered(tmp_path: Path):
+    def _write_rows(p: Path, rows: list[tuple]):
+        book = openpyxl.Workbook()
+        for row in rows:
+            book.active.append(row)
+        book.save(p)
+
+    rows = [("value", "id"), (100, 1), (99, 2), (None, 3), ("text", "x"), (date(2020, 1, 2), 4)]
+    file_a = tmp_path / "a.xlsx"
+    _write_rows(file_a, rows)
+    file_r = tmp_path / "r.xlsx"
+    _write_rows(file_r, rows[::-1])
+    file_d = tmp_path / "d.xlsx"
+    _write_rows(file_d, rows[::-1] + [rows[1]])  # a row twice
+    # 100 within tolerance, but as text "99.9999999" sorts after "99" where "100" sorted before
+    file_t = tmp_path / "t.xlsx"
+    _write_rows(file_t, rows[:1] + [(99, 2), (99.9999999, 1)] + rows[3:])
+
+    assert not compare_xlsx(file_a, file_r)
+    assert compare_xlsx(file_a, file_r, ordered=False)
+    assert not compare_xlsx(file_a, file_d, ordered=False)
+    assert not compare_xlsx(file_a, file_t, ordered=False)
+    assert compare_xlsx(file_a, file_t, ordered=False, atol=1e-6)
+
+
+def test_compare_specialization_csv(tmp_path: Path):
+    file_a = tmp_path / "a.csv"
+    file_a.write_text("id,height,kind\n1,10.5,tree\n2,20.25,pole\n3,,tower\n")
+
+    # same table, different number formatting and line endings
+    file_aa = tmp_path / "aa.csv"
+    file_aa.write_bytes(b"id,height,kind\r\n1,10.50,tree\r\n2,20.250,pole\r\n3,,tower\r\n")
+
+    # rows in a different order
+    file_r = tmp_path / "r.csv"
+    file_r.write_text("id,height,kind\n3,,tower\n1,10.5,tree\n2,20.25,pole\n")
+
+    # slightly different value
+    file_b = tmp_path / "b.csv"
+    file_b.write_text("id,height,kind\n1,10.5,tree\n2,20.2500001,pole\n3,,tower\n")
+
+    # tab delimited txt
+    file_t = tmp_path / "t.txt"
+    file_t.write_text("id\theight\tkind\n1\t10.5\ttree\n2\t20.25\tpole\n3\t\ttower\n")
+
+    assert compare_csv(file_a, file_aa)
+    assert compare(file_a, file_aa)
+    assert not compare_csv(file_a, file_r)
+    assert compare_csv(file_a, file_r, ordered=False)
+    assert not compare_csv(file_a, file_b)
+    assert compare_csv(file_a, file_b, atol=1e-6)
+    assert compare_csv(file_r, file_b, ordered=False, atol=1e-6)
+    assert compare_csv(file_a, file_t)
+
+    # a delimited txt is still compared as a table
+    file_tt = tmp_path / "tt.txt"
+    file_tt.write_text("id\theight\tkind\n1\t10.50\ttree\n2\t20.250\tpole\n3\t\ttower\n")
+    assert compare(file_t, file_tt)
+
+
+@pytest.mark.parametrize("sql_type", ["UTINYINT", "UINTEGER", "UBIGINT", "INTEGER", "DECIMAL(4,1)"])
+def test_column_differs_with_tolerance(sql_type: str):
+    con = duckdb.connect()
+    con.execute(f"CREATE VIEW a AS SELECT unnest([5, 6, 9])::{sql_type} AS n")
+    con.execute(f"CREATE VIEW b AS SELECT unnest([6, 5, 9])::{sql_type} AS n")
+
+    def _any_differ(atol: float) -> bool:
+        differs = _column_differs("n", sql_type, atol, 0.0)
+        return con.execute(f"SELECT bool_or({differs}) FROM a POSITIONAL JOIN b").fetchone()[0]
+
+    assert _any_differ(0.0)
+    assert _any_differ(0.5)
+    assert not _any_differ(1.0)  # unsigned too, whichever side is larger
+
+
+def test_compare_text_not_delimited(tmp_path: Path):
+    # a one-column "table" would strip the quotes and read both numbers as 1.0
+    file_a = tmp_path / "a.txt"
+    file_a.write_text('"a"\n1.0\n')
+    file_b = tmp_path / "b.txt"
+    file_b.write_text("a\n1.00\n")
+
+    file_aa = tmp_path / "aa.txt"
+    file_aa.write_text('"a"\n1.0\n')
+
+    assert not compare(file_a, file_b)
+    assert compare(file_a, file_aa)
+    assert COMPARATORS["table"].func(file_a, file_b, CompareSession()) is Verdict.UNDECIDED
+
+
+def test_compare_tree(tmp_path: Path):
+    data = np.arange(64 * 64, dtype="float32").reshape((64, 64))
+    for name in ("a", "aa", "b"):
+        out = tmp_path / name
+        (out / "sub" / "deeper").mkdir(parents=True)
+        (out / "notes.txt").write_text("some text")
+        (out / "sub" / "deeper" / "more.txt").write_text("more text")
+    # same pixels stored differently
+    _write_tiff(tmp_path / "a" / "sub" / "image.tif", data)
+    _write_tiff(tmp_path / "aa" / "sub" / "image.tif", data, compress="lzw")
+    _write_tiff(tmp_path / "b" / "sub" / "image.tif", data + 1)
+    # b has a changed file and an extra file
+    (tmp_path / "b" / "sub" / "deeper" / "more.txt").write_text("other text")
+    (tmp_path / "b" / "extra.txt").write_text("extra")
+
+    a, aa, b = tmp_path / "a", tmp_path / "aa", tmp_path / "b"
+    assert compare_tree(a, a) == []
+    assert compare_tree(a, aa) == []
+    assert compare_tree(a, b) == ["extra.txt", "sub/deeper/more.txt", "sub/image.tif"]
+    assert compare(a, aa)
+    assert not compare(a, b)
+    assert equivalence_classes(a, b, aa) == [[a, aa], [b]]
+
+
 def test_compare_all(tmp_path: Path):
     file_a = tmp_path / "a.txt"
     file_a.write_text("some text")
@@ -264,3 +577,147 @@ def test_compare_all(tmp_path: Path):
 
     assert compare_all(file_a, file_a, file_a)
     assert not compare_all(file_a, file_a, file_b)
+
+
+def test_compare_missing(tmp_path: Path):
+    file_a = tmp_path / "a.txt"
+    file_a.write_text("some text")
+    missing = tmp_path / "missing.txt"
+
+    assert not compare(file_a, missing)
+    assert not compare(missing, missing)
+    classes = equivalence_classes(missing, tmp_path / "other.txt", stop_at_difference=True)
+    assert classes == [[missing], [tmp_path / "other.txt"]]
+
+
+def test_equivalence_classes(tmp_path: Path):
+    file_a = tmp_path / "a.txt"
+    file_a.write_text("some text")
+    file_aa = tmp_path / "aa.txt"
+    file_aa.write_text("some text")
+    file_b = tmp_path / "b.txt"
+    file_b.write_text("different text")
+    file_c = tmp_path / "c.txt"
+    file_c.write_text("same size")  # same size as file_a, different bytes
+
+    classes = equivalence_classes(file_b, file_a, file_c, file_aa)
+    assert classes == [[file_b], [file_a, file_aa], [file_c]]
+
+
+def test_equivalence_classes_headers_first(tmp_path: Path):
+    data = np.arange(64 * 64, dtype="float32").reshape((64, 64))
+    for name in ("a", "aa"):
+        _write_tiff(tmp_path / f"{name}.tif", data)
+    _write_tiff(tmp_path / "small.tif", data[:32])  # rasters' sizes aren't facts, profiles are
+    a, aa, small = (tmp_path / f"{name}.tif" for name in ("a", "aa", "small"))
+
+    session = CompareSession()
+    digest = session.digest
+    digested = []
+
+    def _spy_digest(p: Path) -> bytes:
+        digested.append(p)
+        return digest(p)
+
+    session.digest = _spy_digest
+    assert equivalence_classes(a, small, aa, session=session) == [[a, aa], [small]]
+    assert sorted(digested) == [a, aa]  # the other profile is never read in full
+
+
+def test_comparator_registry(tmp_path: Path):
+    data = np.arange(64 * 64, dtype="float32").reshape((64, 64))
+    _write_tiff(tmp_path / "a.tif", data)
+    _write_tiff(tmp_path / "aa.tif", data, compress="lzw")
+    _write_tiff(tmp_path / "small.tif", data[:32])
+    a, aa, small = tmp_path / "a.tif", tmp_path / "aa.tif", tmp_path / "small.tif"
+
+    comparators = comparators_for(a, aa)
+    assert [c.name for c in comparators] == ["stat", "raster_profile", "digest", "raster"]
+    assert [c.cost for c in comparators] == sorted(c.cost for c in comparators)
+
+    # cheaper evidence settles it before the full comparison runs
+    session = CompareSession()
+    assert session.evaluate(a, small).comparator == "raster_profile"
+    assert session.evaluate(a, a).comparator == "stat"
+    # differing bytes are undecided for rasters, the pixels decide
+    assert session.evaluate(a, aa).comparator == "raster"
+    assert session.evaluate(a, aa).same
+
+    # a new format only needs registering
+    (tmp_path / "a.ver").write_text("version 1.0 built today")
+    (tmp_path / "b.ver").write_text("version 1.0 built yesterday")
+    (tmp_path / "c.ver").write_text("version 2.0 built today")
+
+    def _same_version(path_a: Path, path_b: Path, session: CompareSession) -> Verdict:
+        version_a, version_b = (p.read_text().split()[1] for p in (path_a, path_b))
+        return Verdict.EQUAL if version_a == version_b else Verdict.DIFFERENT
+
+    ver_a, ver_b, ver_c = (tmp_path / f"{name}.ver" for name in "abc")
+    assert not compare(ver_a, ver_b)
+    try:
+        register_comparator("version", _same_version, Cost.FULL, [".ver"])
+        assert compare(ver_a, ver_b)
+        assert not compare(ver_a, ver_c)
+        assert CompareSession().evaluate(ver_a, ver_c).comparator == "version"
+    finally:
+        del COMPARATORS["version"]
+
+
+def test_compare_session_details(tmp_path: Path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "same.txt").write_text("same")
+    (tmp_path / "a" / "changed.txt").write_text("one")
+    (tmp_path / "b" / "changed.txt").write_text("two")
+
+    a, b = tmp_path / "a", tmp_path / "b"
+    session = CompareSession()
+    assert not compare_all(a, b, session=session)
+    outcome = session.evaluate(a, b)
+    assert not outcome.same
+    assert outcome.comparator == "tree"
+    assert outcome.details == ("changed.txt",)
+    assert CompareSession().evaluate(a, tmp_path / "missing").comparator == "stat"
+
+
+def test_shapefile_digest_includes_sidecars(tmp_path: Path):
+    file_a, _, _ = _write_3_shapefiles(tmp_path)
+    copy_dir = tmp_path / "copy"
+    copy_dir.mkdir()
+    for part in tmp_path.glob("data_a.*"):
+        (copy_dir / part.name).write_bytes(part.read_bytes())
+    file_c = copy_dir / file_a.name
+    dbf = file_c.with_suffix(".dbf")
+    dbf.write_bytes(dbf.read_bytes().replace(b"b", b"c"))  # same .shp, other attributes
+
+    assert compare(file_a, file_a.parent / "data_aa.shp")
+    assert not compare(file_a, file_c)
+
+
+@pytest.fixture
+def verdict_cache(tmp_path: Path):
+    cache = VerdictCache(tmp_path / "cache" / "verdicts.sqlite")
+    previous = use_verdict_cache(cache)
+    raster = COMPARATORS["raster"]
+    yield cache
+    COMPARATORS["raster"] = raster
+    use_verdict_cache(previous)
+    cache.close()
+
+
+def test_verdict_cache(tmp_path: Path, verdict_cache: VerdictCache):
+    data = np.arange(64 * 64, dtype="float32").reshape((64, 64))
+    _write_tiff(tmp_path / "a.tif", data)
+    _write_tiff(tmp_path / "aa.tif", data, compress="lzw")
+    a, aa = tmp_path / "a.tif", tmp_path / "aa.tif"
+    assert compare(a, aa)  # miss, compares pixels and populates cache
+
+    def _no_compare(path_a: Path, path_b: Path, session: CompareSession) -> Verdict:
+        raise AssertionError("rasters were compared")
+
+    register_comparator("raster", _no_compare, Cost.FULL, [".tif"], memoize=True)
+    assert compare(a, aa)
+    # a new version of the comparator doesn't use the old verdicts
+    register_comparator("raster", _no_compare, Cost.FULL, [".tif"], version=2, memoize=True)
+    with pytest.raises(AssertionError, match="rasters were compared"):
+        compare(a, aa)
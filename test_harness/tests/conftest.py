@@ -0,0 +1,20 @@
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+from db import DB
+
+SCHEMA = Path(__file__).parents[1] / "schema.sql"
+
+
+@pytest.fixture
+def db(tmp_path: Path) -> DB:
+    """A database whose run 1 has tests t0 to t5 queued in baseline and target."""
+    with sqlite3.connect(tmp_path / "db.sqlite") as conn:
+        conn.executescript(SCHEMA.read_text())
+    db = DB(str(tmp_path / "db.sqlite"))
+    db.add_run_enqueue_tests([f"t{i}" for i in range(6)], ["baseline", "target"], True)
+    time.sleep(1.1)  # runs start at the next whole second
+    return db
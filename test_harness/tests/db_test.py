@@ -0,0 +1,117 @@
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import db as db_module
+from db import DB, LOCK_STALE_SECONDS, Lockfile
+from scheduling import DEFAULT_ESTIMATE_SECONDS
+
+ENVS = ["baseline", "target"]
+
+
+def _instance(db: DB, env: str, test_id: str) -> sqlite3.Row:
+    with sqlite3.connect(db._sqlite_file) as conn:
+        conn.row_factory = sqlite3.Row
+        query = "SELECT * FROM test_instances WHERE run_id=1 AND env=? AND id=?"
+        return conn.execute(query, (env, test_id)).fetchone()
+
+
+def test_update_test_status_for_envs(db: DB):
+    db.update_test_status(1, "baseline", "t0", "compare", run_result="PASS")
+    db.update_test_status(1, "target", "t0", "compare", run_result="FAIL")
+    db.update_test_status_for_envs(1, ENVS, "t0", "complete", compare_result="FAIL")
+
+    for env, run_result in zip(ENVS, ["PASS", "FAIL"]):
+        row = _instance(db, env, "t0")
+        assert row["status"] == "complete"
+        assert row["run_result"] == run_result  # not nullified
+        assert (row["compare_result"], row["perf_result"]) == ("FAIL", None)
+
+    db.update_test_status_for_envs(1, ENVS, "t0", "complete", perf_result="PASS")
+    assert all(_instance(db, env, "t0")["perf_result"] == "PASS" for env in ENVS)
+    assert all(_instance(db, env, "t0")["compare_result"] == "FAIL" for env in ENVS)
+
+
+def test_claim_test_for_comparison(db: DB):
+    db.update_test_status(1, "baseline", "t0", "compare", run_result="PASS")
+    assert not db.claim_test_for_comparison(1, "t0")  # target hasn't run it yet
+    assert _instance(db, "baseline", "t0")["status"] == "compare"
+
+    db.update_test_status(1, "target", "t0", "compare", run_result="PASS")
+    assert db.claim_test_for_comparison(1, "t0")
+    assert not db.claim_test_for_comparison(1, "t0")  # only one compare worker takes it
+    assert all(_instance(db, env, "t0")["status"] == "comparing" for env in ENVS)
+
+
+def test_count_unfinished_tests(db: DB):
+    assert db.count_unfinished_tests() == 12
+    db.update_test_status_for_envs(1, ENVS, "t0", "compare", run_result="PASS")
+    assert db.count_unfinished_tests() == 12  # run, but not compared yet
+    db.update_test_status_for_envs(1, ENVS, "t0", "comparing")
+    db.update_test_status_for_envs(1, ENVS, "t1", "complete", compare_result="PASS")
+    assert db.count_unfinished_tests() == 8
+
+
+def test_fail_unfinished_test(db: DB):
+    db.update_test_status(1, "baseline", "t0", "running")
+    assert db.fail_unfinished_test(1, "baseline", "t0")
+    assert db.fail_unfinished_test(1, "target", "t0", "TIMEOUT")  # still queued
+    assert [tuple(_instance(db, env, "t0"))[3:5] for env in ENVS] == [
+        ("compare", "FAIL"),
+        ("compare", "TIMEOUT"),
+    ]
+
+    db.update_test_status(1, "baseline", "t1", "compare", run_result="PASS")
+    assert not db.fail_unfinished_test(1, "baseline", "t1")  # it finished before it crashed
+    assert _instance(db, "baseline", "t1")["run_result"] == "PASS"
+
+
+def test_record_test_duration(db: DB):
+    assert db.get_test_durations() == {}
+    db.record_test_duration("baseline", "t0", 100)
+    db.record_test_duration("baseline", "t0", 200)  # averaged half and half by default
+    db.record_test_duration("baseline", "t0", 400, weight=0.25)
+    db.record_test_duration("target", "t0", 10)
+    assert db.get_test_durations() == {
+        ("baseline", "t0"): pytest.approx(150 * 0.75 + 400 * 0.25),
+        ("target", "t0"): 10,
+    }
+
+
+def test_claim_tests_longest_first(db: DB):
+    db.record_test_duration("baseline", "t1", DEFAULT_ESTIMATE_SECONDS * 2)
+    db.record_test_duration("baseline", "t2", DEFAULT_ESTIMATE_SECONDS / 2)
+    db.record_test_duration("baseline", "t3", DEFAULT_ESTIMATE_SECONDS * 3)
+    _, claimed = db.claim_tests(["baseline"], "w", limit=6)
+    # tests that haven't run are assumed to take DEFAULT_ESTIMATE_SECONDS, in ID order
+    assert [test_id for _, test_id in claimed] == ["t3", "t1", "t0", "t4", "t5", "t2"]
+
+
+def test_lockfile_breaks_stale_lock(tmp_path: Path):
+    lockfile = tmp_path / "db.lock"
+    lockfile.touch()
+    stale = time.time() - LOCK_STALE_SECONDS - 60
+    os.utime(lockfile, (stale, stale))
+    with Lockfile(lockfile):  # doesn't wait for the dead holder
+        assert lockfile.exists()
+    assert list(tmp_path.iterdir()) == []  # no probe files left
+
+
+def test_lockfile_keeps_live_lock_despite_clock_skew(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    lockfile = tmp_path / "db.lock"
+    lockfile.touch()
+    release = threading.Timer(0.5, lockfile.unlink)
+    release.start()
+    # this PC's clock is well ahead of the share's
+    now = time.time
+    monkeypatch.setattr(db_module.time, "time", lambda: now() + LOCK_STALE_SECONDS * 10)
+    start = time.monotonic()
+    with Lockfile(lockfile):
+        assert time.monotonic() - start >= 0.4  # waited for the holder
+    release.join()
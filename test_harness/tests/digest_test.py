@@ -0,0 +1,163 @@
+import os
+import pickle
+from pathlib import Path
+
+import pytest
+
+import digest
+from digest import (
+    HASH_ALGORITHMS,
+    DigestCache,
+    file_digest,
+    merkle_tree,
+    new_hash,
+    path_digest,
+    use_cache,
+    walk_tree,
+)
+
+
+def _write_tree(root: Path, files: dict[str, str]):
+    for relpath, text in files.items():
+        p = root / relpath
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+
+
+def test_file_digest_matches_whole_file_hash(tmp_path: Path):
+    p = tmp_path / "a.bin"
+    data = bytes(range(256)) * 5000  # larger than several chunks
+    p.write_bytes(data)
+
+    for algorithm in HASH_ALGORITHMS:
+        whole = new_hash(algorithm)
+        whole.update(data)
+        assert file_digest(p, algorithm, chunk_size=4096) == whole.digest()
+
+
+def test_unknown_algorithm(tmp_path: Path):
+    p = tmp_path / "a.txt"
+    p.write_text("some text")
+
+    with pytest.raises(ValueError):
+        file_digest(p, "not_a_hash")
+
+
+def test_walk_tree_sorted(tmp_path: Path):
+    _write_tree(tmp_path, {"b.txt": "b", "a/z.txt": "z", "a/c.txt": "c", "0.txt": "0"})
+
+    assert [e.relpath for e in walk_tree(tmp_path)] == ["0.txt", "a/c.txt", "a/z.txt", "b.txt"]
+
+
+def test_path_digest_trees(tmp_path: Path):
+    files = {f"sub{i}/file{j}.txt": f"{i} {j}" for i in range(3) for j in range(5)}
+    _write_tree(tmp_path / "a", files)
+    _write_tree(tmp_path / "aa", dict(reversed(files.items())))  # different creation order
+    # same contents, one file at a different relative path
+    moved = dict(files)
+    moved["sub0/renamed.txt"] = moved.pop("sub0/file0.txt")
+    _write_tree(tmp_path / "b", moved)
+
+    assert path_digest(tmp_path / "a") == path_digest(tmp_path / "aa", workers=1)
+    assert path_digest(tmp_path / "a") != path_digest(tmp_path / "b")
+
+
+def test_merkle_tree(tmp_path: Path):
+    _write_tree(tmp_path, {"b.txt": "b", "a/z.txt": "zz", "a/c.txt": "c"})
+    tree = merkle_tree(tmp_path)
+
+    assert list(tree.children) == ["a", "b.txt"]
+    assert list(tree.children["a"].children) == ["c.txt", "z.txt"]
+    assert tree.children["a"].children["z.txt"].relpath == "a/z.txt"
+    assert tree.children["a"].size == 3
+    assert tree.children["b.txt"].digest == file_digest(tmp_path / "b.txt")
+    assert tree.digest == path_digest(tmp_path)
+
+
+def test_path_digest_missing(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        path_digest(tmp_path / "missing")
+
+
+@pytest.fixture
+def cache(tmp_path: Path):
+    cache = DigestCache(tmp_path / "cache" / "digests.sqlite", max_entries=3)
+    previous = use_cache(cache)
+    yield cache
+    use_cache(previous)
+    cache.close()
+
+
+def test_cache_hit_skips_read(tmp_path: Path, cache: DigestCache, monkeypatch):
+    p = tmp_path / "a.txt"
+    p.write_text("some text")
+    expected = path_digest(p)  # miss, populates cache
+
+    def _no_read(*args, **kwargs):
+        raise AssertionError("file was read")
+
+    monkeypatch.setattr(digest, "file_digest", _no_read)
+    assert path_digest(p) == expected
+
+
+def test_cache_invalidated_by_change(tmp_path: Path, cache: DigestCache):
+    p = tmp_path / "a.txt"
+    p.write_text("some text")
+    before = path_digest(p)
+
+    p.write_text("some other text")
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))  # in case of coarse mtime
+    assert path_digest(p) != before
+    assert path_digest(p) == file_digest(p)
+
+
+def test_cache_lru_eviction(tmp_path: Path, cache: DigestCache):
+    paths = []
+    for i in range(5):
+        p = tmp_path / f"{i}.txt"
+        p.write_text(str(i))
+        path_digest(p)
+        paths.append(p)
+    cache.evict()
+
+    cached = [cache.get(p.absolute(), p.stat(), "md5") is not None for p in paths]
+    assert cached == [False, False, True, True, True]
+
+
+def test_cache_hit_refreshes_last_used_rarely(
+    tmp_path: Path, cache: DigestCache, monkeypatch: pytest.MonkeyPatch
+):
+    clock = [1000.0]
+    monkeypatch.setattr(digest.time, "time", lambda: clock[0])
+    paths = []
+    for i in range(4):
+        p = tmp_path / f"{i}.txt"
+        p.write_text(str(i))
+        cache.put(p.absolute(), p.stat(), "md5", file_digest(p))
+        paths.append(p)
+        clock[0] += 1
+
+    def _cached() -> list[bool]:
+        return [cache.get(p.absolute(), p.stat(), "md5") is not None for p in paths]
+
+    clock[0] += digest.TOUCH_SECONDS / 2
+    assert _cached() == [True] * 4  # too soon to write last_used back
+    cache.evict()
+    assert _cached() == [False, True, True, True]
+
+    clock[0] += digest.TOUCH_SECONDS
+    assert cache.get(paths[1].absolute(), paths[1].stat(), "md5") is not None  # refreshed
+    cache.put(paths[0].absolute(), paths[0].stat(), "md5", file_digest(paths[0]))
+    cache.evict()
+    assert _cached() == [True, True, False, True]
+
+
+def test_cache_pickles(tmp_path: Path, cache: DigestCache):
+    p = tmp_path / "a.txt"
+    p.write_text("some text")
+    path_digest(p)
+
+    clone = pickle.loads(pickle.dumps(cache))
+    assert clone.get(p.absolute(), p.stat(), "md5") == file_digest(p)
+    clone.close()
@@ -0,0 +1,67 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from db import DB, Lockfile
+from lease import Heartbeat
+
+
+def _claim_until_empty(sqlite_file: str, owner: str) -> list[tuple[str, str]]:
+    db, claimed = DB(sqlite_file), []
+    while tests := db.claim_tests(["baseline", "target"], owner, limit=2)[1]:
+        claimed += tests
+    return claimed
+
+
+def test_workers_claim_each_test_once(db: DB):
+    with ProcessPoolExecutor(3) as pool:
+        futures = [pool.submit(_claim_until_empty, db._sqlite_file, f"w{i}") for i in range(3)]
+        claims = [test for future in futures for test in future.result()]
+    assert len(claims) == len(set(claims)) == 12
+
+
+def test_expired_leases_requeue_then_fail(db: DB):
+    run_id, claimed = db.claim_tests(["baseline"], "gone", limit=1, lease_seconds=-1)
+    assert (run_id, claimed) == (1, [("baseline", "t0")])
+    assert db.requeue_expired_leases(max_attempts=2) == (1, 0)
+    assert db.claim_tests(["baseline"], "gone", lease_seconds=-1)[1] == claimed
+    assert db.requeue_expired_leases(max_attempts=2) == (0, 1)
+    assert ("baseline", "t0") not in _claim_until_empty(db._sqlite_file, "alive")
+
+
+def test_renewed_leases_are_kept(db: DB):
+    db.claim_tests(["baseline"], "alive", limit=2, lease_seconds=-1)
+    assert db.renew_leases("alive", 60) == 2
+    assert db.renew_leases("other", 60) == 0
+    assert db.requeue_expired_leases() == (0, 0)
+
+
+def test_leases_expire_by_the_share_clock(db: DB, monkeypatch: pytest.MonkeyPatch):
+    share_now = [time.time() + 3600]  # well ahead of this machine's clock
+    monkeypatch.setattr(Lockfile, "share_now", lambda self: share_now[0])
+    db.claim_tests(["baseline"], "alive", limit=1, lease_seconds=60)
+    share_now[0] += 50
+    assert db.requeue_expired_leases() == (0, 0)
+    assert db.renew_leases("alive", 60) == 1
+    share_now[0] += 50
+    assert db.requeue_expired_leases() == (0, 0)
+    share_now[0] += 20
+    assert db.requeue_expired_leases() == (1, 0)
+
+
+def test_heartbeat_logs_failed_renewals_until_lost(db: DB, caplog: pytest.LogCaptureFixture):
+    def renew_leases(owner: str, lease_seconds: float) -> int:
+        raise OSError("share went away")
+
+    db.renew_leases = renew_leases  # type: ignore[method-assign]
+    with caplog.at_level(logging.WARNING, "lease"):
+        with Heartbeat(db, "w", lease_seconds=0.3, every=0.05) as heartbeat:
+            time.sleep(0.15)
+            assert not heartbeat.lost  # a few missed beats are fine
+            time.sleep(0.35)
+            assert heartbeat.lost
+    assert "w failed to renew its leases" in caplog.text
+    assert "share went away" in caplog.text
+    assert "w lost its leases" in caplog.text
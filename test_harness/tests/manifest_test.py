@@ -0,0 +1,47 @@
+from pathlib import Path
+
+from digest import file_digest
+from manifest import Manifest
+from transfer import copy_paths
+
+
+def _collect(tmp_path: Path, env: str, files: dict[str, bytes]) -> Manifest:
+    temp = tmp_path / f"temp_{env}"
+    for relpath, data in files.items():
+        (temp / relpath).parent.mkdir(parents=True, exist_ok=True)
+        (temp / relpath).write_bytes(data)
+    outputs = tmp_path / f"outputs_{env}"
+    transfers = [(temp / name, outputs / name) for name in {r.split("/")[0] for r in files}]
+    copied = copy_paths(transfers, algorithm="md5")
+    Manifest.from_digests(outputs, "md5", copied.digests).write(tmp_path / f"{env}.json")
+    return Manifest.read(tmp_path / f"{env}.json", outputs)
+
+
+def test_manifest_digests_match_files(tmp_path: Path):
+    manifest = _collect(tmp_path, "a", {"x.tif": b"raster", "d/y.txt": b"text"})
+    assert sorted(manifest.files) == ["d/y.txt", "x.tif"]
+    for relpath, entry in manifest.files.items():
+        assert entry.digest == file_digest(manifest.root / relpath, "md5")
+        assert entry.size == (manifest.root / relpath).stat().st_size
+
+
+def test_manifest_verified(tmp_path: Path):
+    files = {"x.shp": b"shp", "x.dbf": b"dbf", "other.shp": b"o", "d/y.txt": b"y"}
+    files.update({"x.shp.xml": b"metadata", "x.tif": b"tif", "x.tfw": b"tfw"})  # same base name
+    manifest = _collect(tmp_path, "a", files)
+    root = manifest.root
+
+    assert sorted(manifest.verified(root / "x.shp")) == ["x.dbf", "x.shp"]  # with sidecars
+    assert sorted(manifest.verified(root / "x.tif")) == ["x.tif"]  # no sidecars in its digest
+    assert sorted(manifest.verified(root / "d")) == ["y.txt"]
+    assert manifest.verified(root / "missing.tif") is None
+
+    (root / "x.dbf").write_bytes(b"changed")  # no longer matches the manifest
+    assert manifest.verified(root / "x.shp") is None
+    assert manifest.verified(root / "other.shp") is not None
+
+
+def test_manifest_read_missing_or_stale(tmp_path: Path):
+    assert Manifest.read(tmp_path / "missing.json", tmp_path) is None
+    (tmp_path / "old.json").write_text('{"version": 0, "files": {}}')
+    assert Manifest.read(tmp_path / "old.json", tmp_path) is None
@@ -0,0 +1,33 @@
+from math import comb
+
+import pytest
+
+from perf import SampleStats, judge, slower_p_value
+
+
+def test_sample_stats():
+    stats = SampleStats.of([1.0, 2.0, 4.0, 10.0])
+    assert (stats.n, stats.median, stats.mad) == (4, 3.0, 1.5)
+
+
+def test_slower_p_value():
+    baseline, target = [1.0, 1.1, 1.2, 1.3], [2.0, 2.1, 2.2, 2.3]
+    assert slower_p_value(baseline, target) == pytest.approx(1 / comb(8, 4))
+    assert slower_p_value(target, baseline) == 1.0
+    # interleaved samples are no evidence either way
+    assert 0.3 < slower_p_value([1.0, 3.0, 5.0], [2.0, 4.0, 6.0]) < 0.7
+
+
+def test_judge():
+    baseline = [9.0, 1.0, 1.1, 1.0, 1.05]  # first sample is a warm-up
+    slower = [9.0, 1.3, 1.35, 1.4, 1.3]
+    verdict = judge(baseline, slower, warmups=1, ratio=1.1, alpha=0.05)
+    assert verdict is not None and verdict.regression and verdict.perf_result == "FAIL"
+    assert verdict.ratio == pytest.approx(1.325 / 1.025)
+
+    # slower, but not by enough
+    assert not judge(baseline, slower, warmups=1, ratio=1.5).regression
+    # slower by enough, but one noisy sample isn't significant
+    noisy = [9.0, 1.0, 1.05, 1.1, 3.0]
+    assert not judge(baseline, noisy, warmups=1, ratio=1.01).regression
+    assert judge(baseline, slower, warmups=5) is None
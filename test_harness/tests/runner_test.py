@@ -0,0 +1,118 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+import runner
+from db import DB
+from runner import GeneralConfig, open_config, run_tests
+from watchdog import Limits
+
+TEST_INI = """
+[test]
+toolbox = toolboxes/tb.atbx
+alias = tb
+description = {test_id}
+
+[parameters]
+
+[outputs]
+"""
+
+
+@pytest.fixture
+def config(tmp_path: Path, db: DB) -> GeneralConfig:
+    """A config whose tests_dir has the tests t0 to t5 queued in `db`."""
+    for i in range(6):
+        test_dir = tmp_path / "tests" / f"t{i}"
+        test_dir.mkdir(parents=True)
+        (test_dir / f"t{i}.ini").write_text(TEST_INI.format(test_id=f"t{i}"))
+    return GeneralConfig(
+        environments={"baseline": "python", "target": "python"},
+        root_dir=tmp_path,
+        toolboxes_dir=tmp_path / "toolboxes",
+        tests_dir=tmp_path / "tests",
+        logs_dir=tmp_path / "logs",
+        database=Path(db._sqlite_file),
+        entry_point=tmp_path / "main.py",
+        digest_cache=tmp_path / "digests.sqlite",
+    )
+
+
+def test_run_tests_concurrently_failing_crashes(
+    config: GeneralConfig, db: DB, monkeypatch: pytest.MonkeyPatch
+):
+    lock, running, most_running = threading.Lock(), [0], [0]
+    all_running = threading.Event()
+
+    def _run_test_subprocess(config, run_id, env, test_path, console_logfile, logger, limits):
+        db.update_test_status(run_id, env, test_path.stem, "running")
+        with lock:
+            running[0] += 1
+            most_running[0] = max(most_running[0], running[0])
+            if running[0] == 3:
+                all_running.set()
+        all_running.wait(10)  # until the pool has 3 jobs in flight, however slow to start
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        if test_path.stem == "t3":
+            return 1, None  # crashed before recording a result
+        db.update_test_status(run_id, env, test_path.stem, "compare", run_result="PASS")
+        return 0, None
+
+    monkeypatch.setattr(runner, "_run_test_subprocess", _run_test_subprocess)
+    run_tests(config, 1, {"baseline": None, "target": None}, jobs=3)
+
+    assert most_running[0] == 3
+    _, instances = db.get_raw_tables()
+    statuses = {(test_id, env): row for _, env, test_id, *row in instances}
+    assert len(statuses) == 12
+    for (test_id, env), status in statuses.items():
+        run_result = "FAIL" if test_id == "t3" else "PASS"  # not left 'running'
+        assert status[:2] == ["compare", run_result], (env, test_id)
+
+
+def test_open_config_limits(tmp_path: Path):
+    paths = ("root_dir", "toolboxes_dir", "tests_dir", "logs_dir", "database", "entry_point")
+    values = {"environments": {"baseline": "python"}, **{key: key for key in paths}}
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(values))
+    assert open_config(config_file).limits.unlimited  # no tests killed unless asked
+    assert open_config(config_file).staging_dir is None  # nor inputs staged
+
+    values["limits"] = {"wall_seconds": 14400}
+    config_file.write_text(json.dumps(values))
+    assert open_config(config_file).limits == Limits(wall_seconds=14400)
+
+
+def test_run_tests_longest_first(config: GeneralConfig, db: DB, monkeypatch: pytest.MonkeyPatch):
+    db.record_test_duration("baseline", "t1", config.default_estimate_seconds * 3)
+    db.record_test_duration("target", "t4", config.default_estimate_seconds * 2)  # longer env
+    db.record_test_duration("baseline", "t2", config.default_estimate_seconds / 2)
+    db.record_test_duration("target", "t2", config.default_estimate_seconds / 2)
+    started = []
+
+    def _run_test_subprocess(config, run_id, env, test_path, console_logfile, logger, limits):
+        started.append(test_path.stem)
+        return 0, None
+
+    monkeypatch.setattr(runner, "_run_test_subprocess", _run_test_subprocess)
+    run_tests(config, 1, {"baseline": None, "target": None})
+
+    # each test in both envs side by side, unknown tests assumed to take the default estimate
+    assert started[::2] == started[1::2]
+    assert started[:4:2] == ["t1", "t4"]
+    assert set(started[4:10:2]) == {"t0", "t3", "t5"}
+    assert started[10] == "t2"
+
+
+@pytest.mark.parametrize("command", ["run_all", "work", "compare"])
+def test_cache_options(config: GeneralConfig, command: str):
+    parser = config.configure_parser()
+    args = parser.parse_args([command, "--no-digest-cache", "--no-verdict-cache"])
+    assert args.no_digest_cache and args.no_verdict_cache
+    args = parser.parse_args([command])
+    assert not args.no_digest_cache and not args.no_verdict_cache
@@ -0,0 +1,14 @@
+from scheduling import predict_makespan
+
+
+def test_predict_makespan():
+    assert predict_makespan([], 4) == 0
+    assert predict_makespan([5, 3, 2], 1) == 10
+    assert predict_makespan([5, 3, 2], 2) == 5
+    assert predict_makespan([5, 3, 2], 0) == 10  # at least one slot
+
+
+def test_longest_first_shortens_makespan():
+    durations = [1] * 12 + [12]  # the long test listed last
+    assert predict_makespan(durations, 4) == 15
+    assert predict_makespan(sorted(durations, reverse=True), 4) == 12
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import staging as staging_module
+from staging import StagingCache
+
+
+def _write_tree(root: Path, files: dict[str, str]):
+    for relpath, text in files.items():
+        p = root / relpath
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_text(text)
+
+
+@pytest.fixture
+def staging(tmp_path: Path):
+    cache = StagingCache(tmp_path / "staging")
+    yield cache
+    cache.close()
+
+
+def test_stage_fetches_each_content_once(tmp_path: Path, staging: StagingCache):
+    inputs = tmp_path / "inputs"
+    _write_tree(inputs, {"a.las": "tile", "sub/b.las": "tile", "sub/c.txt": "other"})
+    (inputs / "empty").mkdir()
+
+    first = staging.stage(inputs, tmp_path / "temp_1", link=True)
+    assert (first.files, first.fetched_files) == (3, 3)
+    assert (tmp_path / "temp_1" / "sub" / "b.las").read_text() == "tile"
+    assert (tmp_path / "temp_1" / "empty").is_dir()
+
+    # a repeat (eg the other env, or the next run) fetches nothing
+    second = staging.stage(inputs, tmp_path / "temp_2", link=True)
+    assert (second.files, second.fetched_files, second.fetched_bytes) == (3, 0, 0)
+    assert second.reflinked + second.hardlinked + second.copied == 3
+
+    (inputs / "sub" / "c.txt").write_text("changed")
+    third = staging.stage(inputs, tmp_path / "temp_3")
+    assert third.fetched_files == 1
+    assert (tmp_path / "temp_3" / "sub" / "c.txt").read_text() == "changed"
+
+
+def test_stage_without_links(tmp_path: Path, staging: StagingCache):
+    inputs = tmp_path / "inputs"
+    _write_tree(inputs, {"a.txt": "a"})
+    staging.stage(inputs, tmp_path / "temp_1")
+
+    stats = staging.stage(inputs, tmp_path / "temp_2")  # links are opt-in
+    assert stats.hardlinked == 0
+    assert os.stat(tmp_path / "temp_2" / "a.txt").st_nlink == 1
+
+
+def test_stage_refetches_modified_blob(tmp_path: Path, staging: StagingCache):
+    inputs = tmp_path / "inputs"
+    _write_tree(inputs, {"a.txt": "original"})
+    staging.stage(inputs, tmp_path / "temp_1", link=True)
+
+    # a tool writing into a hardlinked input also changes the stored file
+    (tmp_path / "temp_1" / "a.txt").write_text("written by a tool")
+    stats = staging.stage(inputs, tmp_path / "temp_2")
+    assert (tmp_path / "temp_2" / "a.txt").read_text() == "original"
+    if os.stat(tmp_path / "temp_1" / "a.txt").st_nlink > 1:
+        assert stats.fetched_files == 1
+
+
+def test_stage_evicts_least_recently_used(tmp_path: Path):
+    staging = StagingCache(tmp_path / "staging", max_bytes=10)
+    try:
+        for name in ("a", "b", "c"):
+            _write_tree(tmp_path / name, {f"{name}.txt": name * 4})
+            staging.stage(tmp_path / name, tmp_path / f"temp_{name}")
+        blobs = list((tmp_path / "staging" / "blobs").rglob("*"))
+        assert sum(p.stat().st_size for p in blobs if p.is_file()) <= 10
+        assert (tmp_path / "temp_a" / "a.txt").read_text() == "aaaa"  # still usable
+
+        stats = staging.stage(tmp_path / "a", tmp_path / "temp_a2")
+        assert stats.fetched_files == 1
+    finally:
+        staging.close()
+
+
+def test_stage_keeps_a_stored_file_it_cannot_replace(
+    tmp_path: Path, staging: StagingCache, monkeypatch: pytest.MonkeyPatch
+):
+    inputs = tmp_path / "inputs"
+    _write_tree(inputs, {"a.txt": "a"})
+    staging.stage(inputs, tmp_path / "temp_1")
+    os.utime(inputs / "a.txt", ns=(0, 0))  # same content, but fetched again
+
+    def replace(src, dst):
+        raise PermissionError(13, "in use by another process", str(dst))
+
+    monkeypatch.setattr(staging_module.os, "replace", replace)
+    stats = staging.stage(inputs, tmp_path / "temp_2")
+    assert stats.fetched_files == 1
+    assert (tmp_path / "temp_2" / "a.txt").read_text() == "a"
+    assert staging.stage(inputs, tmp_path / "temp_3").fetched_files == 0  # still stored
+
+
+def test_stage_copies_from_source_when_store_fails(
+    tmp_path: Path, staging: StagingCache, monkeypatch: pytest.MonkeyPatch
+):
+    inputs = tmp_path / "inputs"
+    _write_tree(inputs, {"a.txt": "a"})
+
+    def materialize(digest, dst, link):
+        raise PermissionError(13, "in use by another process", str(dst))
+
+    monkeypatch.setattr(staging, "_materialize", materialize)
+    stats = staging.stage(inputs, tmp_path / "temp_1", link=True)
+    assert (stats.fetched_files, stats.copied) == (1, 1)
+    assert (tmp_path / "temp_1" / "a.txt").read_text() == "a"
+
+
+def _stage_each(root: Path, inputs: list[Path]) -> list[str]:
+    staging = StagingCache(root / "staging", max_bytes=64)
+    try:
+        texts = []
+        for i, src in enumerate(inputs):
+            dst = root / f"temp_{os.getpid()}_{i}"
+            staging.stage(src, dst, link=True)
+            texts.append((dst / "a.txt").read_text())
+        return texts
+    finally:
+        staging.close()
+
+
+def test_processes_share_a_store_while_it_evicts(tmp_path: Path):
+    inputs = [tmp_path / f"inputs_{i}" for i in range(12)]
+    for i, src in enumerate(inputs):
+        _write_tree(src, {"a.txt": f"{i:02}" * 16})
+    with ProcessPoolExecutor(3) as pool:
+        futures = [pool.submit(_stage_each, tmp_path, inputs[i::-1]) for i in range(4, 12, 3)]
+        results = [future.result() for future in futures]
+    for i, texts in zip(range(4, 12, 3), results):
+        assert texts == [f"{j:02}" * 16 for j in range(i, -1, -1)]
@@ -0,0 +1,38 @@
+import logging
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import test_logging
+from test_logging import OutputCapture
+
+
+def test_output_capture_restores_arcpy_as_first_imported(monkeypatch: pytest.MonkeyPatch):
+    def add_message(message):
+        pass
+
+    def add_warning(message):
+        pass
+
+    def add_error(message):
+        pass
+
+    arcpy = SimpleNamespace(AddMessage=add_message, AddWarning=add_warning, AddError=add_error)
+    monkeypatch.setitem(sys.modules, "arcpy", arcpy)
+    monkeypatch.setattr(test_logging, "_arcpy_messages", None)
+    logger = logging.getLogger("output_capture_test")
+
+    with OutputCapture(logger):
+        assert arcpy.AddMessage != add_message
+        arcpy.AddMessage = print  # eg a toolbox import, in the first job of a warm worker
+    assert arcpy.AddMessage is add_message
+
+    arcpy.AddWarning = print  # or in between jobs
+    with OutputCapture(logger):
+        pass
+    assert (arcpy.AddMessage, arcpy.AddWarning, arcpy.AddError) == (
+        add_message,
+        add_warning,
+        add_error,
+    )
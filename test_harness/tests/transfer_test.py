@@ -0,0 +1,77 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import transfer
+from transfer import FAST_COPY_BYTES, copy_file, copy_paths, copy_tree
+
+
+def _write_tree(root: Path, files: dict[str, bytes]):
+    for relpath, data in files.items():
+        p = root / relpath
+        p.parent.mkdir(parents=True, exist_ok=True)
+        p.write_bytes(data)
+
+
+def _read_tree(root: Path) -> dict[str, bytes]:
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in root.rglob("*") if p.is_file()}
+
+
+def test_copy_tree(tmp_path: Path):
+    files = {
+        "big.tif": bytes(range(256)) * (FAST_COPY_BYTES // 100),
+        "a/small.txt": b"small",
+        "a/b/empty.txt": b"",
+    }
+    _write_tree(tmp_path / "src", files)
+    (tmp_path / "src" / "empty_dir").mkdir()
+
+    stats = copy_tree(tmp_path / "src", tmp_path / "dst", workers=4)
+    assert _read_tree(tmp_path / "dst") == files
+    assert (tmp_path / "dst" / "empty_dir").is_dir()
+    assert (stats.files, stats.skipped) == (3, 0)
+    assert stats.bytes == sum(map(len, files.values()))
+    src_mtime = (tmp_path / "src" / "a" / "small.txt").stat().st_mtime_ns
+    assert (tmp_path / "dst" / "a" / "small.txt").stat().st_mtime_ns == src_mtime
+
+
+def test_copy_skip_identical(tmp_path: Path):
+    _write_tree(tmp_path / "src", {"a.txt": b"aaaa", "b.txt": b"bbbb"})
+    copy_tree(tmp_path / "src", tmp_path / "dst")
+
+    (tmp_path / "src" / "b.txt").write_bytes(b"bbbbbb")
+    stats = copy_tree(tmp_path / "src", tmp_path / "dst", skip_identical=True)
+    assert (stats.files, stats.skipped, stats.bytes) == (1, 1, 6)
+    assert (tmp_path / "dst" / "b.txt").read_bytes() == b"bbbbbb"
+
+    stats = copy_tree(tmp_path / "src", tmp_path / "dst")  # not skipping copies everything
+    assert (stats.files, stats.skipped) == (2, 0)
+
+
+def test_copy_file_without_kernel_copy(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def unsupported(*args):
+        raise OSError("not supported")
+
+    for name in ("copy_file_range", "sendfile"):
+        if hasattr(os, name):
+            monkeypatch.setattr(transfer.os, name, unsupported)
+    data = os.urandom(FAST_COPY_BYTES * 3 + 17)
+    (tmp_path / "big.bin").write_bytes(data)
+
+    assert copy_file(tmp_path / "big.bin", tmp_path / "copy.bin") == len(data)
+    assert (tmp_path / "copy.bin").read_bytes() == data
+
+
+def test_copy_paths(tmp_path: Path):
+    _write_tree(tmp_path / "temp", {"out.tif": b"tif", "out_dir/x.txt": b"x"})
+    transfers = [
+        (tmp_path / "temp" / "out.tif", tmp_path / "outputs" / "out.tif"),
+        (tmp_path / "temp" / "out_dir", tmp_path / "outputs" / "out_dir"),
+    ]
+    stats = copy_paths(transfers)
+    assert _read_tree(tmp_path / "outputs") == {"out.tif": b"tif", "out_dir/x.txt": b"x"}
+    assert stats.files == 2
+
+    with pytest.raises(FileNotFoundError):
+        copy_paths([(tmp_path / "temp" / "missing", tmp_path / "outputs" / "missing")])
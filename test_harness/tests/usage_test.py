@@ -0,0 +1,36 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import usage
+from usage import UsageMeter
+
+BURN_AND_ALLOCATE = (
+    "import time; x = bytearray(150 << 20); end = time.process_time() + 0.5\n"
+    "while time.process_time() < end: pass"
+)
+
+
+def test_usage_of_child_process(tmp_path: Path):
+    with UsageMeter(sample_seconds=0.05) as meter:
+        subprocess.run([sys.executable, "-c", BURN_AND_ALLOCATE], check=True)
+        (tmp_path / "out.bin").write_bytes(b"x" * (4 << 20))
+    used = meter.usage
+    assert used is not None and used.wall_seconds >= 0.5
+    if usage.resource is None and usage.psutil is None:
+        pytest.skip("only wall time can be measured here")
+    assert used.cpu_seconds is not None and used.cpu_seconds >= 0.4
+    assert used.peak_rss_mb is not None and used.peak_rss_mb >= 150
+    if used.write_bytes is not None:
+        assert used.write_bytes >= 4 << 20
+
+
+def test_usage_recorded_when_raising():
+    meter = UsageMeter()
+    with pytest.raises(ValueError):
+        with meter:
+            raise ValueError("tool crashed")
+    assert meter.usage is not None and meter.usage.wall_seconds >= 0
+    assert "wall" in str(meter.usage)
@@ -0,0 +1,77 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+from warm_worker import WarmWorker, WarmWorkerPool, WorkerCrashed
+
+WORKER_SCRIPT = """
+import os, sys
+sys.path.insert(0, {harness!r})
+import warm_worker
+
+print("startup noise")
+
+
+def job(path, run_id):
+    print("running", path)
+    if path.name == "crash.ini":
+        os._exit(3)
+    if path.name == "raise.ini":
+        raise ValueError("boom")
+    return "PASS" if run_id % 2 else "FAIL"
+
+
+warm_worker.serve(job, max_jobs=int(sys.argv[1]))
+"""
+
+
+@pytest.fixture
+def start_worker(tmp_path: Path):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER_SCRIPT.format(harness=str(Path(__file__).parents[1])))
+
+    def _start(max_jobs: int = 50):
+        def start(env: str, number: int) -> WarmWorker:
+            logfile = tmp_path / f"worker_{env}_{number}.log"
+            return WarmWorker([sys.executable, str(script), str(max_jobs)], logfile)
+
+        return start
+
+    return _start
+
+
+def test_warm_worker_results(tmp_path: Path, start_worker):
+    worker = start_worker()("baseline", 1)
+    try:
+        assert worker.run(tmp_path / "a.ini", 1).run_result == "PASS"
+        assert worker.run(tmp_path / "b.ini", 2).run_result == "FAIL"
+        result = worker.run(tmp_path / "raise.ini", 3)
+        assert result.run_result is None
+        assert "ValueError: boom" in result.error
+        assert worker.alive
+    finally:
+        worker.stop()
+    console = (tmp_path / "worker_baseline_1.log").read_text()
+    assert "running" in console  # printed while serving goes to the console log
+
+
+def test_warm_worker_pool_retires_and_survives_crash(tmp_path: Path, start_worker):
+    started = []
+
+    def start(env: str, number: int) -> WarmWorker:
+        started.append((env, number))
+        return start_worker(max_jobs=2)(env, number)
+
+    pool = WarmWorkerPool(start)
+    try:
+        for run_id in range(1, 4):
+            assert pool.run("target", tmp_path / "a.ini", run_id).run_result is not None
+        assert started == [("target", 1), ("target", 2)]  # first retired after 2 jobs
+
+        with pytest.raises(WorkerCrashed):
+            pool.run("target", tmp_path / "crash.ini", 4)
+        assert pool.run("target", tmp_path / "a.ini", 5).run_result == "PASS"
+        assert len(started) == 3
+    finally:
+        pool.close()
@@ -0,0 +1,52 @@
+import subprocess
+import sys
+import time
+
+import pytest
+
+import watchdog
+from watchdog import OOM, TIMEOUT, Limits, Watchdog, new_process_group
+
+SLEEP_WITH_CHILD = (
+    "import subprocess, sys; "
+    "subprocess.run([sys.executable, '-c', 'import time; time.sleep(60)'])"
+)
+
+
+def _watch(code: str, limits: Limits) -> tuple[subprocess.Popen, Watchdog, float]:
+    process = subprocess.Popen([sys.executable, "-c", code], **new_process_group())
+    start = time.monotonic()
+    with Watchdog(process.pid, limits, poll_seconds=0.1) as dog:
+        process.wait(timeout=30)
+    return process, dog, time.monotonic() - start
+
+
+def test_limits_merged():
+    limits = Limits(wall_seconds=60, max_rss_mb=1000)
+    assert limits.merged(wall_seconds=None, cpu_seconds=5) == Limits(60, 1000, 5)
+    assert Limits().unlimited and not limits.unlimited
+
+
+def test_watchdog_within_limits():
+    _, dog, _ = _watch("pass", Limits(wall_seconds=30, max_rss_mb=4096, cpu_seconds=30))
+    assert dog.violation is None
+
+
+@pytest.mark.parametrize("without_psutil", [False, True])
+def test_watchdog_timeout_kills_tree(monkeypatch: pytest.MonkeyPatch, without_psutil: bool):
+    if without_psutil:
+        monkeypatch.setattr(watchdog, "psutil", None)
+    elif watchdog.psutil is None:
+        pytest.skip("psutil not installed")
+    process, dog, took = _watch(SLEEP_WITH_CHILD, Limits(wall_seconds=0.5))
+    assert dog.violation is not None and dog.violation.run_result == TIMEOUT
+    assert process.returncode != 0
+    assert took < 10
+
+
+def test_watchdog_memory():
+    if watchdog.tree_usage(0 if sys.platform == "win32" else 1)[0] is None:
+        pytest.skip("memory can't be measured here")
+    code = "import time; x = bytearray(200 << 20); time.sleep(30)"
+    _, dog, _ = _watch(code, Limits(wall_seconds=30, max_rss_mb=100))
+    assert dog.violation is not None and dog.violation.run_result == OOM
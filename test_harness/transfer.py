@@ -0,0 +1,245 @@
+"""
+Copying files and directory trees between the network share and local
+disks, with many files in flight at once.
+
+Copying thousands of small files one at a time over SMB is bound by the
+latency of each open and close, so files are copied on a thread pool
+(file I/O releases the GIL). Big files use `os.copy_file_range` or
+`os.sendfile` where the platform has them, so the kernel moves the bytes
+without them passing through python. Elsewhere they are copied through one
+large reused buffer, which also cuts the number of round trips to the
+share. A file can optionally be skipped if its destination already has the
+same size and mtime, and can be hashed as it is copied, so its digest is
+known without reading it again.
+"""
+
+import hashlib
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from digest import file_digest, new_hash
+
+BUFFER_SIZE = 8 << 20
+"""bytes read at a time when copying through python (8 MiB)"""
+FAST_COPY_BYTES = 1 << 20
+"""files at least this big are copied by the kernel where possible (1 MiB)"""
+DEFAULT_COPY_WORKERS = 8
+"""files copied at once"""
+MTIME_WINDOW_NS = 1_000_000
+"""max mtime difference for files to count as identical, for filesystems that
+store mtimes less precisely than the source (1 ms)"""
+
+
+@dataclass(frozen=True)
+class CopyStats:
+    """What a copy moved."""
+
+    files: int
+    """files copied, not counting skipped ones"""
+    skipped: int
+    """files skipped because the destination was already identical"""
+    bytes: int
+    """bytes copied"""
+    seconds: float
+    digests: dict[Path, bytes] = field(default_factory=dict)
+    """content digest of each destination file, if hashed while copying"""
+
+    @property
+    def throughput(self) -> float:
+        """bytes copied per second"""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.files} files ({self.bytes:,} bytes) in {self.seconds:.1f}s "
+            f"at {self.throughput / (1 << 20):.1f} MiB/s, {self.skipped} skipped as identical"
+        )
+
+
+def _identical(st: os.stat_result, dst: Path) -> bool:
+    """True if `dst` exists with the same size and mtime as a file with stat `st`."""
+    try:
+        dst_st = dst.stat()
+    except FileNotFoundError:
+        return False
+    return (
+        dst_st.st_size == st.st_size
+        and abs(dst_st.st_mtime_ns - st.st_mtime_ns) <= MTIME_WINDOW_NS
+    )
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, size: int) -> bool:
+    """Copy `size` bytes between open files without passing them through
+    python, if the platform and filesystems allow. Returns False if not,
+    with both files back at offset 0 and `dst` empty."""
+    for copy in (getattr(os, "copy_file_range", None), getattr(os, "sendfile", None)):
+        if copy is None:
+            continue
+        copied = 0
+        try:
+            while copied < size:
+                if copy is os.sendfile:
+                    n = copy(dst_fd, src_fd, copied, size - copied)
+                else:
+                    n = copy(src_fd, dst_fd, size - copied, copied, copied)
+                if n == 0:
+                    break  # the file shrank while copying
+                copied += n
+            return True
+        except OSError:
+            # eg not supported between these filesystems
+            os.ftruncate(dst_fd, 0)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+            os.lseek(src_fd, 0, os.SEEK_SET)
+    return False
+
+
+def copy_file(
+    src: Union[str, Path],
+    dst: Union[str, Path],
+    skip_identical: bool = False,
+    hash: Optional['hashlib._Hash'] = None,
+) -> int:
+    """Copies a file's content and stat info (like `shutil.copy2`).
+
+    Args:
+        src (Union[str, Path]): the file to copy.
+        dst (Union[str, Path]): where to copy it. Its parent must exist.
+        skip_identical (bool, optional): don't copy if `dst` already has the
+            same size and mtime. Defaults to False.
+        hash (Optional[hashlib._Hash], optional): hash object updated with
+            the content as it is copied. Not updated if the copy is skipped.
+            Defaults to None.
+
+    Returns:
+        int: bytes copied. 0 if skipped.
+    """
+    src, dst = Path(src), Path(dst)
+    st = src.stat()
+    if skip_identical and _identical(st, dst):
+        return 0
+    with open(src, "rb", buffering=0) as fs, open(dst, "wb", buffering=0) as fd:
+        # the kernel can't tee into the hash, so hashed copies go through python
+        fast = hash is None and st.st_size >= FAST_COPY_BYTES
+        if not (fast and _kernel_copy(fs.fileno(), fd.fileno(), st.st_size)):
+            buffer = bytearray(min(BUFFER_SIZE, max(st.st_size, 1)))
+            view = memoryview(buffer)
+            while n := fs.readinto(buffer):
+                if hash is not None:
+                    hash.update(view[:n])
+                fd.write(view[:n])
+    shutil.copystat(src, dst)
+    return st.st_size
+
+
+def copy_files(
+    pairs: Iterable[tuple[Path, Path]],
+    skip_identical: bool = False,
+    workers: int = DEFAULT_COPY_WORKERS,
+    algorithm: Optional[str] = None,
+) -> CopyStats:
+    """Copies files on a thread pool, biggest first so one big file doesn't
+    finish last on its own. Destination directories are created as needed.
+
+    Args:
+        pairs (Iterable[tuple[Path, Path]]): (source, destination) of each file.
+        skip_identical (bool, optional): see `copy_file`. Defaults to False.
+        workers (int, optional): files copied at once. Defaults to DEFAULT_COPY_WORKERS.
+        algorithm (Optional[str], optional): hash each file with this
+            algorithm while it is copied (skipped files are hashed at the
+            destination). Defaults to None, no hashing.
+
+    Returns:
+        CopyStats: files and bytes copied.
+    """
+    start = time.perf_counter()
+    sized = sorted(((src.stat().st_size, src, dst) for src, dst in pairs), key=lambda t: -t[0])
+    for parent in {dst.parent for _, _, dst in sized}:
+        parent.mkdir(parents=True, exist_ok=True)
+
+    def _copy(job: tuple[int, Path, Path]) -> tuple[int, Optional[bytes]]:
+        size, src, dst = job
+        hash = None if algorithm is None else new_hash(algorithm)
+        n = copy_file(src, dst, skip_identical, hash)
+        if hash is None:
+            return n, None
+        if n == 0 and size > 0:
+            return n, file_digest(dst, algorithm)  # skipped, so not hashed on the way
+        return n, hash.digest()
+
+    if workers <= 1 or len(sized) <= 1:
+        copied = [_copy(job) for job in sized]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            copied = list(pool.map(_copy, sized))
+    skipped = sum(1 for (size, _, _), (n, _) in zip(sized, copied) if n == 0 and size > 0)
+    digests = {dst: d for (_, _, dst), (_, d) in zip(sized, copied) if d is not None}
+    return CopyStats(
+        files=len(sized) - skipped,
+        skipped=skipped,
+        bytes=sum(n for n, _ in copied),
+        seconds=time.perf_counter() - start,
+        digests=digests,
+    )
+
+
+def tree_pairs(src: Path, dst: Path) -> list[tuple[Path, Path]]:
+    """Lists (source, destination) of each file for copying the tree `src`
+    to `dst`, creating every directory of the tree (even empty ones) at `dst`."""
+    pairs: list[tuple[Path, Path]] = []
+    dst.mkdir(parents=True, exist_ok=True)
+    for dirpath, dirnames, filenames in os.walk(src):
+        target = dst / Path(dirpath).relative_to(src)
+        for name in dirnames:
+            (target / name).mkdir(exist_ok=True)
+        pairs.extend((Path(dirpath, name), target / name) for name in filenames)
+    return pairs
+
+
+def copy_tree(
+    src: Union[str, Path],
+    dst: Union[str, Path],
+    skip_identical: bool = False,
+    workers: int = DEFAULT_COPY_WORKERS,
+    algorithm: Optional[str] = None,
+) -> CopyStats:
+    """Copies a directory tree, like `shutil.copytree(src, dst,
+    dirs_exist_ok=True)` but with many files in flight. See `copy_files`."""
+    return copy_files(tree_pairs(Path(src), Path(dst)), skip_identical, workers, algorithm)
+
+
+def copy_paths(
+    transfers: Iterable[tuple[Path, Path]],
+    skip_identical: bool = False,
+    workers: int = DEFAULT_COPY_WORKERS,
+    algorithm: Optional[str] = None,
+) -> CopyStats:
+    """Copies files and directory trees together on one thread pool.
+
+    Args:
+        transfers (Iterable[tuple[Path, Path]]): (source, destination) of each
+            file or directory.
+        skip_identical (bool, optional): see `copy_file`. Defaults to False.
+        workers (int, optional): files copied at once. Defaults to DEFAULT_COPY_WORKERS.
+        algorithm (Optional[str], optional): see `copy_files`. Defaults to None.
+
+    Raises:
+        FileNotFoundError: if a source doesn't exist.
+
+    Returns:
+        CopyStats: files and bytes copied.
+    """
+    pairs: list[tuple[Path, Path]] = []
+    for src, dst in transfers:
+        if src.is_file():
+            pairs.append((src, dst))
+        elif src.is_dir():
+            pairs.extend(tree_pairs(src, dst))
+        else:
+            raise FileNotFoundError(f"cannot copy {src}: no such file or directory")
+    return copy_files(pairs, skip_identical, workers, algorithm)
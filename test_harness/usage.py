@@ -0,0 +1,191 @@
+"""
+Resource usage of a tool while it runs: wall clock time, user and system
+CPU time, peak resident memory, and bytes read and written. Measured from
+within the process running the tool (`run_one` or a warm worker), so it
+includes any processes the tool starts and waits for.
+
+Counters come from psutil when available, otherwise from
+`resource.getrusage` and /proc on Linux. Where neither is available only
+the wall clock time is measured.
+"""
+
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from watchdog import tree_usage
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+SAMPLE_SECONDS = 0.25
+"""how often memory is sampled while the tool runs"""
+
+
+@dataclass(frozen=True)
+class ResourceUsage:
+    """What a tool used while it ran. None where it couldn't be measured."""
+
+    wall_seconds: float
+    user_seconds: Optional[float] = None
+    """user CPU time, including waited for child processes"""
+    system_seconds: Optional[float] = None
+    """system CPU time, including waited for child processes"""
+    peak_rss_mb: Optional[float] = None
+    """peak resident memory (MiB) of the process tree"""
+    read_bytes: Optional[int] = None
+    """bytes read, including from cache and network shares"""
+    write_bytes: Optional[int] = None
+    """bytes written"""
+
+    @property
+    def cpu_seconds(self) -> Optional[float]:
+        if self.user_seconds is None or self.system_seconds is None:
+            return None
+        return self.user_seconds + self.system_seconds
+
+    def __str__(self) -> str:
+        parts = [f"{self.wall_seconds:.1f}s wall"]
+        if self.cpu_seconds is not None:
+            parts.append(f"{self.user_seconds:.1f}s user + {self.system_seconds:.1f}s sys CPU")
+        if self.peak_rss_mb is not None:
+            parts.append(f"{self.peak_rss_mb:.0f} MiB peak")
+        if self.read_bytes is not None and self.write_bytes is not None:
+            parts.append(
+                f"{self.read_bytes / (1 << 20):.1f} MiB read, "
+                f"{self.write_bytes / (1 << 20):.1f} MiB written"
+            )
+        return ", ".join(parts)
+
+
+@dataclass(frozen=True)
+class _Counters:
+    """Cumulative counters of this process (and its waited for children)."""
+
+    user: Optional[float] = None
+    system: Optional[float] = None
+    peak_rss_mb: Optional[float] = None
+    """peak of this process over its life so far"""
+    children_peak_rss_mb: Optional[float] = None
+    """peak of the largest waited for child so far"""
+    read: Optional[int] = None
+    write: Optional[int] = None
+
+
+def _maxrss_mb(ru_maxrss: int) -> float:
+    """`ru_maxrss` in MiB. It is KiB on Linux, bytes on macOS."""
+    return ru_maxrss / (1 << 20) if sys.platform == "darwin" else ru_maxrss / 1024
+
+
+def _proc_io() -> tuple[Optional[int], Optional[int]]:
+    """Characters read and written by this process from /proc (Linux only)."""
+    try:
+        lines = Path("/proc/self/io").read_text().splitlines()
+    except OSError:
+        return None, None
+    fields = dict(line.split(": ") for line in lines if ": " in line)
+    return int(fields["rchar"]), int(fields["wchar"])
+
+
+def _counters() -> _Counters:
+    """Snapshot of this process's counters."""
+    user = system = peak = children_peak = None
+    read = write = None
+    if resource is not None:
+        own = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        user = own.ru_utime + children.ru_utime
+        system = own.ru_stime + children.ru_stime
+        peak = _maxrss_mb(own.ru_maxrss)
+        children_peak = _maxrss_mb(children.ru_maxrss)
+        read, write = _proc_io()
+    if psutil is not None:
+        process = psutil.Process()
+        if resource is None:  # windows reports no children's times
+            times = process.cpu_times()
+            user, system = times.user, times.system
+            peak = getattr(process.memory_info(), "peak_wset", 0) / (1 << 20) or None
+        if hasattr(process, "io_counters"):  # not on macOS
+            io = process.io_counters()
+            # read_chars counts cached and network reads on linux. windows read_bytes does
+            read = getattr(io, "read_chars", io.read_bytes)
+            write = getattr(io, "write_chars", io.write_bytes)
+    return _Counters(user, system, peak, children_peak, read, write)
+
+
+def _delta(after: Optional[float], before: Optional[float]) -> Optional[float]:
+    return None if after is None or before is None else after - before
+
+
+def _grown_peak(after: Optional[float], before: Optional[float]) -> Optional[float]:
+    """A lifetime peak reached while measuring, if it grew then."""
+    return after if after is not None and before is not None and after > before else None
+
+
+class UsageMeter:
+    """A context manager that measures the resources used in its `with`
+    block. After the block, even one that raised, `usage` holds them.
+
+    Peak memory is the largest of the process tree's memory sampled from a
+    thread every `sample_seconds`, and this process's (or a waited for
+    child's) lifetime peak if that was reached within the block.
+
+    Args:
+        sample_seconds (float, optional): how often memory is sampled.
+            Defaults to SAMPLE_SECONDS.
+    """
+
+    def __init__(self, sample_seconds: float = SAMPLE_SECONDS) -> None:
+        self.sample_seconds = sample_seconds
+        self.usage: Optional[ResourceUsage] = None
+        self._sampled_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def __enter__(self) -> 'UsageMeter':
+        self._before = _counters()
+        self._start = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self._start
+        self._stop.set()
+        self._thread.join()
+        self._record_rss()
+        after, before = _counters(), self._before
+        peaks = [
+            self._sampled_mb,
+            _grown_peak(after.peak_rss_mb, before.peak_rss_mb),
+            _grown_peak(after.children_peak_rss_mb, before.children_peak_rss_mb),
+        ]
+        read, write = _delta(after.read, before.read), _delta(after.write, before.write)
+        self.usage = ResourceUsage(
+            wall_seconds=wall,
+            user_seconds=_delta(after.user, before.user),
+            system_seconds=_delta(after.system, before.system),
+            peak_rss_mb=max((p for p in peaks if p is not None), default=None),
+            read_bytes=None if read is None else int(read),
+            write_bytes=None if write is None else int(write),
+        )
+
+    def _record_rss(self) -> None:
+        rss_mb = tree_usage(os.getpid())[0]
+        if rss_mb is not None and (self._sampled_mb is None or rss_mb > self._sampled_mb):
+            self._sampled_mb = rss_mb
+
+    def _sample(self) -> None:
+        self._record_rss()
+        while not self._stop.wait(self.sample_seconds):
+            self._record_rss()
@@ -0,0 +1,242 @@
+"""
+Long-lived worker processes that run tests for one env, so arcpy is
+imported (and its license checked out) once per worker rather than once
+per test.
+
+The orchestrator side (`WarmWorker`, `WarmWorkerPool`) starts
+`runner.py worker` with the env's python and sends it one job per line on
+stdin as JSON. The worker side (`serve`) answers each job with one JSON
+result line on its original stdout, prefixed with RESULT_PREFIX so stray
+output printed while arcpy imports can't be mistaken for a result. Once
+serving, everything else the worker prints goes to its stderr.
+
+A worker retires itself after a number of jobs or when its memory grows
+past a threshold, and the pool starts a fresh one for the next job. If a
+worker dies mid-job, only that job is lost.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable, Optional, TextIO
+
+from watchdog import Limits, Violation, Watchdog, new_process_group
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+RESULT_PREFIX = "@@test_harness_result "
+"""marks a result line on the worker's stdout"""
+MAX_JOBS = 50
+"""default jobs a worker runs before it retires"""
+MAX_RSS_MB = 4096
+"""default resident memory (MiB) after which a worker retires"""
+STOP_TIMEOUT = 60
+"""seconds to wait for a worker to exit after its job stream is closed"""
+
+
+@dataclass(frozen=True)
+class JobResult:
+    """What a worker reports back after running one test."""
+
+    run_result: Optional[str]
+    """PASS or FAIL, or None if running the test raised an error"""
+    seconds: float
+    error: Optional[str] = None
+    """traceback of the error, if any"""
+    rss_mb: Optional[float] = None
+    """the worker's resident memory after the test, if known"""
+    retiring: bool = False
+    """the worker exits after this job"""
+
+
+class WorkerCrashed(Exception):
+    """A worker process exited while running a job."""
+
+    def __init__(self, message: str, violation: Optional[Violation] = None) -> None:
+        super().__init__(message)
+        self.violation = violation
+        """why the watchdog killed the worker, if it did"""
+
+
+def _rss_mb() -> Optional[float]:
+    """This process's resident memory in MiB, if psutil is available."""
+    if psutil is None:
+        return None
+    return psutil.Process().memory_info().rss / (1 << 20)
+
+
+def serve(
+    run_job: Callable[[Path, int], str],
+    max_jobs: int = MAX_JOBS,
+    max_rss_mb: float = MAX_RSS_MB,
+    jobs: TextIO = sys.stdin,
+) -> None:
+    """Runs jobs read from `jobs` until it is closed, `max_jobs` have run,
+    or memory use passes `max_rss_mb`. Runs in the worker process.
+
+    Args:
+        run_job (Callable[[Path, int], str]): runs the test at a path for a
+            run id, returning PASS or FAIL. eg `runner.run_single_test`.
+        max_jobs (int, optional): jobs to run before retiring. Defaults to MAX_JOBS.
+        max_rss_mb (float, optional): resident memory (MiB) after which to
+            retire. Only checked if psutil is available. Defaults to MAX_RSS_MB.
+        jobs (TextIO, optional): where jobs are read from. Defaults to stdin.
+    """
+    # keep the real stdout for results, and send anything else printed to stderr
+    sys.stdout.flush()
+    results = os.fdopen(os.dup(sys.stdout.fileno()), "w", encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    for done in range(1, max_jobs + 1):
+        line = jobs.readline()
+        if not line:
+            break  # orchestrator is finished with this worker
+        job = json.loads(line)
+        start = time.perf_counter()
+        try:
+            run_result, error = run_job(Path(job["path"]), job["run_id"]), None
+        except Exception:
+            run_result, error = None, traceback.format_exc()
+        rss_mb = _rss_mb()
+        retiring = done >= max_jobs or (rss_mb is not None and rss_mb > max_rss_mb)
+        result = JobResult(run_result, time.perf_counter() - start, error, rss_mb, retiring)
+        results.write(RESULT_PREFIX + json.dumps(asdict(result)) + "\n")
+        results.flush()
+        if retiring:
+            break
+    results.close()
+
+
+class WarmWorker:
+    """Handle on one worker process, used by the orchestrator.
+
+    Args:
+        command (list[str]): command that starts the worker, eg
+            `[env_python, "runner.py", "worker", "--env", "target"]`
+        console_logfile (Path): file the worker's console output is appended to
+    """
+
+    def __init__(self, command: list[str], console_logfile: Path) -> None:
+        console_logfile.parent.mkdir(parents=True, exist_ok=True)
+        with console_logfile.open("a", encoding="utf-8") as console:
+            self.process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=console,
+                text=True,
+                encoding="utf-8",
+                bufsize=1,  # line buffered
+                **new_process_group(),
+            )
+        self.jobs = 0
+        self.retired = False
+
+    @property
+    def alive(self) -> bool:
+        """True if the worker can take another job."""
+        return not self.retired and self.process.poll() is None
+
+    def run(self, test_path: Path, run_id: int, limits: Limits = Limits()) -> JobResult:
+        """Runs a test in the worker and waits for its result. The worker is
+        killed if the test passes one of `limits`.
+
+        Raises:
+            WorkerCrashed: if the worker exits (or is killed) before reporting
+                a result.
+        """
+        try:
+            self.process.stdin.write(json.dumps({"path": str(test_path), "run_id": run_id}) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            raise WorkerCrashed(f"worker {self.process.pid} is gone: {e}")
+        with Watchdog(self.process.pid, limits) as watchdog:
+            for line in self.process.stdout:
+                if line.startswith(RESULT_PREFIX):
+                    result = JobResult(**json.loads(line[len(RESULT_PREFIX) :]))
+                    self.jobs += 1
+                    self.retired = result.retiring
+                    return result
+                # anything else was printed before the worker started serving
+            self.process.wait()
+        if watchdog.violation is not None:
+            raise WorkerCrashed(
+                f"worker {self.process.pid} killed: {watchdog.violation.reason}",
+                watchdog.violation,
+            )
+        raise WorkerCrashed(
+            f"worker {self.process.pid} exited with code {self.process.returncode} "
+            f"after {self.jobs} jobs"
+        )
+
+    def stop(self, timeout: float = STOP_TIMEOUT) -> None:
+        """Closes the worker's job stream and waits for it to exit, killing it
+        if it doesn't."""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class WarmWorkerPool:
+    """Warm workers for each env, shared by the threads running tests. Each
+    thread takes an idle worker for the test's env (starting one if none is
+    idle), so there are at most as many workers per env as threads.
+
+    Args:
+        start_worker (Callable[[str, int], WarmWorker]): starts a worker for
+            an env. Also given a count of workers started, eg for log names.
+    """
+
+    def __init__(self, start_worker: Callable[[str, int], WarmWorker]) -> None:
+        self._start_worker = start_worker
+        self._idle: dict[str, list[WarmWorker]] = {}
+        self._started = 0
+        self._lock = threading.Lock()
+
+    def run(
+        self, env: str, test_path: Path, run_id: int, limits: Limits = Limits()
+    ) -> JobResult:
+        """Runs a test in a warm worker for `env`. See `WarmWorker.run`."""
+        with self._lock:
+            idle = self._idle.setdefault(env, [])
+            worker = idle.pop() if idle else None
+            if worker is None:
+                self._started += 1
+                started = self._started
+        if worker is None:
+            worker = self._start_worker(env, started)
+        try:
+            result = worker.run(test_path, run_id, limits)
+        except WorkerCrashed:
+            worker.stop()
+            raise
+        if worker.alive:
+            with self._lock:
+                self._idle[env].append(worker)
+        else:
+            worker.stop()  # retired, a new one is started for the next job
+        return result
+
+    def close(self) -> None:
+        """Stops all idle workers."""
+        with self._lock:
+            workers = [w for idle in self._idle.values() for w in idle]
+            self._idle.clear()
+        for worker in workers:
+            worker.stop()
@@ -0,0 +1,206 @@
+"""
+Per-test limits on wall clock time, memory and CPU time, enforced by a
+watchdog thread that kills the test's process tree when one is passed, so
+one hung or runaway tool can't hold up the rest of the queue.
+
+Memory and CPU time are summed over the whole process tree when psutil is
+available. Without it, only the watched process itself is measured on
+Linux (from /proc), and only the wall clock is enforced elsewhere.
+"""
+
+import os
+import signal
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+TIMEOUT = "TIMEOUT"
+"""run result of a test killed for running too long (wall clock or CPU)"""
+OOM = "OOM"
+"""run result of a test killed for using too much memory"""
+POLL_SECONDS = 1.0
+"""how often the watchdog checks a process"""
+KILL_WAIT_SECONDS = 10
+"""how long to wait for a killed process's descendants to exit"""
+
+
+@dataclass(frozen=True)
+class Limits:
+    """Limits on one test. None means unlimited."""
+
+    wall_seconds: Optional[float] = None
+    """wall clock time"""
+    max_rss_mb: Optional[float] = None
+    """resident memory (MiB) of the process tree"""
+    cpu_seconds: Optional[float] = None
+    """user and system CPU time of the process tree"""
+
+    def merged(self, **overrides: Optional[float]) -> 'Limits':
+        """These limits, with those given as not None replacing them."""
+        return replace(self, **{k: v for k, v in overrides.items() if v is not None})
+
+    def scaled(self, runs: int) -> 'Limits':
+        """These limits for a test that runs its tool `runs` times in a row:
+        the time limits multiplied, and memory unchanged."""
+        return replace(
+            self,
+            wall_seconds=None if self.wall_seconds is None else self.wall_seconds * runs,
+            cpu_seconds=None if self.cpu_seconds is None else self.cpu_seconds * runs,
+        )
+
+    @property
+    def unlimited(self) -> bool:
+        return self.wall_seconds is None and self.max_rss_mb is None and self.cpu_seconds is None
+
+
+@dataclass(frozen=True)
+class Violation:
+    """Why the watchdog killed a test."""
+
+    run_result: str
+    """TIMEOUT or OOM"""
+    reason: str
+
+
+def new_process_group() -> dict[str, Any]:
+    """Keyword arguments for `subprocess.Popen` that start a process in its
+    own group, so `kill_tree` can find its children without psutil. Not
+    needed on Windows, where `taskkill` follows the tree."""
+    if os.name == "nt":
+        return {}
+    return {"start_new_session": True}
+
+
+def kill_tree(pid: int) -> None:
+    """Kill a process and all of its descendants."""
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return
+        for proc in procs:  # root first, so it can't react to its children dying
+            try:
+                proc.kill()
+            except psutil.NoSuchProcess:
+                pass
+        # the root is left for its parent to wait for, which would otherwise lose its exit code
+        psutil.wait_procs(procs[1:], timeout=KILL_WAIT_SECONDS)
+    elif os.name == "nt":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True)
+    else:
+        try:
+            if os.getpgid(pid) == pid:  # leads its own group, see `new_process_group`
+                os.killpg(pid, signal.SIGKILL)
+            else:
+                os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+def _proc_usage(pid: int) -> tuple[Optional[float], Optional[float]]:
+    """Resident memory (MiB) and CPU seconds of one process from /proc (Linux only)."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None, None
+    rss_mb = None
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            rss_mb = int(line.split()[1]) / 1024
+    # fields after the parenthesized command name; utime and stime are the 12th and 13th
+    fields = stat.rpartition(")")[2].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return rss_mb, cpu
+
+
+def tree_usage(pid: int) -> tuple[Optional[float], Optional[float]]:
+    """Resident memory (MiB) and CPU seconds used by a process tree, or
+    None where they can't be measured."""
+    if psutil is None:
+        return _proc_usage(pid) if Path("/proc").is_dir() else (None, None)
+    try:
+        root = psutil.Process(pid)
+        procs = [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return None, None
+    rss = cpu = 0.0
+    for proc in procs:
+        try:
+            rss += proc.memory_info().rss
+            times = proc.cpu_times()
+            cpu += times.user + times.system
+        except psutil.NoSuchProcess:
+            pass  # exited meanwhile
+    return rss / (1 << 20), cpu
+
+
+class Watchdog:
+    """A context manager that watches a process tree from a thread while in
+    the `with` block, killing it if it passes one of `limits`. After the
+    block, `violation` says why it was killed, if it was.
+
+    Args:
+        pid (int): the process to watch, with its descendants.
+        limits (Limits): the limits to enforce. Wall clock and CPU time are
+            counted from entering the `with` block, so a long-lived process
+            can be watched one job at a time.
+        poll_seconds (float, optional): how often to check the process.
+            Defaults to POLL_SECONDS.
+    """
+
+    def __init__(self, pid: int, limits: Limits, poll_seconds: float = POLL_SECONDS) -> None:
+        self.pid = pid
+        self.limits = limits
+        self.poll_seconds = poll_seconds
+        self.violation: Optional[Violation] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def __enter__(self) -> 'Watchdog':
+        self._start = time.monotonic()
+        self._cpu_start = 0.0
+        if self.limits.cpu_seconds is not None:
+            self._cpu_start = tree_usage(self.pid)[1] or 0.0
+        if not self.limits.unlimited:
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _check(self) -> Optional[Violation]:
+        """Check the process against the limits."""
+        limits = self.limits
+        elapsed = time.monotonic() - self._start
+        if limits.wall_seconds is not None and elapsed > limits.wall_seconds:
+            return Violation(TIMEOUT, f"ran longer than {limits.wall_seconds:g}s wall clock")
+        if limits.max_rss_mb is None and limits.cpu_seconds is None:
+            return None
+        rss_mb, cpu = tree_usage(self.pid)
+        if limits.max_rss_mb is not None and rss_mb is not None and rss_mb > limits.max_rss_mb:
+            return Violation(OOM, f"used {rss_mb:.0f} MiB, over {limits.max_rss_mb:g} MiB")
+        if limits.cpu_seconds is not None and cpu is not None:
+            cpu -= self._cpu_start
+            if cpu > limits.cpu_seconds:
+                return Violation(TIMEOUT, f"used {cpu:.0f}s CPU, over {limits.cpu_seconds:g}s")
+        return None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            violation = self._check()
+            if violation is not None:
+                self.violation = violation
+                kill_tree(self.pid)
+                return